@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
+# Temps de démarrage à froid de l'interface, mesuré dans un interpréteur neuf
+# à chaque essai : import de la fenêtre, construction, premier affichage.
+# Usage : python benchmarks/bench_startup.py [--runs N]
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+HEAVY_MODULES = ["astropy", "photutils", "pyqtgraph", "exifread", "requests"]
+STARTUP_BUDGET_S = 1.0
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+t1 = time.perf_counter()
+from ui.main_window import MainWindow
+t2 = time.perf_counter()
+window = MainWindow()
+window.show()
+app.processEvents()
+t3 = time.perf_counter()
+print(json.dumps({
+    "qt": t1 - t0, "import": t2 - t1, "window": t3 - t2, "total": t3 - t0,
+    "heavy": sorted(m for m in %r if m in sys.modules),
+}))
+""" % (HEAVY_MODULES,)
+
+def run_once():
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=SRC_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    runs = 5
+    if "--runs" in sys.argv:
+        runs = int(sys.argv[sys.argv.index("--runs") + 1])
+    results = [run_once() for _ in range(runs)]
+    for key in ("qt", "import", "window", "total"):
+        values = sorted(r[key] for r in results)
+        print(f"{key:>7} : médiane {values[len(values) // 2] * 1000:7.1f} ms, max {values[-1] * 1000:7.1f} ms")
+    heavy = sorted(set(m for r in results for m in r["heavy"]))
+    print("modules lourds chargés au démarrage :", ", ".join(heavy) if heavy else "aucun")
+    total = sorted(r["total"] for r in results)[len(results) // 2]
+    if heavy or total > STARTUP_BUDGET_S:
+        print(f"ÉCHEC : démarrage au-delà de {STARTUP_BUDGET_S:.1f} s ou import lourd au démarrage")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
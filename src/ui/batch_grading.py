@@ -0,0 +1,115 @@
+import concurrent.futures
+import csv
+import multiprocessing
+import os
+import numpy as np
+from .fits_loader import open_frame
+from .exif_extract import FITS_EXTENSIONS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+GRADING_COLUMNS = [
+    "file", "n_stars", "fwhm", "roundness1", "roundness2",
+    "eccentricity", "background", "noise", "error",
+]
+PARQUET_BATCH_SIZE = 64
+
+def list_fits_files(folder):
+    return sorted(
+        os.path.join(folder, f) for f in os.listdir(folder)
+        if f.lower().endswith(FITS_EXTENSIONS) and os.path.isfile(os.path.join(folder, f))
+    )
+
+def grade_file(file_path, fwhm=3.0, threshold_sigma=5.0, quick=False):
+    # Exécuté dans un processus du pool : ne renvoie que des types simples
+    row = {column: None for column in GRADING_COLUMNS}
+    row["file"] = file_path
+    # Import dans le processus de calcul : l'onglet n'a pas besoin de photutils
+    from .star_detection import measure_stars
+    try:
+        with open_frame(file_path) as frame:
+            # Image compressée : décompression complète, la mesure porte sur toute l'image
+            row.update(measure_stars(np.asarray(frame.data), fwhm, threshold_sigma, quick=quick))
+    except Exception as e:
+        row["error"] = str(e)
+    return row
+
+def grade_files(paths, workers=None, fwhm=3.0, threshold_sigma=5.0, quick=False, should_stop=None):
+    # Génère les résultats au fil de l'eau. Le nombre de tâches en vol est borné
+    # pour que la mémoire ne dépende pas de la taille du dossier.
+    workers = workers or os.cpu_count() or 1
+    paths = iter(paths)
+    # spawn : un fork depuis l'interface copierait l'état de Qt et des threads
+    # du JobRunner (verrous pris), et n'existe pas sous Windows ni par défaut sous macOS
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        pending = set()
+        try:
+            while True:
+                while len(pending) < 2 * workers:
+                    path = next(paths, None)
+                    if path is None:
+                        break
+                    pending.add(executor.submit(grade_file, path, fwhm, threshold_sigma, quick))
+                if not pending:
+                    break
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    yield future.result()
+                if should_stop is not None and should_stop():
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
+
+class CsvResultWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=GRADING_COLUMNS)
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class ParquetResultWriter:
+    # Écrit les résultats par groupes de lignes au fur et à mesure
+    def __init__(self, path):
+        if pyarrow is None:
+            raise ImportError("pyarrow n'est pas installé (export Parquet)")
+        self.schema = pyarrow.schema(
+            [("file", pyarrow.string()), ("n_stars", pyarrow.int64())]
+            + [(c, pyarrow.float64()) for c in GRADING_COLUMNS[2:-1]]
+            + [("error", pyarrow.string())]
+        )
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= PARQUET_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(pyarrow.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+def open_result_writer(path):
+    if path.lower().endswith(".parquet"):
+        return ParquetResultWriter(path)
+    return CsvResultWriter(path)
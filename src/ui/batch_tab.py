@@ -0,0 +1,203 @@
+import os
+import shutil
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog, QLabel,
+    QLineEdit, QSpinBox, QDoubleSpinBox, QTableWidget, QTableWidgetItem,
+    QAbstractItemView, QMessageBox, QCheckBox
+)
+from PyQt5.QtCore import Qt
+from .workers import JobRunner
+from .batch_grading import GRADING_COLUMNS, list_fits_files, grade_files, open_result_writer
+
+REJECTED_FOLDER = "rejetees"
+DEFAULT_RESULT_FILE = "star_grading.csv"
+
+COLUMN_LABELS = {
+    "file": "Fichier",
+    "n_stars": "Étoiles",
+    "fwhm": "FWHM (px)",
+    "roundness1": "Roundness 1",
+    "roundness2": "Roundness 2",
+    "eccentricity": "Excentricité",
+    "background": "Fond",
+    "noise": "Bruit",
+    "error": "Erreur",
+}
+
+def grading_job(job, paths, result_path, workers, fwhm, threshold_sigma, quick):
+    writer = open_result_writer(result_path)
+    try:
+        for row in grade_files(paths, workers, fwhm, threshold_sigma, quick, should_stop=job.is_cancelled):
+            writer.write(row)
+            job.emit("row", row)
+    finally:
+        writer.close()
+
+class BatchGradingTab(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.folder = None
+        self.total = 0
+        self.done = 0
+        self.jobs = JobRunner(max_threads=1)
+        self.layout = QVBoxLayout(self)
+
+        self.select_btn = QPushButton("Choisir un dossier de brutes FITS…")
+        self.select_btn.clicked.connect(self.select_folder)
+        self.layout.addWidget(self.select_btn)
+
+        self.info_label = QLabel("Aucun dossier sélectionné.")
+        self.layout.addWidget(self.info_label)
+
+        # Paramètres
+        params_layout = QHBoxLayout()
+        params_layout.addWidget(QLabel("Processus :"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, max(1, os.cpu_count() or 1) * 2)
+        self.workers_spin.setValue(os.cpu_count() or 1)
+        params_layout.addWidget(self.workers_spin)
+        params_layout.addWidget(QLabel("FWHM :"))
+        self.fwhm_spin = QDoubleSpinBox()
+        self.fwhm_spin.setRange(1.0, 30.0)
+        self.fwhm_spin.setValue(3.0)
+        params_layout.addWidget(self.fwhm_spin)
+        params_layout.addWidget(QLabel("Seuil (sigma) :"))
+        self.threshold_spin = QDoubleSpinBox()
+        self.threshold_spin.setRange(1.0, 50.0)
+        self.threshold_spin.setValue(5.0)
+        params_layout.addWidget(self.threshold_spin)
+        self.quick_checkbox = QCheckBox("Détection rapide")
+        self.quick_checkbox.setToolTip("Fond estimé sur un sous-échantillon, étoiles les plus brillantes seulement")
+        params_layout.addWidget(self.quick_checkbox)
+        self.layout.addLayout(params_layout)
+
+        # Fichier de résultats
+        output_layout = QHBoxLayout()
+        output_layout.addWidget(QLabel("Résultats (CSV ou Parquet) :"))
+        self.output_input = QLineEdit()
+        output_layout.addWidget(self.output_input)
+        self.output_btn = QPushButton("…")
+        self.output_btn.clicked.connect(self.select_output)
+        output_layout.addWidget(self.output_btn)
+        self.layout.addLayout(output_layout)
+
+        buttons_layout = QHBoxLayout()
+        self.run_btn = QPushButton("Analyser")
+        self.run_btn.clicked.connect(self.start_grading)
+        buttons_layout.addWidget(self.run_btn)
+        self.cancel_btn = QPushButton("Arrêter")
+        self.cancel_btn.clicked.connect(self.cancel_grading)
+        self.cancel_btn.setEnabled(False)
+        buttons_layout.addWidget(self.cancel_btn)
+        self.reject_btn = QPushButton("Rejeter la sélection")
+        self.reject_btn.clicked.connect(self.reject_selected)
+        buttons_layout.addWidget(self.reject_btn)
+        self.layout.addLayout(buttons_layout)
+
+        self.table = QTableWidget(0, len(GRADING_COLUMNS))
+        self.table.setHorizontalHeaderLabels([COLUMN_LABELS[c] for c in GRADING_COLUMNS])
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSortingEnabled(True)
+        self.layout.addWidget(self.table)
+
+    def select_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Sélectionner un dossier", os.path.expanduser("~"))
+        if folder:
+            self.folder = folder
+            self.output_input.setText(os.path.join(folder, DEFAULT_RESULT_FILE))
+            self.info_label.setText(f"Dossier sélectionné : {folder}")
+
+    def select_output(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Fichier de résultats",
+            self.output_input.text(),
+            "CSV (*.csv);;Parquet (*.parquet)"
+        )
+        if file_path:
+            self.output_input.setText(file_path)
+
+    def start_grading(self):
+        if not self.folder:
+            QMessageBox.warning(self, "Erreur", "Aucun dossier sélectionné.")
+            return
+        paths = list_fits_files(self.folder)
+        if not paths:
+            QMessageBox.warning(self, "Erreur", "Aucun fichier FITS dans ce dossier.")
+            return
+        result_path = self.output_input.text() or os.path.join(self.folder, DEFAULT_RESULT_FILE)
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(0)
+        self.total = len(paths)
+        self.done = 0
+        self.update_progress()
+        self.run_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.jobs.submit(
+            grading_job, paths, result_path, self.workers_spin.value(),
+            self.fwhm_spin.value(), self.threshold_spin.value(), self.quick_checkbox.isChecked(),
+            on_result=self.on_result, on_error=self.on_error, on_finished=self.on_finished
+        )
+
+    def cancel_grading(self):
+        # Le worker s'arrête après le fichier en cours ; on_finished réactive les boutons
+        self.jobs.cancel_all()
+        self.cancel_btn.setEnabled(False)
+        if not self.jobs.is_running():
+            self.on_finished(None)
+
+    def on_result(self, job_id, stage, row):
+        self.done += 1
+        index = self.table.rowCount()
+        self.table.insertRow(index)
+        for col, column in enumerate(GRADING_COLUMNS):
+            value = row[column]
+            item = QTableWidgetItem()
+            if column == "file":
+                item.setText(os.path.basename(value))
+                item.setData(Qt.UserRole, value)
+            elif isinstance(value, float):
+                # Valeur numérique pour un tri correct
+                item.setData(Qt.DisplayRole, round(value, 3))
+            elif value is not None:
+                item.setData(Qt.DisplayRole, value)
+            self.table.setItem(index, col, item)
+        self.update_progress()
+
+    def on_error(self, job_id, message):
+        QMessageBox.critical(self, "Erreur", message)
+
+    def on_finished(self, job_id):
+        self.run_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.table.setSortingEnabled(True)
+        self.table.resizeColumnsToContents()
+
+    def update_progress(self):
+        self.info_label.setText(f"Analyse : {self.done} / {self.total} fichiers")
+
+    def reject_selected(self):
+        rows = sorted({index.row() for index in self.table.selectedIndexes()}, reverse=True)
+        if not rows:
+            return
+        reply = QMessageBox.question(
+            self,
+            "Confirmation",
+            f"Déplacer {len(rows)} fichier(s) dans le dossier « {REJECTED_FOLDER} » ?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        errors = []
+        for row in rows:
+            path = self.table.item(row, 0).data(Qt.UserRole)
+            target_dir = os.path.join(os.path.dirname(path), REJECTED_FOLDER)
+            try:
+                os.makedirs(target_dir, exist_ok=True)
+                shutil.move(path, os.path.join(target_dir, os.path.basename(path)))
+                self.table.removeRow(row)
+            except Exception as e:
+                errors.append(f"{os.path.basename(path)} : {e}")
+        if errors:
+            QMessageBox.warning(self, "Erreur(s)", "\n".join(errors))
@@ -0,0 +1,254 @@
+import os
+import time
+import numpy as np
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog, QLabel, QCheckBox, QDoubleSpinBox,
+    QTabWidget, QTableWidget, QTableWidgetItem, QTableView, QAbstractItemView, QMessageBox
+)
+from PyQt5.QtGui import QBrush, QColor
+from PyQt5.QtCore import Qt
+from .list_models import ArrayTableModel
+from .exif_extract import FITS_FILE_FILTER
+from .fits_header import FitsHeaderError
+from .equipment import (
+    DEFAULT_SEEING, EQUIPMENT_FIELDS, SAMPLING_OK, SAMPLING_OVER, SAMPLING_UNDER, VISUAL_OK,
+    VISUAL_PUPIL_TOO_LARGE, VISUAL_TOO_HIGH, EquipmentStore, fits_equipment, imaging_matrix,
+    visual_matrix, with_no_reducer
+)
+
+KIND_LABELS = {
+    "telescopes": ("Télescopes", "Nouveau télescope"),
+    "cameras": ("Caméras", "Nouvelle caméra"),
+    "reducers": ("Réducteurs / Barlow", "Nouveau réducteur"),
+    "eyepieces": ("Oculaires", "Nouvel oculaire"),
+}
+
+FIELD_LABELS = {
+    "focal_length": "Focale (mm)",
+    "aperture": "Diamètre (mm)",
+    "pixel_size": "Pixel (µm)",
+    "width": "Largeur (px)",
+    "height": "Hauteur (px)",
+    "factor": "Facteur",
+    "afov": "Champ apparent (°)",
+}
+
+SAMPLING_VERDICTS = {
+    SAMPLING_UNDER: ("Sous-échantillonné", QColor(255, 230, 200)),
+    SAMPLING_OK: ("Adapté", QColor(210, 245, 210)),
+    SAMPLING_OVER: ("Suréchantillonné", QColor(220, 225, 255)),
+}
+
+VISUAL_VERDICTS = {
+    VISUAL_OK: ("Utilisable", QColor(210, 245, 210)),
+    VISUAL_TOO_HIGH: ("Grossissement trop fort", QColor(255, 220, 220)),
+    VISUAL_PUPIL_TOO_LARGE: ("Pupille trop large", QColor(255, 230, 200)),
+}
+
+def number_format(decimals):
+    return lambda value: f"{value:.{decimals}f}"
+
+def verdict_columns(verdicts, codes):
+    # Libellé et couleur de chaque ligne, pris dans une table indexée par le code
+    labels = np.array([verdicts[code][0] for code in sorted(verdicts)], dtype=object)
+    brushes = np.array([QBrush(verdicts[code][1]) for code in sorted(verdicts)], dtype=object)
+    return labels[codes], brushes[codes]
+
+class CalculatorTab(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.store = EquipmentStore()
+        self.editors = {}
+        self.updating = False
+        self.layout = QVBoxLayout(self)
+
+        options_layout = QHBoxLayout()
+        options_layout.addWidget(QLabel("Seeing (\") :"))
+        self.seeing_spin = QDoubleSpinBox()
+        self.seeing_spin.setRange(0.3, 10.0)
+        self.seeing_spin.setSingleStep(0.1)
+        self.seeing_spin.setValue(DEFAULT_SEEING)
+        self.seeing_spin.valueChanged.connect(self.update_matrices)
+        options_layout.addWidget(self.seeing_spin)
+        self.suited_checkbox = QCheckBox("Combinaisons adaptées seulement")
+        self.suited_checkbox.toggled.connect(self.update_matrices)
+        options_layout.addWidget(self.suited_checkbox)
+        self.fits_btn = QPushButton("Depuis des fichiers FITS…")
+        self.fits_btn.setToolTip("Ajoute le télescope (FOCALLEN) et la caméra (XPIXSZ) décrits dans les en-têtes")
+        self.fits_btn.clicked.connect(self.import_from_fits)
+        options_layout.addWidget(self.fits_btn)
+        self.layout.addLayout(options_layout)
+
+        # Matériel enregistré : un tableau modifiable par type
+        self.equipment_tabs = QTabWidget()
+        for kind in EQUIPMENT_FIELDS:
+            self.equipment_tabs.addTab(self.make_editor(kind), KIND_LABELS[kind][0])
+        self.layout.addWidget(self.equipment_tabs, 1)
+
+        # Matrices de compatibilité
+        self.result_tabs = QTabWidget()
+        self.imaging_model = ArrayTableModel(self)
+        self.visual_model = ArrayTableModel(self)
+        for model, title in ((self.imaging_model, "Imagerie"), (self.visual_model, "Visuel")):
+            view = QTableView()
+            view.setModel(model)
+            view.setSortingEnabled(True)
+            view.setSelectionBehavior(QAbstractItemView.SelectRows)
+            self.result_tabs.addTab(view, title)
+        self.layout.addWidget(self.result_tabs, 2)
+
+        self.info_label = QLabel("")
+        self.layout.addWidget(self.info_label)
+
+        for kind in EQUIPMENT_FIELDS:
+            self.fill_editor(kind)
+        self.update_matrices()
+
+    def make_editor(self, kind):
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        fields = list(EQUIPMENT_FIELDS[kind])
+        table = QTableWidget(0, 1 + len(fields))
+        table.setHorizontalHeaderLabels(["Nom"] + [FIELD_LABELS[f] for f in fields])
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.cellChanged.connect(lambda row, col, k=kind: self.cell_changed(k, row, col))
+        layout.addWidget(table)
+        buttons_layout = QHBoxLayout()
+        add_btn = QPushButton("Ajouter")
+        add_btn.clicked.connect(lambda checked, k=kind: self.add_item(k))
+        buttons_layout.addWidget(add_btn)
+        remove_btn = QPushButton("Supprimer")
+        remove_btn.clicked.connect(lambda checked, k=kind: self.remove_items(k))
+        buttons_layout.addWidget(remove_btn)
+        buttons_layout.addStretch(1)
+        layout.addLayout(buttons_layout)
+        self.editors[kind] = table
+        return widget
+
+    def fill_editor(self, kind):
+        table = self.editors[kind]
+        ids, names, values = self.store.columns(kind)
+        fields = list(EQUIPMENT_FIELDS[kind])
+        self.updating = True
+        table.setRowCount(len(ids))
+        for row, (item_id, name) in enumerate(zip(ids, names)):
+            item = QTableWidgetItem(name)
+            item.setData(Qt.UserRole, item_id)
+            table.setItem(row, 0, item)
+            for col, field in enumerate(fields, start=1):
+                table.setItem(row, col, QTableWidgetItem(f"{values[field][row]:g}"))
+        self.updating = False
+
+    def cell_changed(self, kind, row, col):
+        if self.updating:
+            return
+        table = self.editors[kind]
+        item_id = table.item(row, 0).data(Qt.UserRole)
+        text = table.item(row, col).text().strip()
+        if col == 0:
+            if text:
+                self.store.update(kind, item_id, name=text)
+        else:
+            field = list(EQUIPMENT_FIELDS[kind])[col - 1]
+            try:
+                value = float(text.replace(",", "."))
+                if value <= 0:
+                    raise ValueError(text)
+                self.store.update(kind, item_id, **{field: value})
+            except ValueError:
+                QMessageBox.warning(self, "Erreur", f"Valeur invalide : {text}")
+        # Réaffiche la valeur enregistrée (et l'ordre des noms)
+        self.fill_editor(kind)
+        self.update_matrices()
+
+    def add_item(self, kind):
+        self.store.add(kind, KIND_LABELS[kind][1])
+        self.fill_editor(kind)
+        self.update_matrices()
+
+    def remove_items(self, kind):
+        table = self.editors[kind]
+        rows = sorted({index.row() for index in table.selectedIndexes()})
+        if not rows:
+            return
+        for row in rows:
+            self.store.remove(kind, table.item(row, 0).data(Qt.UserRole))
+        self.fill_editor(kind)
+        self.update_matrices()
+
+    def import_from_fits(self):
+        from .fit_reader_tab import load_history
+        history = load_history()
+        start = os.path.dirname(history[0]) if history else ""
+        paths, _ = QFileDialog.getOpenFileNames(self, "Choisir des fichiers FITS", start, FITS_FILE_FILTER)
+        if not paths:
+            return
+        added = []
+        errors = []
+        for path in paths:
+            try:
+                found = fits_equipment(path)
+            except (OSError, FitsHeaderError) as e:
+                errors.append(f"{os.path.basename(path)} : {e}")
+                continue
+            for kind, key, match in (
+                ("telescopes", "telescope", ("focal_length",)),
+                ("cameras", "camera", ("pixel_size", "width", "height")),
+            ):
+                item = found[key]
+                if item is None:
+                    continue
+                # Déjà enregistré avec les mêmes valeurs : pas de doublon
+                if self.store.find(kind, **{f: item[f] for f in match if f in item}) is None:
+                    self.store.add(kind, **item)
+                    added.append(item["name"])
+        for kind in ("telescopes", "cameras"):
+            self.fill_editor(kind)
+        self.update_matrices()
+        text = f"Ajouté : {', '.join(added)}" if added else "Aucun nouveau matériel trouvé (FOCALLEN, XPIXSZ)."
+        if errors:
+            text += "\n" + "\n".join(errors)
+        self.info_label.setText(text)
+
+    def update_matrices(self):
+        start = time.perf_counter()
+        _, telescope_names, telescopes = self.store.columns("telescopes")
+        _, camera_names, cameras = self.store.columns("cameras")
+        _, eyepiece_names, eyepieces = self.store.columns("eyepieces")
+        reducer_names, reducers = with_no_reducer(*self.store.columns("reducers")[1:])
+        telescope_names = np.array(telescope_names, dtype=object)
+        reducer_names = np.array(reducer_names, dtype=object)
+        suited_only = self.suited_checkbox.isChecked()
+
+        imaging = imaging_matrix(telescopes, reducers, cameras, self.seeing_spin.value())
+        labels, brushes = verdict_columns(SAMPLING_VERDICTS, imaging["verdict"])
+        self.imaging_model.set_columns([
+            ("Télescope", telescope_names[imaging["telescope"]], str),
+            ("Réducteur", reducer_names[imaging["reducer"]], str),
+            ("Caméra", np.array(camera_names, dtype=object)[imaging["camera"]], str),
+            ("Focale (mm)", imaging["focal"], number_format(0)),
+            ("F/D", imaging["f_ratio"], number_format(1)),
+            ("Échantillonnage (\"/px)", imaging["sampling"], number_format(2)),
+            ("Champ (′)", imaging["fov_width"], number_format(1)),
+            ("× (′)", imaging["fov_height"], number_format(1)),
+            ("Dawes (\")", imaging["dawes"], number_format(2)),
+            ("Verdict", labels, str),
+        ], brushes, imaging["verdict"] == SAMPLING_OK if suited_only else None)
+
+        visual = visual_matrix(telescopes, reducers, eyepieces)
+        labels, brushes = verdict_columns(VISUAL_VERDICTS, visual["verdict"])
+        self.visual_model.set_columns([
+            ("Télescope", telescope_names[visual["telescope"]], str),
+            ("Réducteur / Barlow", reducer_names[visual["reducer"]], str),
+            ("Oculaire", np.array(eyepiece_names, dtype=object)[visual["eyepiece"]], str),
+            ("Grossissement", visual["magnification"], number_format(0)),
+            ("Champ réel (°)", visual["true_field"], number_format(2)),
+            ("Pupille (mm)", visual["exit_pupil"], number_format(1)),
+            ("Verdict", labels, str),
+        ], brushes, visual["verdict"] == VISUAL_OK if suited_only else None)
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.info_label.setText(
+            f"{len(imaging['verdict'])} combinaisons d'imagerie, {len(visual['verdict'])} visuelles "
+            f"({elapsed:.0f} ms)"
+        )
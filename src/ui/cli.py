@@ -0,0 +1,257 @@
+import argparse
+import csv
+import json
+import os
+import sys
+
+# Interface en ligne de commande, sans PyQt5 : utilisable sur une machine sans
+# affichage. Les modules lourds (astropy, photutils) ne sont importés que par la
+# sous-commande qui en a besoin.
+
+def expand_paths(paths, extensions=None):
+    # Fichiers passés tels quels, dossiers développés (non récursif, triés)
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full = os.path.join(path, name)
+                if os.path.isfile(full) and (extensions is None or name.lower().endswith(extensions)):
+                    yield full
+        else:
+            yield path
+
+class JsonLinesWriter:
+    # Un objet JSON par ligne, écrit dès qu'il est produit
+    def __init__(self, stream, columns=None):
+        self.stream = stream
+
+    def write(self, row):
+        self.stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+class CsvStreamWriter:
+    def __init__(self, stream, columns):
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, fieldnames=columns, extrasaction="ignore")
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.stream.flush()
+
+def open_output(args, columns):
+    stream = sys.stdout if args.output in (None, "-") else open(args.output, "w", newline="")
+    writer_class = CsvStreamWriter if args.format == "csv" else JsonLinesWriter
+    return stream, writer_class(stream, columns)
+
+def close_output(stream):
+    if stream is not sys.stdout:
+        stream.close()
+
+def run_rename(args):
+    from .naming import NamingOptions, build_new_names
+    from .exif_extract import NAMING_INDEX_KIND, read_naming_info, default_workers
+    from .metadata_index import get_metadata_index
+    from .rename_engine import RenameError, UndoHistory, plan_renames, rename_batch
+
+    folder = os.path.abspath(args.folder)
+    filenames = sorted(f for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f)))
+    options = NamingOptions(
+        prefix=args.prefix, suffix=args.suffix, custom_name=args.name,
+        use_date=args.date, use_model=args.model, use_filter=args.filter, replace_name=args.replace,
+    )
+    if options.is_empty():
+        print("Rien à faire : indiquer --prefix, --suffix, --name, --date, --model ou --filter", file=sys.stderr)
+        return 2
+    # Mêmes règles que l'aperçu de l'onglet Renamer
+    infos = None
+    if options.uses_exif():
+        fields = get_metadata_index().update_folder(
+            folder, filenames, NAMING_INDEX_KIND, read_naming_info, workers=default_workers(folder)
+        )
+        infos = [
+            (fields[f]["date"], fields[f]["model"], fields[f].get("filter", "")) if f in fields else ("", "", "")
+            for f in filenames
+        ]
+    new_names = build_new_names(filenames, infos, options)
+    try:
+        if args.dry_run:
+            plan = plan_renames(folder, zip(filenames, new_names))
+        else:
+            plan = rename_batch(folder, zip(filenames, new_names), UndoHistory())
+            get_metadata_index().move_paths(
+                [(os.path.join(folder, old), os.path.join(folder, new)) for old, new in plan.renames]
+            )
+    except (RenameError, OSError) as e:
+        print(f"Aucun fichier renommé : {e}", file=sys.stderr)
+        return 1
+    stream, writer = open_output(args, ["old", "new"])
+    try:
+        for old, new in plan.renames:
+            writer.write({"old": old, "new": new})
+    finally:
+        close_output(stream)
+    return 0
+
+def run_headers(args):
+    from .exif_extract import read_exif
+
+    columns = ["file"] + (args.keys + ["error"] if args.keys else ["tag", "value"])
+    stream, writer = open_output(args, columns)
+    try:
+        for path in expand_paths(args.paths):
+            fields = read_exif(path, args.keys)
+            if args.keys:
+                row = {"file": path}
+                row.update({key: fields.get(key) for key in args.keys})
+                if "Error" in fields:
+                    row["error"] = fields["Error"]
+                writer.write(row)
+            elif args.format == "csv":
+                # Sans liste de mots-clés, une ligne par (fichier, mot-clé)
+                for tag, value in fields.items():
+                    writer.write({"file": path, "tag": tag, "value": value})
+            else:
+                writer.write({"file": path, "fields": fields})
+    finally:
+        close_output(stream)
+    return 0
+
+def run_stars(args):
+    from .batch_grading import FITS_EXTENSIONS, GRADING_COLUMNS, grade_files
+
+    paths = list(expand_paths(args.paths, FITS_EXTENSIONS))
+    stream, writer = open_output(args, GRADING_COLUMNS)
+    try:
+        # Les résultats arrivent dans l'ordre de fin de traitement
+        for row in grade_files(paths, args.workers, args.fwhm, args.threshold, args.quick):
+            writer.write(row)
+    finally:
+        close_output(stream)
+    return 0
+
+def run_stack(args):
+    from .exif_extract import FITS_EXTENSIONS
+    from .stacking import StackError, StackOptions, calibrate_and_stack
+
+    def files(paths):
+        return list(expand_paths(paths or [], FITS_EXTENSIONS))
+
+    options = StackOptions(
+        method=args.method, sigma_low=args.sigma_low, sigma_high=args.sigma_high,
+        clip=not args.no_clip, memory_budget=args.memory * 1024 * 1024, workers=args.workers,
+    )
+
+    def progress(stage, done, total):
+        print(f"\r{stage} : {done}/{total}", end="" if done < total else "\n", file=sys.stderr)
+
+    try:
+        result = calibrate_and_stack(
+            files(args.paths), args.result, files(args.bias), files(args.darks), files(args.flats),
+            options, progress=None if args.quiet else progress
+        )
+    except StackError as e:
+        print(f"Échec de l'empilement : {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(result, ensure_ascii=False))
+    return 0
+
+def run_register(args):
+    from .exif_extract import FITS_EXTENSIONS
+    from .registration import REGISTRATION_COLUMNS, RegistrationError, RegistrationOptions, register_files
+
+    paths = list(expand_paths(args.paths, FITS_EXTENSIONS))
+    if not paths:
+        print("Aucune image FITS", file=sys.stderr)
+        return 2
+    reference = args.reference or paths[0]
+    masters = None
+    if args.bias or args.dark or args.flat:
+        masters = (args.bias, args.dark, args.flat)
+    options = RegistrationOptions(fwhm=args.fwhm, threshold_sigma=args.threshold)
+    stream, writer = open_output(args, REGISTRATION_COLUMNS)
+    try:
+        for row in register_files(paths, reference, args.out_folder, options, args.workers, masters):
+            writer.write(row)
+    except RegistrationError as e:
+        print(f"Échec de l'alignement : {e}", file=sys.stderr)
+        return 1
+    finally:
+        close_output(stream)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m src", description="Outils astro en ligne de commande")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_output_arguments(sub):
+        sub.add_argument("--format", choices=["json", "csv"], default="json",
+                         help="JSON (une ligne par objet) ou CSV")
+        sub.add_argument("-o", "--output", help="Fichier de sortie (défaut : sortie standard)")
+
+    rename = subparsers.add_parser("rename", help="Renommer les fichiers d'un dossier")
+    rename.add_argument("folder")
+    rename.add_argument("--prefix", default="")
+    rename.add_argument("--suffix", default="")
+    rename.add_argument("--name", default="", help="Nom personnalisé")
+    rename.add_argument("--date", action="store_true", help="Inclure la date de prise de vue (EXIF)")
+    rename.add_argument("--model", action="store_true", help="Inclure le matériel utilisé (EXIF)")
+    rename.add_argument("--filter", action="store_true", help="Inclure le filtre (FITS)")
+    rename.add_argument("--replace", action="store_true", help="Remplacer le nom par les infos EXIF")
+    rename.add_argument("-n", "--dry-run", action="store_true", help="Afficher le plan sans renommer")
+    add_output_arguments(rename)
+    rename.set_defaults(func=run_rename)
+
+    headers = subparsers.add_parser("headers", help="Lire les EXIF / en-têtes FITS")
+    headers.add_argument("paths", nargs="+", help="Fichiers ou dossiers")
+    headers.add_argument("-k", "--keys", nargs="+", help="Mots-clés à extraire (une colonne chacun)")
+    add_output_arguments(headers)
+    headers.set_defaults(func=run_headers)
+
+    stars = subparsers.add_parser("stars", help="Détecter et mesurer les étoiles des brutes FITS")
+    stars.add_argument("paths", nargs="+", help="Fichiers ou dossiers FITS")
+    stars.add_argument("--fwhm", type=float, default=3.0)
+    stars.add_argument("--threshold", type=float, default=5.0, help="Seuil en sigma")
+    stars.add_argument("--quick", action="store_true", help="Détection rapide (statistiques sous-échantillonnées)")
+    stars.add_argument("-j", "--workers", type=int, default=None, help="Nombre de processus")
+    add_output_arguments(stars)
+    stars.set_defaults(func=run_stars)
+
+    register = subparsers.add_parser("register", help="Aligner des images FITS sur une référence")
+    register.add_argument("paths", nargs="+", help="Fichiers ou dossiers FITS")
+    register.add_argument("--reference", help="Image de référence (défaut : la première)")
+    register.add_argument("-O", "--out-folder", help="Dossier des images alignées (sans : transformations seules)")
+    register.add_argument("--bias", help="Offset maître appliqué avant alignement")
+    register.add_argument("--dark", help="Noir maître appliqué avant alignement")
+    register.add_argument("--flat", help="Flat maître appliqué avant alignement")
+    register.add_argument("--fwhm", type=float, default=3.0)
+    register.add_argument("--threshold", type=float, default=5.0, help="Seuil en sigma")
+    register.add_argument("-j", "--workers", type=int, default=None, help="Nombre de processus")
+    add_output_arguments(register)
+    register.set_defaults(func=run_register)
+
+    stack = subparsers.add_parser("stack", help="Calibrer et empiler des images FITS")
+    stack.add_argument("paths", nargs="*", help="Images (lights) : fichiers ou dossiers")
+    stack.add_argument("-r", "--result", default="empilement.fits", help="Fichier FITS résultat")
+    stack.add_argument("--bias", nargs="+", help="Offsets, ou un offset maître")
+    stack.add_argument("--darks", nargs="+", help="Noirs, ou un noir maître")
+    stack.add_argument("--flats", nargs="+", help="Flats, ou un flat maître")
+    stack.add_argument("--method", choices=["mean", "median"], default="mean")
+    stack.add_argument("--sigma-low", type=float, default=3.0)
+    stack.add_argument("--sigma-high", type=float, default=3.0)
+    stack.add_argument("--no-clip", action="store_true", help="Sans rejet sigma")
+    stack.add_argument("--memory", type=int, default=1024, help="Budget mémoire (Mo)")
+    stack.add_argument("-j", "--workers", type=int, default=None, help="Nombre de threads")
+    stack.add_argument("-q", "--quiet", action="store_true", help="Sans progression sur stderr")
+    stack.set_defaults(func=run_stack)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # Sortie coupée (| head) : arrêt silencieux
+        sys.stderr.close()
+        return 0
+    except KeyboardInterrupt:
+        return 130
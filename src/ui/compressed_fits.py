@@ -0,0 +1,185 @@
+import collections
+import math
+import threading
+import numpy as np
+
+# Blocs décompressés : alignés sur les tuiles de compression (fpack), regroupées
+# pour atteindre environ BLOCK_SIZE pixels de côté
+BLOCK_SIZE = 512
+DECOMPRESSED_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Blocs lus pour estimer l'étirement sans tout décompresser
+STRETCH_SAMPLE_BLOCKS = 16
+
+class DecompressedBlockCache:
+    # Cache LRU partagé des blocs décompressés, borné en octets
+    def __init__(self, max_bytes=DECOMPRESSED_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            block = self.entries.get(key)
+            if block is not None:
+                self.entries.move_to_end(key)
+            return block
+
+    def put(self, key, block):
+        with self.lock:
+            if key in self.entries:
+                self.total -= self.entries.pop(key).nbytes
+            self.entries[key] = block
+            self.total += block.nbytes
+            while self.total > self.max_bytes and len(self.entries) > 1:
+                self.total -= self.entries.popitem(last=False)[1].nbytes
+
+    def discard(self, owner):
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == owner]:
+                self.total -= self.entries.pop(key).nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total = 0
+
+decompressed_cache = DecompressedBlockCache()
+
+class CompressedImage:
+    # Image 2D d'un HDU compressé par tuiles (.fits.fz), décompressée à la demande.
+    # Se découpe comme un tableau numpy (y compris avec un pas, pour la pyramide de
+    # l'affichage) : le découpage renvoie une vue paresseuse, et seuls les blocs
+    # touchés sont décompressés lors de la conversion en tableau (np.asarray).
+    def __init__(self, hdul, hdu_index, plane, scale):
+        self.key = object()
+        self.hdul = hdul
+        self.hdu = hdul[hdu_index]
+        # (plan,) pour un cube, () pour une image 2D
+        self.prefix = (plane,) if len(self.hdu.shape) == 3 else ()
+        # scale(tableau brut) -> tableau mis à l'échelle (BZERO/BSCALE/BLANK)
+        self.scale = scale
+        self.lock = threading.Lock()
+        height, width = self.hdu.shape[-2:]
+        tile_h, tile_w = (int(n) for n in self.hdu.tile_shape[-2:])
+        self.tile_h = tile_h
+        self.block_h = min(height, tile_h * max(1, BLOCK_SIZE // tile_h))
+        self.block_w = min(width, tile_w * max(1, BLOCK_SIZE // tile_w))
+        self.full_shape = (height, width)
+        self.dtype = self.scale(self.hdu.section[self.prefix + (slice(0, 1), slice(0, 1))]).dtype
+
+    def __del__(self):
+        decompressed_cache.discard(self.key)
+
+    def close(self):
+        # Ferme le fichier sans attendre le ramasse-miettes (traitements par lots :
+        # un descripteur par image sinon) ; l'image n'est plus lisible ensuite
+        decompressed_cache.discard(self.key)
+        with self.lock:
+            self.hdul.close()
+
+    def block(self, by, bx):
+        key = (self.key, by, bx)
+        block = decompressed_cache.get(key)
+        if block is None:
+            y0, x0 = by * self.block_h, bx * self.block_w
+            window = self.prefix + (slice(y0, y0 + self.block_h), slice(x0, x0 + self.block_w))
+            # Un seul accès au fichier à la fois ; astropy ne décompresse que les tuiles couvertes
+            with self.lock:
+                raw = self.hdu.section[window]
+            block = self.scale(raw)
+            block.flags.writeable = False
+            decompressed_cache.put(key, block)
+        return block
+
+    def read(self, rows, cols):
+        # rows, cols : range (début, fin, pas) dans l'image pleine résolution
+        out = np.empty((len(rows), len(cols)), dtype=self.dtype)
+        if out.size == 0:
+            return out
+        for by in range(rows[0] // self.block_h, rows[-1] // self.block_h + 1):
+            r_sel = select(rows, by * self.block_h, self.block_h)
+            if r_sel is None:
+                continue
+            for bx in range(cols[0] // self.block_w, cols[-1] // self.block_w + 1):
+                c_sel = select(cols, bx * self.block_w, self.block_w)
+                if c_sel is None:
+                    continue
+                block = self.block(by, bx)
+                out[r_sel[0], c_sel[0]] = block[r_sel[1], c_sel[1]]
+        return out
+
+    def sample(self, max_blocks=STRETCH_SAMPLE_BLOCKS):
+        # Blocs répartis sur toute l'image, pour l'étirement et l'histogramme
+        n_by = math.ceil(self.full_shape[0] / self.block_h)
+        n_bx = math.ceil(self.full_shape[1] / self.block_w)
+        positions = [(by, bx) for by in range(n_by) for bx in range(n_bx)]
+        if len(positions) > max_blocks:
+            step = len(positions) / max_blocks
+            positions = [positions[int(i * step)] for i in range(max_blocks)]
+        return np.concatenate([self.block(by, bx).reshape(-1) for by, bx in positions])
+
+    def decimated(self, step):
+        # Image sous-échantillonnée d'un pas `step`. Avec des tuiles moins hautes
+        # que le pas (fpack : une ligne par tuile), seules les tuiles des lignes
+        # retenues sont décompressées ; sinon toutes les tuiles sont nécessaires.
+        if self.tile_h >= step:
+            return np.asarray(self.view()[::step, ::step])
+        columns = slice(None, None, step)
+        with self.lock:
+            raw = np.stack([
+                self.hdu.section[self.prefix + (slice(r, r + 1), columns)][0]
+                for r in range(0, self.full_shape[0], step)
+            ])
+        return self.scale(raw)
+
+    def view(self):
+        return CompressedView(self, range(self.full_shape[0]), range(self.full_shape[1]))
+
+def select(indices, origin, length):
+    # Partie d'un range qui tombe dans [origin, origin + length) :
+    # (tranche dans la sortie, tranche dans le bloc), ou None
+    step = indices.step
+    first = max(0, math.ceil((origin - indices.start) / step))
+    last = min(len(indices), math.ceil((origin + length - indices.start) / step))
+    if first >= last:
+        return None
+    start = indices[first] - origin
+    return slice(first, last), slice(start, start + (last - first - 1) * step + 1, step)
+
+class CompressedView:
+    # Fenêtre (éventuellement sous-échantillonnée) d'une CompressedImage
+    def __init__(self, image, rows, cols):
+        self.image = image
+        self.rows = rows
+        self.cols = cols
+
+    @property
+    def shape(self):
+        return (len(self.rows), len(self.cols))
+
+    @property
+    def dtype(self):
+        return self.image.dtype
+
+    @property
+    def size(self):
+        return len(self.rows) * len(self.cols)
+
+    @property
+    def ndim(self):
+        return 2
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        if len(key) != 2 or not all(isinstance(k, slice) for k in key):
+            return np.asarray(self)[key]
+        return CompressedView(self.image, self.rows[key[0]], self.cols[key[1]])
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.image.read(self.rows, self.cols)
+        return data if dtype is None else data.astype(dtype)
+
+    def sample(self):
+        return self.image.sample()
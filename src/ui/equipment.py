@@ -0,0 +1,179 @@
+import json
+import math
+import os
+import uuid
+import numpy as np
+from .fits_header import scan_fits_header
+
+# Stocké à la racine du projet, à côté de favs.json
+EQUIPMENT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "equipment.json")
+EQUIPMENT_VERSION = 1
+ARCSEC_PER_RADIAN = 180 * 3600 / math.pi
+DEFAULT_SEEING = 2.0
+# Pupille de l'œil adapté à l'obscurité (mm) et grossissement utile maximal (× diamètre en mm)
+MAX_EXIT_PUPIL = 7.0
+MAX_USEFUL_MAGNIFICATION = 2.0
+# Pouvoir séparateur de Dawes : 116 / D (D en mm), en secondes d'arc
+DAWES_CONSTANT = 116.0
+
+# Champs numériques de chaque type de matériel, avec leur valeur par défaut
+EQUIPMENT_FIELDS = {
+    "telescopes": {"focal_length": 1000.0, "aperture": 200.0},
+    "cameras": {"pixel_size": 3.76, "width": 6248, "height": 4176},
+    "reducers": {"factor": 0.8},
+    "eyepieces": {"focal_length": 25.0, "afov": 52.0},
+}
+
+# Verdicts des matrices
+SAMPLING_UNDER = 0
+SAMPLING_OK = 1
+SAMPLING_OVER = 2
+VISUAL_OK = 0
+VISUAL_TOO_HIGH = 1
+VISUAL_PUPIL_TOO_LARGE = 2
+
+# Lus dans les en-têtes FITS pour pré-remplir le matériel
+EQUIPMENT_KEYWORDS = (
+    "FOCALLEN", "APTDIA", "TELESCOP", "INSTRUME", "XPIXSZ", "NAXIS1", "NAXIS2", "ZNAXIS1", "ZNAXIS2",
+)
+
+class EquipmentStore:
+    # Matériel enregistré, indexé par type puis par identifiant stable :
+    # {"telescopes": {id: {"name": …, "focal_length": …}}, …}. Les colonnes
+    # numpy de chaque type sont gardées jusqu'à la prochaine modification.
+    def __init__(self, path=EQUIPMENT_FILE):
+        self.path = path
+        self.items = {kind: {} for kind in EQUIPMENT_FIELDS}
+        self.columns_cache = {}
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+            for kind in EQUIPMENT_FIELDS:
+                self.items[kind].update(stored.get(kind, {}))
+        except Exception:
+            pass
+
+    def save(self):
+        # Écriture atomique : le fichier n'est jamais à moitié écrit
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": EQUIPMENT_VERSION, **self.items}, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def changed(self, kind):
+        self.columns_cache.pop(kind, None)
+        self.save()
+
+    def add(self, kind, name, **fields):
+        item = {"name": name, **EQUIPMENT_FIELDS[kind]}
+        item.update({k: v for k, v in fields.items() if k in EQUIPMENT_FIELDS[kind] and v is not None})
+        item_id = uuid.uuid4().hex[:8]
+        self.items[kind][item_id] = item
+        self.changed(kind)
+        return item_id
+
+    def update(self, kind, item_id, **fields):
+        self.items[kind][item_id].update(fields)
+        self.changed(kind)
+
+    def remove(self, kind, item_id):
+        del self.items[kind][item_id]
+        self.changed(kind)
+
+    def find(self, kind, **fields):
+        # Identifiant d'un élément ayant exactement ces valeurs, ou None
+        for item_id, item in self.items[kind].items():
+            if all(item.get(k) == v for k, v in fields.items()):
+                return item_id
+        return None
+
+    def columns(self, kind):
+        # (identifiants, noms, {champ: tableau numpy}) dans l'ordre des noms
+        if kind not in self.columns_cache:
+            entries = sorted(self.items[kind].items(), key=lambda e: e[1]["name"].lower())
+            ids = [item_id for item_id, _ in entries]
+            names = [item["name"] for _, item in entries]
+            values = {
+                field: np.array([float(item.get(field, default)) for _, item in entries], dtype=np.float64)
+                for field, default in EQUIPMENT_FIELDS[kind].items()
+            }
+            self.columns_cache[kind] = (ids, names, values)
+        return self.columns_cache[kind]
+
+def with_no_reducer(names, values):
+    # Chaque télescope est aussi calculé sans réducteur ni Barlow
+    return ["—"] + list(names), {"factor": np.concatenate([[1.0], values["factor"]])}
+
+def imaging_matrix(telescopes, reducers, cameras, seeing=DEFAULT_SEEING):
+    # Toutes les combinaisons télescope × réducteur × caméra en une fois, par
+    # diffusion numpy sur un tableau (T, R, C). Renvoie des colonnes à plat :
+    # indices de chaque élément et grandeurs calculées.
+    focal = telescopes["focal_length"][:, None, None] * reducers["factor"][None, :, None]
+    aperture = telescopes["aperture"][:, None, None]
+    pixel_mm = cameras["pixel_size"][None, None, :] * 1e-3
+    sampling = ARCSEC_PER_RADIAN * pixel_mm / focal
+    fov_width = np.degrees(2 * np.arctan(cameras["width"][None, None, :] * pixel_mm / (2 * focal))) * 60
+    fov_height = np.degrees(2 * np.arctan(cameras["height"][None, None, :] * pixel_mm / (2 * focal))) * 60
+    f_ratio = focal / aperture
+    # Critère de Shannon appliqué à la turbulence : de 2 à 3 pixels par seeing
+    verdict = np.full(sampling.shape, SAMPLING_OK, dtype=np.int8)
+    verdict[sampling > seeing / 2] = SAMPLING_UNDER
+    verdict[sampling < seeing / 3] = SAMPLING_OVER
+    t, r, c = np.indices(sampling.shape)
+    dawes = np.broadcast_to(DAWES_CONSTANT / aperture, sampling.shape)
+    return {
+        "telescope": t.ravel(),
+        "reducer": r.ravel(),
+        "camera": c.ravel(),
+        "focal": np.broadcast_to(focal, sampling.shape).ravel(),
+        "f_ratio": np.broadcast_to(f_ratio, sampling.shape).ravel(),
+        "sampling": sampling.ravel(),
+        "fov_width": fov_width.ravel(),
+        "fov_height": fov_height.ravel(),
+        "dawes": dawes.ravel(),
+        "verdict": verdict.ravel(),
+    }
+
+def visual_matrix(telescopes, reducers, eyepieces):
+    # Toutes les combinaisons télescope × réducteur (ou Barlow) × oculaire
+    focal = telescopes["focal_length"][:, None, None] * reducers["factor"][None, :, None]
+    aperture = telescopes["aperture"][:, None, None]
+    magnification = focal / eyepieces["focal_length"][None, None, :]
+    true_field = eyepieces["afov"][None, None, :] / magnification
+    exit_pupil = aperture / magnification
+    verdict = np.full(magnification.shape, VISUAL_OK, dtype=np.int8)
+    verdict[exit_pupil > MAX_EXIT_PUPIL] = VISUAL_PUPIL_TOO_LARGE
+    verdict[magnification > MAX_USEFUL_MAGNIFICATION * aperture] = VISUAL_TOO_HIGH
+    t, r, e = np.indices(magnification.shape)
+    return {
+        "telescope": t.ravel(),
+        "reducer": r.ravel(),
+        "eyepiece": e.ravel(),
+        "magnification": magnification.ravel(),
+        "true_field": true_field.ravel(),
+        "exit_pupil": exit_pupil.ravel(),
+        "verdict": verdict.ravel(),
+    }
+
+def fits_equipment(file_path):
+    # Télescope et caméra décrits par l'en-tête d'une image, ou None pour
+    # chacun si les mots-clés manquent. XPIXSZ tient déjà compte du binning.
+    header = scan_fits_header(file_path, EQUIPMENT_KEYWORDS)
+    telescope = None
+    camera = None
+    focal = header.get("FOCALLEN")
+    if isinstance(focal, (int, float)) and focal > 0:
+        telescope = {"name": str(header.get("TELESCOP") or f"{focal:g} mm"), "focal_length": float(focal)}
+        aperture = header.get("APTDIA")
+        if isinstance(aperture, (int, float)) and aperture > 0:
+            telescope["aperture"] = float(aperture)
+    pixel = header.get("XPIXSZ")
+    # Image compressée : NAXISn est celui de la table, ZNAXISn celui de l'image
+    width = header.get("ZNAXIS1", header.get("NAXIS1"))
+    height = header.get("ZNAXIS2", header.get("NAXIS2"))
+    if isinstance(pixel, (int, float)) and pixel > 0:
+        camera = {"name": str(header.get("INSTRUME") or f"{pixel:g} µm"), "pixel_size": float(pixel)}
+        if isinstance(width, int) and isinstance(height, int) and width > 0 and height > 0:
+            camera["width"] = width
+            camera["height"] = height
+    return {"telescope": telescope, "camera": camera}
@@ -0,0 +1,260 @@
+import os
+import struct
+import subprocess
+import sys
+from .fits_header import NAMING_KEYWORDS, scan_fits_header
+
+# FITS simples, compressés par tuiles (fpack) ou entièrement (gzip)
+FITS_EXTENSIONS = (
+    ".fits", ".fit", ".fts", ".fits.fz", ".fit.fz", ".fts.fz", ".fz",
+    ".fits.gz", ".fit.gz", ".fts.gz",
+)
+# Motifs des boîtes de dialogue, tirés de FITS_EXTENSIONS (les filtres Qt
+# distinguent la casse sous Linux)
+FITS_FILE_PATTERNS = " ".join(f"*{ext}" for ext in FITS_EXTENSIONS + tuple(e.upper() for e in FITS_EXTENSIONS))
+FITS_FILE_FILTER = f"Fichiers FITS ({FITS_FILE_PATTERNS})"
+
+def is_fits_file(file_path):
+    return file_path.lower().endswith(FITS_EXTENSIONS)
+
+# Type d'entrée de l'index de métadonnées pour le nommage ; changé quand les
+# champs extraits changent (ajout du filtre, lecture des en-têtes FITS, chaînes CONTINUE)
+NAMING_INDEX_KIND = "naming-v3"
+
+# Préfixe lu pour trouver les balises de nommage (IFD0 et sous-IFD EXIF)
+EXIF_HEADER_BYTES = 256 * 1024
+TAG_MODEL = 0x0110
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+# Aperçus JPEG d'un RAW (CR2) : image de l'IFD0, vignette de l'IFD1
+TAG_STRIP_OFFSETS = 0x0111
+TAG_STRIP_BYTE_COUNTS = 0x0117
+TAG_JPEG_OFFSET = 0x0201
+TAG_JPEG_LENGTH = 0x0202
+TYPE_ASCII = 2
+TYPE_LONG = 4
+TYPE_IFD = 13
+
+# Systèmes de fichiers réseau : latence élevée, on multiplie les lectures en parallèle
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smbfs", "smb3", "afpfs", "webdav", "fuse.sshfs", "9p"}
+LOCAL_WORKERS = 4
+NETWORK_WORKERS = 32
+
+def tiff_start(buf):
+    # Position de l'en-tête TIFF : début du fichier (TIFF, CR2, NEF, DNG…)
+    # ou segment APP1 « Exif » d'un JPEG
+    if buf[:2] in (b"II", b"MM"):
+        return 0
+    if buf[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 4 <= len(buf) and buf[pos] == 0xFF:
+        marker = buf[pos + 1]
+        length = struct.unpack(">H", buf[pos + 2:pos + 4])[0]
+        if marker == 0xE1 and buf[pos + 4:pos + 10] == b"Exif\x00\x00":
+            return pos + 10
+        if marker == 0xDA:
+            break
+        pos += 2 + length
+    return None
+
+def read_ifd(buf, base, offset, endian, wanted):
+    # Lit les entrées voulues d'un IFD ; None si l'IFD sort du préfixe lu
+    start = base + offset
+    if start + 2 > len(buf):
+        return None
+    count = struct.unpack(endian + "H", buf[start:start + 2])[0]
+    if start + 2 + 12 * count > len(buf):
+        return None
+    values = {}
+    for i in range(count):
+        entry = start + 2 + 12 * i
+        tag, field_type, n, value = struct.unpack(endian + "HHII", buf[entry:entry + 12])
+        if tag not in wanted:
+            continue
+        if field_type == TYPE_ASCII:
+            if n <= 4:
+                raw = buf[entry + 8:entry + 8 + n]
+            else:
+                if base + value + n > len(buf):
+                    return None
+                raw = buf[base + value:base + value + n]
+            raw = raw.split(b"\x00", 1)[0]
+            try:
+                values[tag] = raw.decode("utf-8")
+            except UnicodeDecodeError:
+                values[tag] = raw.decode("latin-1")
+        elif field_type in (TYPE_LONG, TYPE_IFD):
+            values[tag] = value
+    return values
+
+def next_ifd(buf, base, offset, endian):
+    # Position de l'IFD suivant (0 s'il n'y en a pas), None hors du préfixe lu
+    start = base + offset
+    if start + 2 > len(buf):
+        return None
+    count = struct.unpack(endian + "H", buf[start:start + 2])[0]
+    end = start + 2 + 12 * count
+    if end + 4 > len(buf):
+        return None
+    return struct.unpack(endian + "I", buf[end:end + 4])[0]
+
+def tiff_header(buf):
+    # (base, boutisme, position de l'IFD0), ou None si le format n'est pas reconnu
+    base = tiff_start(buf)
+    if base is None or base + 8 > len(buf):
+        return None
+    order = buf[base:base + 2]
+    if order == b"II":
+        endian = "<"
+    elif order == b"MM":
+        endian = ">"
+    else:
+        return None
+    magic, ifd0 = struct.unpack(endian + "HI", buf[base + 2:base + 8])
+    # 42 : TIFF ; 0x4F52 / 0x5352 : ORF Olympus
+    if magic not in (42, 0x4F52, 0x5352):
+        return None
+    return base, endian, ifd0
+
+def embedded_jpeg(file_path, max_bytes=EXIF_HEADER_BYTES):
+    # Aperçu JPEG intégré à un RAW de type TIFF (CR2) : image pleine taille de
+    # l'IFD0, sinon vignette de l'IFD1. Seuls l'en-tête et l'aperçu sont lus.
+    with open(file_path, "rb") as f:
+        buf = f.read(max_bytes)
+        header = tiff_header(buf)
+        if header is None or header[0] != 0:
+            return None
+        base, endian, ifd0 = header
+        candidates = []
+        image = read_ifd(buf, base, ifd0, endian, {TAG_STRIP_OFFSETS, TAG_STRIP_BYTE_COUNTS})
+        if image and TAG_STRIP_OFFSETS in image and TAG_STRIP_BYTE_COUNTS in image:
+            candidates.append((image[TAG_STRIP_OFFSETS], image[TAG_STRIP_BYTE_COUNTS]))
+        ifd1 = next_ifd(buf, base, ifd0, endian)
+        if ifd1:
+            thumbnail = read_ifd(buf, base, ifd1, endian, {TAG_JPEG_OFFSET, TAG_JPEG_LENGTH})
+            if thumbnail and TAG_JPEG_OFFSET in thumbnail and TAG_JPEG_LENGTH in thumbnail:
+                candidates.append((thumbnail[TAG_JPEG_OFFSET], thumbnail[TAG_JPEG_LENGTH]))
+        for offset, length in candidates:
+            if length <= 0:
+                continue
+            f.seek(base + offset)
+            data = f.read(length)
+            if data[:2] == b"\xff\xd8":
+                return data
+    return None
+
+def read_header_tags(file_path, max_bytes=EXIF_HEADER_BYTES):
+    # Date et modèle lus dans les seuls IFD utiles, sur un préfixe borné du fichier.
+    # Renvoie des noms de balises comme exifread, ou None si le format n'est pas reconnu.
+    with open(file_path, "rb") as f:
+        buf = f.read(max_bytes)
+    header = tiff_header(buf)
+    if header is None:
+        return None
+    base, endian, ifd0 = header
+    image = read_ifd(buf, base, ifd0, endian, {TAG_MODEL, TAG_DATETIME, TAG_EXIF_IFD})
+    if image is None:
+        return None
+    tags = {}
+    if TAG_MODEL in image:
+        tags["Image Model"] = image[TAG_MODEL]
+    if TAG_DATETIME in image:
+        tags["Image DateTime"] = image[TAG_DATETIME]
+    if TAG_EXIF_IFD in image:
+        exif = read_ifd(buf, base, image[TAG_EXIF_IFD], endian, {TAG_DATETIME_ORIGINAL})
+        if exif is None:
+            return None
+        if TAG_DATETIME_ORIGINAL in exif:
+            tags["EXIF DateTimeOriginal"] = exif[TAG_DATETIME_ORIGINAL]
+    return tags
+
+def filesystem_type(path):
+    # Type du système de fichiers contenant path (« nfs », « smbfs », « apfs »…), ou None
+    path = os.path.realpath(path)
+    mounts = []
+    try:
+        if sys.platform.startswith("linux"):
+            with open("/proc/mounts") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 3:
+                        mounts.append((parts[1].replace("\\040", " "), parts[2]))
+        else:
+            # macOS / BSD : « //user@nas/share on /Volumes/share (smbfs, nodev, …) »
+            output = subprocess.run(["mount"], capture_output=True, text=True, timeout=2).stdout
+            for line in output.splitlines():
+                if " on " in line and " (" in line:
+                    point = line.split(" on ", 1)[1].rsplit(" (", 1)
+                    mounts.append((point[0], point[1].split(",")[0].rstrip(")")))
+    except Exception:
+        return None
+    best = None
+    for point, fstype in mounts:
+        if path == point or path.startswith(os.path.join(point, "")):
+            if best is None or len(point) > len(best[0]):
+                best = (point, fstype)
+    return best[1] if best else None
+
+def default_workers(folder):
+    # Disque local : peu de lectures parallèles suffisent ; NAS : la latence domine
+    if filesystem_type(folder) in NETWORK_FILESYSTEMS:
+        return NETWORK_WORKERS
+    return LOCAL_WORKERS
+
+def read_exif(file_path, keys=None):
+    # keys : pour un FITS, seuls ces mots-clés sont extraits de l'en-tête
+    try:
+        if is_fits_file(file_path):
+            # En-tête lu directement, bloc par bloc jusqu'à END : l'image n'est jamais lue
+            header = scan_fits_header(file_path, keys)
+            return {str(k): str(v) for k, v in header.items()}
+        else:
+            import exifread
+            with open(file_path, 'rb') as f:
+                tags = exifread.process_file(f, details=False)
+                return {str(tag): str(value) for tag, value in tags.items()}
+    except Exception as e:
+        return {"Error": str(e)}
+
+def fits_naming_info(filepath):
+    # DATE-OBS (« 2024-03-01T21:15:42.125 ») -> « 2024-03-01_21-15-42 »
+    header = scan_fits_header(filepath, NAMING_KEYWORDS)
+    date_str = str(header.get("DATE-OBS") or "").split(".", 1)[0]
+    date_str = date_str.replace("T", "_").replace(":", "-").replace(" ", "_")
+    model_str = str(header.get("INSTRUME") or "").strip().replace(" ", "_")
+    filter_str = str(header.get("FILTER") or "").strip().replace(" ", "_")
+    return {"date": date_str, "model": model_str, "filter": filter_str}
+
+def read_naming_info(filepath):
+    # Date de prise de vue, modèle d'appareil et filtre, mis en forme pour un nom de fichier.
+    # Lecture directe des IFD en priorité, exifread complet en secours ; en-tête pour un FITS.
+    date_str = ""
+    model_str = ""
+    if is_fits_file(filepath):
+        try:
+            return fits_naming_info(filepath)
+        except Exception:
+            return {"date": date_str, "model": model_str, "filter": ""}
+    try:
+        try:
+            tags = read_header_tags(filepath)
+        except (OSError, struct.error):
+            tags = None
+        if not tags:
+            # Formats non reconnus par la lecture directe (CR3, HEIF…)
+            import exifread
+            with open(filepath, 'rb') as f:
+                tags = exifread.process_file(f, stop_tag="UNDEF", details=False)
+        # Date
+        date_tag = tags.get("EXIF DateTimeOriginal") or tags.get("Image DateTime")
+        if date_tag:
+            date_str = str(date_tag).replace(":", "-").replace(" ", "_")
+        # Modèle appareil
+        model_tag = tags.get("Image Model")
+        if model_tag:
+            model_str = str(model_tag).replace(" ", "_")
+    except Exception:
+        pass
+    return {"date": date_str, "model": model_str, "filter": ""}
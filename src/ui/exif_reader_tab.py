@@ -6,33 +6,12 @@ from PyQt5.QtWidgets import (
     QTableWidget, QTableWidgetItem, QApplication, QLabel, QLineEdit
 )
 from PyQt5.QtCore import Qt
-import exifread
-
-# Ajout pour FITS
-try:
-    from astropy.io import fits
-except ImportError:
-    fits = None
+from .exif_extract import FITS_FILE_PATTERNS, read_exif
+from .metadata_index import get_metadata_index
 
 HISTORY_FILE = "exif_history.json"
 MAX_HISTORY = 5
 
-def read_exif(file_path):
-    ext = os.path.splitext(file_path)[1].lower()
-    try:
-        if ext == ".fits":
-            if fits is None:
-                return {"Error": "astropy n'est pas installé"}
-            with fits.open(file_path) as hdul:
-                header = hdul[0].header
-                return {str(k): str(v) for k, v in header.items()}
-        else:
-            with open(file_path, 'rb') as f:
-                tags = exifread.process_file(f, details=False)
-                return {str(tag): str(value) for tag, value in tags.items()}
-    except Exception as e:
-        return {"Error": str(e)}
-
 def load_history():
     if os.path.exists(HISTORY_FILE):
         with open(HISTORY_FILE, "r") as f:
@@ -74,7 +53,7 @@ class ExifReaderTab(QWidget):
             self,
             "Choisir un fichier",
             "",
-            "Images (*.jpg *.jpeg *.png *.cr2 *.CR2 *.cr3 *.CR3 *.fits *.FITS)"
+            f"Images (*.jpg *.jpeg *.png *.cr2 *.CR2 *.cr3 *.CR3 {FITS_FILE_PATTERNS})"
         )
         if file_path:
             self.add_to_history(file_path)
@@ -98,7 +77,10 @@ class ExifReaderTab(QWidget):
             self.display_exif(self.history[index])
 
     def display_exif(self, file_path):
-        exif = read_exif(file_path)
+        try:
+            exif = get_metadata_index().get(file_path, "exif", read_exif)
+        except OSError as e:
+            exif = {"Error": str(e)}
         self.current_exif = exif
         self.populate_table(exif)
         self.search_bar.clear()
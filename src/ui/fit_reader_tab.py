@@ -3,21 +3,26 @@ import os
 import json
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QPushButton, QFileDialog, QComboBox,
-    QLabel, QApplication, QSlider, QHBoxLayout, QGraphicsView, QGraphicsScene, QGraphicsPixmapItem
+    QLabel, QApplication, QSlider, QHBoxLayout, QGraphicsView, QGraphicsScene, QSpinBox
 )
-from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QImage
+from PyQt5.QtCore import Qt, QTimer
 import numpy as np
 import pyqtgraph as pg
-from .star_detection import detect_stars
-
-try:
-    from astropy.io import fits
-except ImportError:
-    fits = None
+from .workers import JobRunner
+from .fits_loader import frame_store, fits, list_image_hdus
+from .exif_extract import FITS_FILE_FILTER
+from .stretch import StretchIndex, StretchEngine, STRETCH_MODES
+from .tile_view import TiledImageItem
 
 HISTORY_FILE = "fits_history.json"
 MAX_HISTORY = 5
+DETECTION_FWHM = 3.0
+DETECTION_THRESHOLD_SIGMA = 5.0
+# Au-delà, la détection se fait par tuiles en parallèle
+DETECTION_TILED_MIN_PIXELS = 4096 * 4096
+# La détection ne démarre qu'une fois la navigation arrêtée sur un plan
+DETECTION_DELAY_MS = 300
 
 def load_history():
     if os.path.exists(HISTORY_FILE):
@@ -29,32 +34,92 @@ def save_history(history):
     with open(HISTORY_FILE, "w") as f:
         json.dump(history[:MAX_HISTORY], f)
 
-def fits_to_qimage(data, vmin=None, vmax=None):
+def fits_to_qimage(data, vmin=None, vmax=None, mode="linear", engine=None):
     if data is None:
         return None, "Aucune donnée image"
     try:
-        data = np.nan_to_num(data)
-        if vmin is None:
-            vmin = np.percentile(data, 1)
-        if vmax is None:
-            vmax = np.percentile(data, 99)
-        data = np.clip(data, vmin, vmax)
-        data = data - vmin
-        if vmax - vmin > 0:
-            data = data / (vmax - vmin) * 255
-        data = data.astype(np.uint8)
-        h, w = data.shape
-        # S'assurer que les données sont contiguës
-        data_c = np.require(data, np.uint8, 'C')
+        if engine is None:
+            if vmin is None or vmax is None:
+                vmin_auto, vmax_auto = np.percentile(finite_pixels(data), [1, 99])
+                vmin = vmin_auto if vmin is None else vmin
+                vmax = vmax_auto if vmax is None else vmax
+            engine = StretchEngine(vmin, vmax, mode)
+        data_c = engine.apply(data)
+        h, w = data_c.shape
         qimg = QImage(data_c.data, w, h, w, QImage.Format_Grayscale8)
         return qimg.copy(), None  # copy pour éviter les soucis de GC
     except Exception as e:
         return None, str(e)
 
+def make_tile_renderer(vmin, vmax, mode="linear"):
+    # Un moteur par étirement : la LUT et les tampons servent à toutes les tuiles
+    engine = StretchEngine(vmin, vmax, mode)
+    def render(block):
+        qimg, error = fits_to_qimage(block, engine=engine)
+        return qimg
+    return render
+
+def finite_pixels(data):
+    # Pixels exploitables dans le type natif : vue sans copie pour les entiers,
+    # une seule copie (sans les NaN) pour les flottants
+    if data.dtype.kind in "iu":
+        return data.reshape(-1)
+    flat = data.reshape(-1)
+    return flat[np.isfinite(flat)]
+
+def frame_stretch_index(frame):
+    # Index construit une fois par plan : les sliders n'ont plus à reparcourir les pixels
+    if frame.stretch_index is None:
+        frame.stretch_index = StretchIndex(frame.stretch_pixels())
+    return frame.stretch_index
+
+def load_fits_job(job, file_path, min_percent, max_percent, mode, hdu_index=None, plane=0, neighbours=()):
+    # Exécuté hors du thread GUI : publie la liste des HDU (nouveau fichier),
+    # l'image, l'histogramme, puis prépare les plans voisins
+    if hdu_index is None:
+        hdus = list_image_hdus(file_path)
+        if not hdus:
+            raise ValueError("Aucune image 2D trouvée dans ce FITS")
+        job.emit("hdus", hdus)
+        hdu_index = hdus[0].index
+        if hdus[0].planes > 1:
+            neighbours = [(hdu_index, 1)]
+        elif len(hdus) > 1:
+            neighbours = [(hdus[1].index, 0)]
+    frame = frame_store.get(file_path, hdu_index, plane=plane)
+    data = frame.data
+    job.check_cancelled()
+    stretch_index = frame_stretch_index(frame)
+    if stretch_index.is_empty():
+        raise ValueError("Aucune donnée exploitable")
+    vmin, vmax = (float(v) for v in stretch_index.percentiles([min_percent, max_percent]))
+    # Les tuiles visibles sont étirées à l'affichage, pas l'image entière
+    job.emit("image", {
+        "path": file_path, "hdu_index": hdu_index, "plane": plane, "data": data,
+        "stretch_index": stretch_index, "vmin": vmin, "vmax": vmax, "mode": mode,
+        "min_percent": min_percent, "max_percent": max_percent,
+    })
+    job.emit("histogram", stretch_index.histogram(vmin, vmax, mode=mode))
+    # Plans voisins lus (memmap) et indexés pendant que celui-ci est affiché
+    for neighbour_hdu, neighbour_plane in neighbours:
+        job.check_cancelled()
+        frame_stretch_index(frame_store.get(file_path, neighbour_hdu, plane=neighbour_plane))
+
+def detect_stars_job(job, data, file_path, hdu_index, plane):
+    # photutils n'est chargé qu'à la première détection
+    from .star_detection import detection_cache
+    # Image compressée : la détection porte sur toute l'image, décompressée ici
+    data = np.asarray(data)
+    job.emit("stars", detection_cache.detect(
+        data, file_path, hdu_index, DETECTION_FWHM, DETECTION_THRESHOLD_SIGMA,
+        tiled=data.size >= DETECTION_TILED_MIN_PIXELS, plane=plane
+    ))
+
 class ZoomableGraphicsView(QGraphicsView):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
 
     def wheelEvent(self, event):
         zoom_in_factor = 1.25
@@ -94,17 +159,53 @@ class FitsViewerTab(QWidget):
         slider_layout.addWidget(self.min_slider)
         slider_layout.addWidget(QLabel("Max"))
         slider_layout.addWidget(self.max_slider)
+        self.stretch_combo = QComboBox()
+        for mode, label in STRETCH_MODES.items():
+            self.stretch_combo.addItem(label, mode)
+        self.stretch_combo.currentIndexChanged.connect(self.update_image)
+        slider_layout.addWidget(QLabel("Étirement"))
+        slider_layout.addWidget(self.stretch_combo)
         self.layout.addLayout(slider_layout)
 
+        # Navigation entre extensions et plans d'un cube
+        navigation_layout = QHBoxLayout()
+        navigation_layout.addWidget(QLabel("HDU"))
+        self.hdu_combo = QComboBox()
+        self.hdu_combo.currentIndexChanged.connect(self.select_hdu)
+        navigation_layout.addWidget(self.hdu_combo, 1)
+        navigation_layout.addWidget(QLabel("Plan"))
+        self.plane_spin = QSpinBox()
+        self.plane_spin.setRange(0, 0)
+        self.plane_spin.setEnabled(False)
+        self.plane_spin.valueChanged.connect(self.select_plane)
+        navigation_layout.addWidget(self.plane_spin)
+        self.layout.addLayout(navigation_layout)
+
         self.nb_stars_label = QLabel("Nombre d'étoiles détectées : -")
         self.layout.addWidget(self.nb_stars_label)
 
         self.roundness_label = QLabel("Roundness moyenne : -")
         self.layout.addWidget(self.roundness_label)
 
+        self.image_label = QLabel("")
+        self.layout.addWidget(self.image_label)
+
         self.history = load_history()
         self.update_history_combo()
         self.current_data = None
+        self.stretch_index = None
+        self.image_item = None
+        self.current_path = None
+        self.current_hdu_index = None
+        self.current_plane = 0
+        self.hdus = []
+        self.jobs = JobRunner()
+        # Pool séparé : une détection en cours ne retarde jamais l'affichage d'un plan
+        self.star_jobs = JobRunner(max_threads=1)
+        self.star_timer = QTimer(self)
+        self.star_timer.setSingleShot(True)
+        self.star_timer.setInterval(DETECTION_DELAY_MS)
+        self.star_timer.timeout.connect(self.start_star_detection)
 
         self.image_view = ZoomableGraphicsView()
         self.image_scene = QGraphicsScene()
@@ -123,7 +224,7 @@ class FitsViewerTab(QWidget):
             self,
             "Choisir un fichier FITS",
             "",
-            "Fichiers FITS (*.fits *.fit *.FITS *.FIT)"
+            FITS_FILE_FILTER
         )
         if file_path:
             self.add_to_history(file_path)
@@ -150,48 +251,115 @@ class FitsViewerTab(QWidget):
         if fits is None:
             self.image_label.setText("astropy n'est pas installé")
             return
-        try:
-            with fits.open(file_path) as hdul:
-                data = None
-                for hdu in hdul:
-                    d = hdu.data
-                    if d is not None:
-                        if d.ndim == 3:
-                            d = d[0]
-                        if d.ndim == 2:
-                            data = d
-                            break
-                if data is None:
-                    self.image_label.setText("Aucune image 2D trouvée dans ce FITS")
-                    self.current_data = None
-                    self.hist_widget.clear()
-                    return
-                self.current_data = data
-                # Détection d'étoiles et rondité
-                nb_stars, roundness1, roundness2 = detect_stars(self.current_data)
-                self.nb_stars_label.setText(f"Nombre d'étoiles détectées : {nb_stars}")
-                if roundness1 is not None:
-                    self.roundness_label.setText(f"Roundness moyenne : {roundness1:.3f} / {roundness2:.3f}")
-                else:
-                    self.roundness_label.setText("Roundness moyenne : -")
-                self.min_slider.setValue(1)
-                self.max_slider.setValue(99)
-                self.update_image()
-        except Exception as e:
-            self.image_label.setText(str(e))
-            self.current_data = None
-            self.hist_widget.clear()
+        # Nouveau fichier : la liste des HDU sera relue depuis les en-têtes
+        self.hdus = []
+        self.set_hdu_choices([])
+        self.current_path = file_path
+        self.submit_load(file_path, 1, 99)
+
+    def submit_load(self, file_path, min_percent, max_percent, hdu_index=None, plane=0, neighbours=()):
+        # Un nouveau chargement annule les précédents encore en cours
+        self.star_timer.stop()
+        self.star_jobs.cancel_all()
+        self.image_label.setText(f"Chargement de {os.path.basename(file_path)}…")
+        self.nb_stars_label.setText("Nombre d'étoiles détectées : …")
+        self.roundness_label.setText("Roundness moyenne : …")
+        self.jobs.submit(
+            load_fits_job, file_path, min_percent, max_percent, self.stretch_combo.currentData(),
+            hdu_index, plane, neighbours,
+            on_result=self.on_load_result, on_error=self.on_load_error
+        )
+
+    def set_hdu_choices(self, hdus):
+        self.hdu_combo.blockSignals(True)
+        self.hdu_combo.clear()
+        for info in hdus:
+            self.hdu_combo.addItem(info.label(), info.index)
+        self.hdu_combo.blockSignals(False)
+        self.set_plane_range(hdus[0].planes if hdus else 1)
+
+    def set_plane_range(self, planes):
+        self.plane_spin.blockSignals(True)
+        self.plane_spin.setRange(0, max(0, planes - 1))
+        self.plane_spin.setValue(0)
+        self.plane_spin.setEnabled(planes > 1)
+        self.plane_spin.blockSignals(False)
+
+    def select_hdu(self, position):
+        if not self.current_path or not 0 <= position < len(self.hdus):
+            return
+        self.set_plane_range(self.hdus[position].planes)
+        self.show_view(position, 0)
+
+    def select_plane(self, plane):
+        position = self.hdu_combo.currentIndex()
+        if self.current_path and 0 <= position < len(self.hdus):
+            self.show_view(position, plane)
+
+    def show_view(self, position, plane):
+        # Change d'extension ou de plan en gardant l'étirement choisi ; les voisins
+        # (plan suivant/précédent, ou extension suivante/précédente) sont préparés
+        info = self.hdus[position]
+        if info.planes > 1:
+            neighbours = [(info.index, p) for p in (plane + 1, plane - 1) if 0 <= p < info.planes]
+        else:
+            neighbours = [(self.hdus[p].index, 0) for p in (position + 1, position - 1) if 0 <= p < len(self.hdus)]
+        self.submit_load(
+            self.current_path, self.min_slider.value(), self.max_slider.value(),
+            info.index, plane, neighbours
+        )
+
+    def on_load_result(self, job_id, stage, payload):
+        if stage == "hdus":
+            self.hdus = payload
+            self.set_hdu_choices(payload)
+        elif stage == "image":
+            self.current_data = payload["data"]
+            self.stretch_index = payload["stretch_index"]
+            self.current_path = payload["path"]
+            self.current_hdu_index = payload["hdu_index"]
+            self.current_plane = payload["plane"]
+            # Bloque les signaux pour ne pas redessiner l'image à chaque setValue
+            self.min_slider.blockSignals(True)
+            self.max_slider.blockSignals(True)
+            self.min_slider.setValue(payload["min_percent"])
+            self.max_slider.setValue(payload["max_percent"])
+            self.min_slider.blockSignals(False)
+            self.max_slider.blockSignals(False)
+            self.image_label.setText("")
+            self.show_frame(payload["data"], payload["vmin"], payload["vmax"], payload["mode"], reset_zoom=False)
+            self.star_timer.start()
+        elif stage == "histogram":
+            self.plot_histogram(*payload)
+
+    def start_star_detection(self):
+        if self.current_data is None:
+            return
+        self.star_jobs.submit(
+            detect_stars_job, self.current_data, self.current_path, self.current_hdu_index, self.current_plane,
+            on_result=self.on_stars_result
+        )
+
+    def on_stars_result(self, job_id, stage, payload):
+        self.show_star_stats(*payload)
+
+    def on_load_error(self, job_id, message):
+        self.image_label.setText(message)
+        self.current_data = None
+        self.stretch_index = None
+        self.image_item = None
+        self.image_scene.clear()
+        self.hist_widget.clear()
+        self.nb_stars_label.setText("Nombre d'étoiles détectées : -")
+        self.roundness_label.setText("Roundness moyenne : -")
 
     def update_image(self):
         if self.current_data is None:
             self.hist_widget.clear()
             return
 
-        # Force float64 pour éviter les soucis de cast
-        data = np.array(self.current_data, dtype=np.float64)
-        flat = data.flatten()
-        flat = flat[np.isfinite(flat)]
-        if flat.size == 0:
+        data = self.current_data
+        if self.stretch_index.is_empty():
             self.image_label.setText("Aucune donnée exploitable")
             self.hist_widget.clear()
             return
@@ -208,8 +376,7 @@ class FitsViewerTab(QWidget):
             return
 
         try:
-            vmin = float(np.percentile(flat, min_percent))
-            vmax = float(np.percentile(flat, max_percent))
+            vmin, vmax = (float(v) for v in self.stretch_index.percentiles([min_percent, max_percent]))
         except Exception as e:
             self.image_label.setText(f"Erreur percentiles : {e}")
             self.hist_widget.clear()
@@ -220,42 +387,34 @@ class FitsViewerTab(QWidget):
             self.hist_widget.clear()
             return
 
-        # Affichage de l'image
-        qimg, error = fits_to_qimage(data, vmin, vmax)
-        if qimg is not None:
-            self.show_image(qimg, reset_zoom=False)
+        # Affichage de l'image : seules les tuiles visibles sont ré-étirées
+        mode = self.stretch_combo.currentData()
+        if self.image_item is not None:
+            self.image_item.set_renderer(make_tile_renderer(vmin, vmax, mode))
         else:
-            self.image_scene.clear()
+            self.show_frame(data, vmin, vmax, mode, reset_zoom=False)
 
-        # Histogramme sur les données affichées (après vmin/vmax)
+        self.plot_histogram(*self.stretch_index.histogram(vmin, vmax, mode=mode))
+
+    def plot_histogram(self, x, y):
         self.hist_widget.clear()
-        data_disp = np.clip(flat, vmin, vmax)
-        if vmax - vmin > 0:
-            data_disp = (data_disp - vmin) / (vmax - vmin) * 255
-        else:
-            data_disp = np.zeros_like(data_disp)
-        y, x = np.histogram(data_disp.astype(np.float64), bins=128)
-        # Pour stepMode=False, x[:-1] et y doivent avoir la même taille
-        self.hist_widget.plot(x[:-1], y, stepMode=False, fillLevel=0, brush=(150,150,255,150))
+        self.hist_widget.plot(x, y, stepMode=False, fillLevel=0, brush=(150,150,255,150))
         self.hist_widget.setXRange(0, 255, padding=0)
         self.hist_widget.setYRange(0, max(y)*1.05 if y.max() > 0 else 1, padding=0)
         self.hist_widget.repaint()
 
-        # Détection d'étoiles
-        nb_stars, roundness1, roundness2 = detect_stars(self.current_data)
+    def show_star_stats(self, nb_stars, roundness1, roundness2):
         self.nb_stars_label.setText(f"Nombre d'étoiles détectées : {nb_stars}")
         if roundness1 is not None:
             self.roundness_label.setText(f"Roundness moyenne : {roundness1:.3f} / {roundness2:.3f}")
         else:
             self.roundness_label.setText("Roundness moyenne : -")
-        print(f"Nombre d'étoiles détectées : {nb_stars}")
 
-    def show_image(self, qimg, reset_zoom=False):
+    def show_frame(self, data, vmin, vmax, mode="linear", reset_zoom=False):
         self.image_scene.clear()
-        pixmap = QPixmap.fromImage(qimg)
-        self.pixmap_item = QGraphicsPixmapItem(pixmap)
-        self.image_scene.addItem(self.pixmap_item)
-        self.image_view.setSceneRect(QRectF(pixmap.rect()))
+        self.image_item = TiledImageItem(data, make_tile_renderer(vmin, vmax, mode))
+        self.image_scene.addItem(self.image_item)
+        self.image_view.setSceneRect(self.image_item.boundingRect())
         if reset_zoom:
             self.image_view.resetTransform()
 
@@ -0,0 +1,187 @@
+import gzip
+
+# Lecture directe des en-têtes FITS, sans astropy : blocs de 2880 octets lus
+# jusqu'à la carte END, l'unité de données n'est jamais lue (seulement sautée
+# pour atteindre l'en-tête de l'extension suivante).
+FITS_BLOCK = 2880
+CARD_SIZE = 80
+NAMING_KEYWORDS = ("DATE-OBS", "INSTRUME", "FILTER", "EXPTIME", "OBJECT")
+# Au-delà, un mot-clé absent des premiers HDU n'est plus cherché
+MAX_SCANNED_HDUS = 4
+# Mots-clés de structure, toujours lus pour pouvoir sauter les données
+STRUCTURE_KEYWORDS = ("SIMPLE", "XTENSION", "BITPIX", "NAXIS", "PCOUNT", "GCOUNT", "ZIMAGE")
+# Cartes de commentaire, sans « = » : leur texte commence à la colonne 9
+COMMENTARY_KEYWORDS = ("COMMENT", "HISTORY", "")
+
+class FitsHeaderError(Exception):
+    pass
+
+def parse_value(text):
+    # Valeur d'une carte (après « = »), sans le commentaire
+    text = text.strip()
+    if text.startswith("'"):
+        # Chaîne : '' représente une apostrophe, les espaces de fin ne comptent pas
+        value = []
+        i = 1
+        while i < len(text):
+            if text[i] == "'":
+                if text[i + 1:i + 2] == "'":
+                    value.append("'")
+                    i += 2
+                    continue
+                break
+            value.append(text[i])
+            i += 1
+        return "".join(value).rstrip()
+    text = text.split("/", 1)[0].strip()
+    if text == "T":
+        return True
+    if text == "F":
+        return False
+    if not text:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text.replace("D", "E"))
+    except ValueError:
+        return text
+
+def read_header_cards(f, keywords=None):
+    # Lit un en-tête depuis la position courante. Renvoie {mot-clé: valeur}
+    # (tous, ou seulement keywords + mots-clés de structure), ou None en fin de fichier.
+    # En-tête complet : comme astropy, les cartes COMMENT/HISTORY répétées sont
+    # réunies (une par ligne) et les cartes HIERARCH gardées sous leur nom long.
+    wanted = None if keywords is None else set(keywords) | set(STRUCTURE_KEYWORDS)
+    values = {}
+    # Mot-clé dont la chaîne (terminée par « & ») se poursuit sur des cartes CONTINUE
+    continued = None
+    first = True
+    while True:
+        block = f.read(FITS_BLOCK)
+        if not block:
+            if first:
+                return None
+            raise FitsHeaderError("En-tête FITS tronqué (carte END absente)")
+        if len(block) < FITS_BLOCK:
+            raise FitsHeaderError("En-tête FITS tronqué")
+        if first and not (block.startswith(b"SIMPLE  =") or block.startswith(b"XTENSION=")):
+            raise FitsHeaderError("Fichier FITS invalide")
+        first = False
+        for start in range(0, FITS_BLOCK, CARD_SIZE):
+            card = block[start:start + CARD_SIZE].decode("ascii", "replace")
+            keyword = card[:8].rstrip()
+            if keyword == "END":
+                return values
+            if keyword == "CONTINUE" and continued is not None:
+                part = parse_value(card[10:])
+                if isinstance(part, str):
+                    # Chaîne longue : le « & » final est retiré avant d'ajouter la suite
+                    values[continued] = values[continued][:-1] + part
+                    if not part.endswith("&"):
+                        continued = None
+                    continue
+            continued = None
+            if wanted is None and keyword in COMMENTARY_KEYWORDS:
+                text = card[8:].rstrip()
+                # Carte entièrement vide : bourrage, pas un commentaire
+                if keyword or text:
+                    values[keyword] = f"{values[keyword]}\n{text}" if keyword in values else text
+                continue
+            if wanted is None and keyword == "HIERARCH" and "=" in card:
+                name, _, text = card[9:].partition("=")
+                keyword = name.strip()
+                if keyword not in values:
+                    values[keyword] = parse_value(text)
+                    if isinstance(values[keyword], str) and values[keyword].endswith("&"):
+                        continued = keyword
+                continue
+            if card[8:10] != "= ":
+                continue
+            if wanted is not None and keyword not in wanted and not keyword.startswith("NAXIS"):
+                continue
+            # Première occurrence seulement, comme astropy pour header[mot-clé]
+            if keyword not in values:
+                value = parse_value(card[10:])
+                values[keyword] = value
+                if isinstance(value, str) and value.endswith("&"):
+                    continued = keyword
+
+def data_size(header):
+    # Taille de l'unité de données, arrondie au bloc
+    naxis = header.get("NAXIS", 0)
+    if not naxis:
+        return 0
+    count = 1
+    for n in range(1, naxis + 1):
+        count *= header.get(f"NAXIS{n}", 0)
+    bits = abs(header.get("BITPIX", 8)) * header.get("GCOUNT", 1) * (header.get("PCOUNT", 0) + count)
+    size = bits // 8
+    return -(-size // FITS_BLOCK) * FITS_BLOCK
+
+def open_fits_stream(file_path):
+    # .gz : décompression au fil de la lecture (le saut des données reste séquentiel)
+    if file_path.lower().endswith(".gz"):
+        return gzip.open(file_path, "rb")
+    return open(file_path, "rb")
+
+# Mots-clés propres à la compression par tuiles, absents de l'en-tête de l'image
+COMPRESSION_KEYWORDS = (
+    "ZIMAGE", "ZCMPTYPE", "ZTILE", "ZNAME", "ZVAL", "ZQUANTIZ", "ZDITHER0", "ZSIMPLE",
+    "ZEXTEND", "ZTENSION", "ZPCOUNT", "ZGCOUNT", "ZBLOCKED", "ZHECKSUM", "ZDATASUM",
+)
+
+def uncompressed_view(header):
+    # En-tête d'une image compressée (fpack) présenté comme celui de l'image
+    # (ZBITPIX -> BITPIX, ZNAXISn -> NAXISn…), comme le fait astropy
+    if not header.get("ZIMAGE"):
+        return header
+    naxis = header.get("ZNAXIS", 0)
+    view = {"XTENSION": "IMAGE", "BITPIX": header.get("ZBITPIX"), "NAXIS": naxis}
+    for n in range(1, naxis + 1):
+        view[f"NAXIS{n}"] = header.get(f"ZNAXIS{n}")
+    view["PCOUNT"] = 0
+    view["GCOUNT"] = 1
+    for key, value in header.items():
+        if key in ("XTENSION", "BITPIX", "PCOUNT", "GCOUNT", "TFIELDS", "ZBITPIX"):
+            continue
+        if key.startswith(("NAXIS", "ZNAXIS", "TTYPE", "TFORM")) or key.startswith(COMPRESSION_KEYWORDS):
+            continue
+        view[key] = value
+    return view
+
+def scan_fits_header(file_path, keywords=None):
+    # keywords=None : en-tête complet du HDU image (primaire, ou première extension
+    # si le primaire est vide, cas des .fits.fz). Sinon, mots-clés demandés, cherchés
+    # dans le primaire puis dans les extensions suivantes s'ils y manquent.
+    with open_fits_stream(file_path) as f:
+        if keywords is None:
+            primary = read_header_cards(f)
+            if primary is None:
+                raise FitsHeaderError("Fichier FITS vide")
+            if primary.get("NAXIS", 0):
+                return primary
+            # Sans extension image, l'en-tête primaire seul est renvoyé
+            f.seek(data_size(primary), 1)
+            for _ in range(MAX_SCANNED_HDUS - 1):
+                header = read_header_cards(f)
+                if header is None:
+                    break
+                if header.get("ZIMAGE") or header.get("XTENSION") == "IMAGE":
+                    return uncompressed_view(header)
+                f.seek(data_size(header), 1)
+            return primary
+        found = {}
+        for _ in range(MAX_SCANNED_HDUS):
+            header = read_header_cards(f, keywords)
+            if header is None:
+                break
+            for key in keywords:
+                if key not in found and key in header:
+                    found[key] = header[key]
+            if len(found) == len(keywords):
+                break
+            f.seek(data_size(header), 1)
+        return found
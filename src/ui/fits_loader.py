@@ -0,0 +1,273 @@
+import collections
+import os
+import threading
+import numpy as np
+from .compressed_fits import CompressedImage
+
+try:
+    from astropy.io import fits
+except ImportError:
+    fits = None
+
+# Plan affiché et ses voisins immédiats, pour la navigation dans un cube,
+# dans la limite d'un budget mémoire
+FRAME_CACHE_SIZE = 8
+FRAME_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Entiers non signés stockés en FITS comme entiers signés + BZERO
+UNSIGNED_OFFSETS = {
+    np.dtype("int16").itemsize: 2**15,
+    np.dtype("int32").itemsize: 2**31,
+    np.dtype("int64").itemsize: 2**63,
+}
+
+class FitsFrame:
+    # Une image 2D d'un fichier FITS : `data` est l'unique tampon (en lecture seule)
+    # partagé par l'affichage, l'histogramme et la détection d'étoiles, ou une vue
+    # paresseuse (CompressedView, ScaledView) qui ne lit que les tranches demandées.
+    def __init__(self, path, hdu_index, data, header, plane=0, compressed=False):
+        self.path = path
+        self.hdu_index = hdu_index
+        self.plane = plane
+        # Pour un HDU compressé par tuiles, `data` est une vue paresseuse
+        # (CompressedView) : np.asarray(data) pour un tableau complet
+        self.data = data
+        self.header = header
+        self.compressed = compressed
+        # Index d'étirement, calculé une fois par le premier affichage
+        self.stretch_index = None
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def close(self):
+        # Seul un HDU compressé garde un fichier ouvert ; le memmap est libéré avec data
+        if self.compressed:
+            self.data.image.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def decimated(self, step):
+        # Image sous-échantillonnée (vignettes), sans lecture de l'image entière
+        if self.compressed:
+            return self.data.image.decimated(step)
+        return np.asarray(self.data[::step, ::step])
+
+    def stretch_pixels(self):
+        # Pixels servant à l'étirement : quelques blocs répartis si l'image est compressée
+        return self.data.sample() if self.compressed else self.data
+
+class HduInfo:
+    # Description d'un HDU image, tirée de son seul en-tête
+    def __init__(self, index, name, shape, dtype_name, compressed=False):
+        self.index = index
+        self.name = name
+        # Ordre numpy : (plans, lignes, colonnes) pour un cube
+        self.shape = shape
+        self.dtype_name = dtype_name
+        self.compressed = compressed
+
+    @property
+    def planes(self):
+        return self.shape[0] if len(self.shape) == 3 else 1
+
+    def label(self):
+        size = "×".join(str(n) for n in reversed(self.shape[-2:]))
+        text = f"{self.index} {self.name} {size} {self.dtype_name}"
+        if self.planes > 1:
+            text += f" ({self.planes} plans)"
+        if self.compressed:
+            text += " compressé"
+        return text
+
+BITPIX_NAMES = {8: "uint8", 16: "int16", 32: "int32", 64: "int64", -32: "float32", -64: "float64"}
+
+def list_image_hdus(file_path):
+    # HDU affichables (images 2D ou cubes 3D), sans lire aucune donnée
+    if fits is None:
+        raise ImportError("astropy n'est pas installé")
+    infos = []
+    with fits.open(file_path, memmap=True, do_not_scale_image_data=True) as hdul:
+        for i, hdu in enumerate(hdul):
+            if not hdu.is_image:
+                continue
+            header = hdu.header
+            naxis = header.get("NAXIS", 0)
+            if naxis not in (2, 3):
+                continue
+            shape = tuple(header.get(f"NAXIS{n}", 0) for n in range(naxis, 0, -1))
+            name = header.get("EXTNAME", "PRIMARY" if i == 0 else f"HDU{i}")
+            dtype_name = BITPIX_NAMES.get(header.get("BITPIX"), str(header.get("BITPIX")))
+            if (dtype_name.startswith("int") and header.get("BSCALE", 1) == 1
+                    and header.get("BZERO", 0) == UNSIGNED_OFFSETS.get(abs(header.get("BITPIX")) // 8)):
+                dtype_name = "u" + dtype_name
+            infos.append(HduInfo(i, name, shape, dtype_name, isinstance(hdu, fits.CompImageHDU)))
+    return infos
+
+def find_image_hdu_index(hdul):
+    # Premier HDU contenant une image 2D (ou un cube 3D), d'après les en-têtes seulement
+    for i, hdu in enumerate(hdul):
+        if not hdu.is_image:
+            continue
+        if hdu.header.get("NAXIS", 0) in (2, 3):
+            return i
+    return None
+
+def needs_scaling(raw, header):
+    blank = None if raw.dtype.kind == "f" else header.get("BLANK")
+    return header.get("BZERO", 0) != 0 or header.get("BSCALE", 1) != 1 or blank is not None
+
+def scale_raw_data(raw, header):
+    # Applique BZERO/BSCALE/BLANK sans passer par astropy (qui refuse le memmap
+    # dans ce cas). Sans mise à l'échelle, le memmap est renvoyé tel quel.
+    if not needs_scaling(raw, header):
+        return raw
+    bzero = header.get("BZERO", 0)
+    bscale = header.get("BSCALE", 1)
+    blank = None if raw.dtype.kind == "f" else header.get("BLANK")
+    # BZERO peut être écrit en flottant (32768.0) : seule sa valeur compte
+    if (raw.dtype.kind == "i" and bscale == 1 and blank is None
+            and float(bzero).is_integer() and int(bzero) == UNSIGNED_OFFSETS.get(raw.dtype.itemsize)):
+        # uint16 caméra : une seule copie, dans le type natif non signé
+        unsigned = raw.dtype.newbyteorder("=").str.replace("i", "u")
+        data = np.empty(raw.shape, dtype=unsigned)
+        np.bitwise_xor(raw.view(raw.dtype.str.replace("i", "u")), int(bzero), out=data, casting="unsafe")
+        return data
+    data = raw.astype(np.float32)
+    if blank is not None:
+        data[raw == blank] = np.nan
+    if bscale != 1:
+        data *= bscale
+    if bzero != 0:
+        data += bzero
+    return data
+
+class ScaledView:
+    # Memmap brut mis à l'échelle (BZERO/BSCALE/BLANK) seulement à la lecture :
+    # le découpage (avec ou sans pas) reste une vue sur le memmap, et seules les
+    # lignes effectivement lues sont converties. Même interface que CompressedView.
+    def __init__(self, raw, header):
+        self.raw = raw
+        self.header = header
+        self.dtype = scale_raw_data(raw[:1, :1], header).dtype
+
+    @property
+    def shape(self):
+        return self.raw.shape
+
+    @property
+    def size(self):
+        return self.raw.size
+
+    @property
+    def ndim(self):
+        return self.raw.ndim
+
+    @property
+    def nbytes(self):
+        return self.raw.size * self.dtype.itemsize
+
+    def __getitem__(self, key):
+        part = self.raw[key]
+        if isinstance(part, np.ndarray) and part.ndim == 2:
+            return ScaledView(part, self.header)
+        return scale_raw_data(np.asarray(part), self.header)
+
+    def __array__(self, dtype=None, copy=None):
+        data = scale_raw_data(self.raw, self.header)
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+def open_compressed_frame(file_path, hdul, hdu_index, plane):
+    # Le fichier reste ouvert tant que l'image est référencée : les blocs sont
+    # décompressés au fil des lectures (tuiles affichées, fenêtre de calcul)
+    hdu = hdul[hdu_index]
+    if len(hdu.shape) == 3 and not 0 <= plane < hdu.shape[0]:
+        raise ValueError(f"Plan {plane} hors du cube ({hdu.shape[0]} plans)")
+    if len(hdu.shape) != 3:
+        plane = 0
+    header = hdu.header.copy()
+    image = CompressedImage(hdul, hdu_index, plane, lambda raw: scale_raw_data(raw, header))
+    return FitsFrame(file_path, hdu_index, image.view(), header, plane, compressed=True)
+
+def open_frame(file_path, hdu_index=None, memmap=True, plane=0, lazy=False):
+    # lazy : la mise à l'échelle est faite à la lecture de chaque tranche
+    # (ScaledView) au lieu d'une copie complète en mémoire, pour les traitements
+    # qui ne parcourent l'image que par lignes (empilement, alignement, vignettes)
+    if fits is None:
+        raise ImportError("astropy n'est pas installé")
+    with fits.open(file_path, memmap=memmap, do_not_scale_image_data=True) as hdul:
+        if hdu_index is None:
+            hdu_index = find_image_hdu_index(hdul)
+        if hdu_index is None:
+            raise ValueError("Aucune image 2D trouvée dans ce FITS")
+        hdu = hdul[hdu_index]
+        if isinstance(hdu, fits.CompImageHDU) and len(hdu.shape) in (2, 3):
+            return open_compressed_frame(file_path, fits.open(
+                file_path, memmap=memmap, do_not_scale_image_data=True
+            ), hdu_index, plane)
+        # .fits.gz : compression de tout le fichier, astropy décompresse l'ensemble
+        raw = hdu.data
+        if raw is None or raw.ndim not in (2, 3):
+            raise ValueError("Aucune image 2D trouvée dans ce FITS")
+        if raw.ndim == 3:
+            if not 0 <= plane < raw.shape[0]:
+                raise ValueError(f"Plan {plane} hors du cube ({raw.shape[0]} plans)")
+            # Vue sur le seul plan demandé : rien d'autre n'est lu du memmap
+            raw = raw[plane]
+        else:
+            plane = 0
+        header = hdu.header.copy()
+        if lazy and needs_scaling(raw, header):
+            data = ScaledView(raw, header)
+        else:
+            data = scale_raw_data(raw, header)
+    # Le memmap reste valide après la fermeture du fichier tant que data est référencé
+    if isinstance(data, np.ndarray):
+        data.flags.writeable = False
+    return FitsFrame(file_path, hdu_index, data, header, plane)
+
+def frame_nbytes(frame):
+    # Les blocs décompressés sont comptés par leur propre cache
+    return 0 if frame.compressed else frame.data.nbytes
+
+class FrameStore:
+    # Garde les dernières images ouvertes pour que chaque HDU n'ait qu'un tampon
+    def __init__(self, max_entries=FRAME_CACHE_SIZE, max_bytes=FRAME_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, file_path, hdu_index=None, memmap=True, plane=0):
+        key = (os.path.abspath(file_path), os.stat(file_path).st_mtime_ns, hdu_index, plane)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        frame = open_frame(file_path, hdu_index, memmap, plane)
+        with self.lock:
+            self.entries[key] = frame
+            self.entries.move_to_end(key)
+            total = sum(frame_nbytes(f) for f in self.entries.values())
+            while len(self.entries) > 1 and (len(self.entries) > self.max_entries or total > self.max_bytes):
+                evicted = self.entries.popitem(last=False)[1]
+                total -= frame_nbytes(evicted)
+                evicted.close()
+        return frame
+
+    def clear(self):
+        with self.lock:
+            for frame in self.entries.values():
+                frame.close()
+            self.entries.clear()
+
+frame_store = FrameStore()
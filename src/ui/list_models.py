@@ -0,0 +1,175 @@
+import collections
+import os
+import numpy as np
+from PyQt5.QtCore import Qt, QAbstractListModel, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QBrush, QColor
+
+class NameListModel(QAbstractListModel):
+    # Liste de noms affichée par une QListView : les lignes ne sont construites
+    # qu'à l'affichage, à partir d'une seule liste de chaînes.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.names = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.names[index.row()]
+        return None
+
+    def set_names(self, names):
+        self.beginResetModel()
+        self.names = list(names)
+        self.endResetModel()
+
+    def clear(self):
+        self.set_names([])
+
+class PreviewListModel(NameListModel):
+    # Nouveaux noms ; la couleur (modifié ou non) est calculée à la demande
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.originals = []
+        self.changed_brush = QBrush(QColor("red"))
+        self.unchanged_brush = QBrush(QColor("black"))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self.names[row]
+        if role == Qt.ForegroundRole:
+            if self.names[row] != self.originals[row]:
+                return self.changed_brush
+            return self.unchanged_brush
+        return None
+
+    def set_preview(self, originals, names):
+        if len(names) != len(self.names) or originals != self.originals:
+            self.beginResetModel()
+            self.originals = list(originals)
+            self.names = list(names)
+            self.endResetModel()
+            return
+        # Même dossier : un seul dataChanged couvrant les lignes modifiées
+        changed = [i for i, (old, new) in enumerate(zip(self.names, names)) if old != new]
+        if not changed:
+            return
+        self.names = list(names)
+        self.dataChanged.emit(self.index(changed[0]), self.index(changed[-1]))
+
+    def clear(self):
+        self.set_preview([], [])
+
+class ArrayTableModel(QAbstractTableModel):
+    # Tableau décrit par colonnes (titre, tableau numpy, format) : les cellules
+    # sont formatées à l'affichage seulement, le tri et le filtrage ne manipulent
+    # qu'un tableau d'indices de lignes.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.titles = []
+        self.values = []
+        self.formats = []
+        self.brushes = None
+        self.rows = np.empty(0, dtype=np.intp)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.titles)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return self.formats[index.column()](self.values[index.column()][row])
+        if role == Qt.BackgroundRole and self.brushes is not None:
+            return self.brushes[row]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.titles[section]
+        return super().headerData(section, orientation, role)
+
+    def set_columns(self, columns, brushes=None, mask=None):
+        # columns : [(titre, valeurs, format)] ; mask : lignes affichées
+        self.beginResetModel()
+        self.titles = [title for title, _, _ in columns]
+        self.values = [np.asarray(values) for _, values, _ in columns]
+        self.formats = [fmt for _, _, fmt in columns]
+        self.brushes = brushes
+        count = len(self.values[0]) if self.values else 0
+        self.rows = np.arange(count) if mask is None else np.flatnonzero(mask)
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if not self.values:
+            return
+        self.layoutAboutToBeChanged.emit()
+        keys = self.values[column][self.rows]
+        ranks = np.argsort(keys, kind="stable")
+        if order == Qt.DescendingOrder:
+            ranks = ranks[::-1]
+        self.rows = self.rows[ranks]
+        self.layoutChanged.emit()
+
+class ThumbnailListModel(NameListModel):
+    # Grille de vignettes : une vignette n'est demandée (request(ligne)) que
+    # lorsque la vue l'affiche. Seules les max_pixmaps plus récentes restent
+    # en mémoire ; les autres seront redemandées (au cache disque) si besoin.
+    def __init__(self, request, placeholder, max_pixmaps, parent=None):
+        super().__init__(parent)
+        self.request = request
+        self.placeholder = placeholder
+        self.max_pixmaps = max_pixmaps
+        self.paths = []
+        self.pixmaps = collections.OrderedDict()
+        self.requested = set()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self.names[row]
+        if role == Qt.ToolTipRole:
+            return self.paths[row]
+        if role == Qt.DecorationRole:
+            pixmap = self.pixmaps.get(row)
+            if pixmap is not None:
+                self.pixmaps.move_to_end(row)
+                return pixmap
+            if row not in self.requested:
+                self.requested.add(row)
+                self.request(row)
+            return self.placeholder
+        return None
+
+    def set_paths(self, paths):
+        self.beginResetModel()
+        self.paths = list(paths)
+        self.names = [os.path.basename(p) for p in paths]
+        self.pixmaps.clear()
+        self.requested.clear()
+        self.endResetModel()
+
+    def set_pixmap(self, row, pixmap):
+        self.requested.discard(row)
+        self.pixmaps[row] = pixmap
+        self.pixmaps.move_to_end(row)
+        while len(self.pixmaps) > self.max_pixmaps:
+            self.pixmaps.popitem(last=False)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def forget_requests(self):
+        # Demandes annulées : les lignes encore visibles seront redemandées au prochain affichage
+        self.requested.clear()
@@ -0,0 +1,216 @@
+import math
+import os
+import numpy as np
+from .exif_extract import FITS_EXTENSIONS
+from .fits_loader import fits, open_frame
+from .registration import (
+    CACHED_SOURCES, RegistrationError, RegistrationOptions, register_points, resample_rows, source_points
+)
+from .stacking import calibrate
+
+# Lignes accumulées à la fois : les temporaires ne dépendent pas de la taille de l'image
+LIVE_CHUNK_ROWS = 256
+# Plus grand côté de l'aperçu de l'empilement
+PREVIEW_SIZE = 800
+# Au-delà, la détection se fait par tuiles en parallèle
+LIVE_TILED_MIN_PIXELS = 4096 * 4096
+
+LIVE_COLUMNS = [
+    "file", "status", "n_stars", "fwhm", "eccentricity", "background", "noise",
+    "dx", "dy", "rotation", "stacked", "error",
+]
+
+class FolderScanner:
+    # Nouveaux fichiers d'un dossier. Un fichier n'est signalé qu'une fois sa
+    # taille et son mtime identiques d'un passage à l'autre : la caméra a fini de l'écrire.
+    def __init__(self, folder, extensions=FITS_EXTENSIONS, include_existing=False, ignored=()):
+        self.folder = folder
+        self.extensions = extensions
+        # Noms déjà signalés (ou présents au départ, ou ignorés) et fichiers en cours d'écriture
+        self.done = set(ignored)
+        self.growing = {}
+        if not include_existing:
+            self.done.update(self.entries())
+
+    def entries(self):
+        result = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                name = entry.name
+                if name.startswith(".") or not name.lower().endswith(self.extensions):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                result[name] = (st.st_size, st.st_mtime_ns)
+        return result
+
+    def poll(self):
+        # Chemins des fichiers prêts depuis le dernier passage, par ordre de nom
+        entries = self.entries()
+        ready = []
+        for name, signature in entries.items():
+            if name in self.done:
+                continue
+            if signature[0] > 0 and self.growing.get(name) == signature:
+                del self.growing[name]
+                self.done.add(name)
+                ready.append(name)
+            else:
+                self.growing[name] = signature
+        for name in [n for n in self.growing if n not in entries]:
+            del self.growing[name]
+        return [os.path.join(self.folder, name) for name in sorted(ready)]
+
+class RunningStack:
+    # Moyenne et variance par pixel mises à jour image par image (Welford) : la
+    # mémoire est celle de trois images, quel que soit le nombre d'images reçues.
+    # Les pixels NaN (bords après alignement) ne comptent pas ; avec clip_sigma,
+    # un pixel trop loin de la moyenne courante (satellite, avion) est ignoré.
+    def __init__(self, clip_sigma=None, chunk_rows=LIVE_CHUNK_ROWS):
+        self.clip_sigma = clip_sigma
+        self.chunk_rows = chunk_rows
+        self.shape = None
+        self.mean = None
+        self.m2 = None
+        self.count = None
+        self.frames = 0
+
+    def add(self, rows_of, shape):
+        # rows_of(r0, r1) -> lignes r0 à r1 (float32) de l'image à ajouter
+        if self.shape is None:
+            self.shape = shape
+            self.mean = np.zeros(shape, dtype=np.float32)
+            self.m2 = np.zeros(shape, dtype=np.float32)
+            self.count = np.zeros(shape, dtype=np.uint16)
+        elif shape != self.shape:
+            raise ValueError(f"Taille {shape} différente de l'empilement {self.shape}")
+        for r0 in range(0, shape[0], self.chunk_rows):
+            r1 = min(shape[0], r0 + self.chunk_rows)
+            x = rows_of(r0, r1)
+            count = self.count[r0:r1]
+            mean = self.mean[r0:r1]
+            m2 = self.m2[r0:r1]
+            valid = np.isfinite(x)
+            if self.clip_sigma is not None:
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    std = np.sqrt(m2 / np.maximum(count.astype(np.float32) - 1, 1))
+                    valid &= ~((count >= 3) & (np.abs(x - mean) > self.clip_sigma * std))
+            count += valid
+            delta = np.where(valid, x - mean, 0).astype(np.float32)
+            mean += delta / np.maximum(count, 1)
+            m2 += delta * np.where(valid, x - mean, 0)
+        self.frames += 1
+
+    def result(self):
+        # Moyenne (NaN là où aucune image n'a contribué)
+        if self.mean is None:
+            return None
+        return np.where(self.count > 0, self.mean, np.nan).astype(np.float32)
+
+    def variance(self):
+        if self.mean is None:
+            return None
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 1, self.m2 / (self.count.astype(np.float32) - 1), np.nan)
+
+    def preview(self, size=PREVIEW_SIZE):
+        # Moyenne sous-échantillonnée : coût d'affichage constant
+        if self.mean is None:
+            return None
+        step = max(1, int(math.ceil(max(self.shape) / size)))
+        count = self.count[::step, ::step]
+        return np.where(count > 0, self.mean[::step, ::step], np.nan).astype(np.float32)
+
+class LiveOptions:
+    def __init__(self, fwhm=3.0, threshold_sigma=5.0, align=True, max_fwhm=None, min_stars=0,
+                 clip_sigma=None, masters=None):
+        self.fwhm = fwhm
+        self.threshold_sigma = threshold_sigma
+        self.align = align
+        # Tri en direct : image écartée de l'empilement au-delà de ces limites
+        self.max_fwhm = max_fwhm
+        self.min_stars = min_stars
+        self.clip_sigma = clip_sigma
+        # Masters (stacking) appliqués à chaque image, ou None
+        self.masters = masters
+
+class LiveSession:
+    # Traitement d'une image à la fois : mesure, tri, alignement sur la première
+    # image acceptée, ajout à l'empilement. Seule l'image en cours est en mémoire.
+    def __init__(self, options=None):
+        self.options = options or LiveOptions()
+        self.stack = RunningStack(self.options.clip_sigma)
+        self.reference = None
+        self.registration = RegistrationOptions(self.options.fwhm, self.options.threshold_sigma)
+
+    def process(self, file_path):
+        from .star_detection import measure_sources
+        options = self.options
+        row = {column: None for column in LIVE_COLUMNS}
+        row["file"] = file_path
+        frame = None
+        try:
+            frame = open_frame(file_path)
+            data = np.asarray(frame.data)
+            stats, table = measure_sources(
+                data, options.fwhm, options.threshold_sigma,
+                tiled=data.size >= LIVE_TILED_MIN_PIXELS, quick=True
+            )
+            row.update({k: v for k, v in stats.items() if k in row})
+            if stats["n_stars"] < options.min_stars:
+                row["status"] = "rejetée"
+                row["error"] = f"{stats['n_stars']} étoiles"
+                return row
+            if options.max_fwhm and (stats["fwhm"] is None or stats["fwhm"] > options.max_fwhm):
+                row["status"] = "rejetée"
+                row["error"] = "FWHM trop élevée"
+                return row
+            masters = options.masters
+            if options.align:
+                points = source_points(table, CACHED_SOURCES)
+                if self.reference is None:
+                    if len(points) < self.registration.min_matches:
+                        raise RegistrationError(f"Trop peu d'étoiles pour servir de référence ({len(points)})")
+                    self.reference = points
+                    matrix = np.array([[1.0, 0.0], [0.0, 1.0], [0.0, 0.0]])
+                else:
+                    matrix, _, _ = register_points(points, self.reference, self.registration)
+                row["dx"], row["dy"] = float(matrix[2, 0]), float(matrix[2, 1])
+                row["rotation"] = math.degrees(math.atan2(matrix[0, 1] - matrix[1, 0], matrix[0, 0] + matrix[1, 1]))
+                inverse = np.linalg.inv(np.vstack([matrix.T, [0, 0, 1]]))[:2].T
+                width = frame.shape[1]
+
+                def rows_of(r0, r1):
+                    return resample_rows(frame, inverse, r0, r1, width, masters)
+            else:
+                def rows_of(r0, r1):
+                    rows = np.array(data[r0:r1], dtype=np.float32)[None]
+                    return calibrate(rows, masters, r0, r1)[0]
+            self.stack.add(rows_of, frame.shape)
+            row["status"] = "empilée"
+            row["stacked"] = self.stack.frames
+        except Exception as e:
+            row["status"] = "erreur"
+            row["error"] = str(e)
+        finally:
+            # L'image est entièrement ajoutée à la pile : fichier compressé fermé
+            if frame is not None:
+                frame.close()
+        return row
+
+    def save(self, output_path):
+        result = self.stack.result()
+        if result is None:
+            raise ValueError("Aucune image empilée")
+        header = fits.Header()
+        header["IMAGETYP"] = "LIGHT"
+        header["NCOMBINE"] = (self.stack.frames, "Nombre d'images empilees")
+        header["STACKMTH"] = ("live mean", "Moyenne incrementale")
+        tmp_path = output_path + ".tmp"
+        fits.PrimaryHDU(result, header=header).writeto(tmp_path, overwrite=True)
+        os.replace(tmp_path, output_path)
+        return output_path
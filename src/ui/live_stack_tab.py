@@ -0,0 +1,256 @@
+import collections
+import os
+import numpy as np
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog, QLabel, QCheckBox,
+    QDoubleSpinBox, QSpinBox, QTableWidget, QTableWidgetItem, QAbstractItemView, QMessageBox
+)
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtCore import Qt, QTimer, QFileSystemWatcher, pyqtSignal
+from .workers import JobRunner
+from .stretch import StretchEngine
+from .live_stack import LIVE_COLUMNS, PREVIEW_SIZE, FolderScanner, LiveOptions, LiveSession
+
+# Deuxième passage nécessaire pour vérifier qu'un fichier a fini d'être écrit ;
+# sert aussi de secours quand le système ne signale pas les changements (partage réseau)
+LIVE_POLL_MS = 2000
+# Regroupe les notifications d'un fichier en cours d'écriture
+WATCH_DEBOUNCE_MS = 500
+# Lignes gardées dans le tableau : la session peut durer toute la nuit
+LIVE_TABLE_MAX_ROWS = 500
+LIVE_RESULT_FILE = "live_stack.fits"
+
+COLUMN_LABELS = {
+    "file": "Fichier",
+    "status": "État",
+    "n_stars": "Étoiles",
+    "fwhm": "FWHM (px)",
+    "eccentricity": "Excentricité",
+    "background": "Fond",
+    "noise": "Bruit",
+    "dx": "dx",
+    "dy": "dy",
+    "rotation": "Rotation (°)",
+    "stacked": "Empilées",
+    "error": "Erreur",
+}
+
+def preview_image(data):
+    # QImage construite dans le job (pas de QPixmap hors du thread GUI)
+    finite = data[np.isfinite(data)]
+    if finite.size == 0:
+        return None
+    vmin, vmax = np.percentile(finite, [1, 99.5])
+    pixels = np.ascontiguousarray(StretchEngine(vmin, vmax, "asinh").apply(data))
+    h, w = pixels.shape
+    return QImage(pixels.data, w, h, w, QImage.Format_Grayscale8).copy()
+
+def live_frame_job(job, session, path):
+    row = session.process(path)
+    job.emit("frame", row)
+    if row["status"] == "empilée":
+        job.emit("preview", preview_image(session.stack.preview()))
+
+def live_save_job(job, session, output_path):
+    job.emit("saved", session.save(output_path))
+
+class LiveStackTab(QWidget):
+    open_in_viewer = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.folder = None
+        self.scanner = None
+        self.session = None
+        self.queue = collections.deque()
+        # Une image à la fois, dans l'ordre d'arrivée : la session n'est jamais partagée
+        self.jobs = JobRunner(max_threads=1)
+        self.busy = False
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.schedule_poll)
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setSingleShot(True)
+        self.watch_timer.setInterval(WATCH_DEBOUNCE_MS)
+        self.watch_timer.timeout.connect(self.poll)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(LIVE_POLL_MS)
+        self.poll_timer.timeout.connect(self.poll)
+        self.layout = QVBoxLayout(self)
+
+        folder_layout = QHBoxLayout()
+        self.select_btn = QPushButton("Choisir le dossier de la caméra…")
+        self.select_btn.clicked.connect(self.select_folder)
+        folder_layout.addWidget(self.select_btn)
+        self.existing_checkbox = QCheckBox("Inclure les fichiers déjà présents")
+        folder_layout.addWidget(self.existing_checkbox)
+        self.layout.addLayout(folder_layout)
+
+        self.info_label = QLabel("Aucun dossier sélectionné.")
+        self.layout.addWidget(self.info_label)
+
+        params_layout = QHBoxLayout()
+        self.align_checkbox = QCheckBox("Aligner")
+        self.align_checkbox.setChecked(True)
+        params_layout.addWidget(self.align_checkbox)
+        params_layout.addWidget(QLabel("FWHM max :"))
+        self.max_fwhm_spin = QDoubleSpinBox()
+        self.max_fwhm_spin.setRange(0.0, 30.0)
+        self.max_fwhm_spin.setSpecialValueText("—")
+        params_layout.addWidget(self.max_fwhm_spin)
+        params_layout.addWidget(QLabel("Étoiles min :"))
+        self.min_stars_spin = QSpinBox()
+        self.min_stars_spin.setRange(0, 10000)
+        params_layout.addWidget(self.min_stars_spin)
+        params_layout.addWidget(QLabel("Rejet (sigma) :"))
+        self.clip_spin = QDoubleSpinBox()
+        self.clip_spin.setRange(0.0, 10.0)
+        self.clip_spin.setValue(3.0)
+        self.clip_spin.setSpecialValueText("—")
+        params_layout.addWidget(self.clip_spin)
+        self.layout.addLayout(params_layout)
+
+        buttons_layout = QHBoxLayout()
+        self.start_btn = QPushButton("Démarrer")
+        self.start_btn.clicked.connect(self.start)
+        buttons_layout.addWidget(self.start_btn)
+        self.stop_btn = QPushButton("Arrêter")
+        self.stop_btn.clicked.connect(self.stop)
+        self.stop_btn.setEnabled(False)
+        buttons_layout.addWidget(self.stop_btn)
+        self.save_btn = QPushButton("Enregistrer et ouvrir dans le visualiseur")
+        self.save_btn.clicked.connect(self.save_result)
+        self.save_btn.setEnabled(False)
+        buttons_layout.addWidget(self.save_btn)
+        self.layout.addLayout(buttons_layout)
+
+        self.preview_label = QLabel("")
+        self.preview_label.setAlignment(Qt.AlignCenter)
+        self.preview_label.setMinimumHeight(PREVIEW_SIZE // 2)
+        self.layout.addWidget(self.preview_label, 1)
+
+        self.table = QTableWidget(0, len(LIVE_COLUMNS))
+        self.table.setHorizontalHeaderLabels([COLUMN_LABELS[c] for c in LIVE_COLUMNS])
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.layout.addWidget(self.table, 1)
+
+    def select_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Sélectionner un dossier", os.path.expanduser("~"))
+        if folder:
+            self.stop()
+            self.folder = folder
+            self.info_label.setText(f"Dossier surveillé : {folder}")
+
+    def live_options(self):
+        return LiveOptions(
+            align=self.align_checkbox.isChecked(),
+            max_fwhm=self.max_fwhm_spin.value() or None,
+            min_stars=self.min_stars_spin.value(),
+            clip_sigma=self.clip_spin.value() or None,
+        )
+
+    def start(self):
+        if not self.folder:
+            QMessageBox.warning(self, "Erreur", "Aucun dossier sélectionné.")
+            return
+        self.jobs.cancel_all()
+        self.queue.clear()
+        self.busy = False
+        self.session = LiveSession(self.live_options())
+        # Le résultat enregistré dans le dossier ne doit pas être repris comme une image
+        self.scanner = FolderScanner(
+            self.folder, include_existing=self.existing_checkbox.isChecked(), ignored=(LIVE_RESULT_FILE,)
+        )
+        self.table.setRowCount(0)
+        self.preview_label.clear()
+        self.watcher.addPath(self.folder)
+        self.poll_timer.start()
+        self.start_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
+        self.info_label.setText(f"En attente de nouvelles images dans {self.folder}")
+        self.poll()
+
+    def stop(self):
+        # L'empilement est gardé : il peut encore être enregistré
+        self.poll_timer.stop()
+        self.watch_timer.stop()
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        self.queue.clear()
+        self.scanner = None
+        self.start_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+
+    def schedule_poll(self, path):
+        self.watch_timer.start()
+
+    def poll(self):
+        if self.scanner is None:
+            return
+        try:
+            self.queue.extend(self.scanner.poll())
+        except OSError as e:
+            self.info_label.setText(f"Dossier inaccessible : {e}")
+            return
+        self.process_next()
+
+    def process_next(self):
+        if self.busy or not self.queue:
+            return
+        self.busy = True
+        path = self.queue.popleft()
+        self.info_label.setText(f"Traitement de {os.path.basename(path)} ({len(self.queue)} en attente)")
+        self.jobs.submit(
+            live_frame_job, self.session, path, cancel_previous=False,
+            on_result=self.on_result, on_error=self.on_error, on_finished=self.on_frame_finished
+        )
+
+    def on_frame_finished(self, job_id):
+        self.busy = False
+        if self.scanner is not None:
+            self.info_label.setText(
+                f"En attente de nouvelles images ({self.session.stack.frames} empilées)"
+            )
+        self.process_next()
+
+    def on_result(self, job_id, stage, payload):
+        if stage == "frame":
+            self.add_row(payload)
+        elif stage == "preview" and payload is not None:
+            pixmap = QPixmap.fromImage(payload)
+            self.preview_label.setPixmap(pixmap.scaled(
+                self.preview_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation
+            ))
+            self.save_btn.setEnabled(True)
+        elif stage == "saved":
+            self.open_in_viewer.emit(payload)
+
+    def on_error(self, job_id, message):
+        QMessageBox.critical(self, "Erreur", message)
+
+    def add_row(self, row):
+        if self.table.rowCount() >= LIVE_TABLE_MAX_ROWS:
+            self.table.removeRow(0)
+        index = self.table.rowCount()
+        self.table.insertRow(index)
+        for col, column in enumerate(LIVE_COLUMNS):
+            value = row[column]
+            item = QTableWidgetItem()
+            if column == "file":
+                item.setText(os.path.basename(value))
+                item.setData(Qt.UserRole, value)
+            elif isinstance(value, float):
+                item.setData(Qt.DisplayRole, round(value, 2))
+            elif value is not None:
+                item.setData(Qt.DisplayRole, value)
+            self.table.setItem(index, col, item)
+        self.table.scrollToBottom()
+
+    def save_result(self):
+        if self.session is None or not self.folder:
+            return
+        # Passe par la file des jobs : jamais pendant l'ajout d'une image
+        self.jobs.submit(
+            live_save_job, self.session, os.path.join(self.folder, LIVE_RESULT_FILE),
+            cancel_previous=False, on_result=self.on_result, on_error=self.on_error
+        )
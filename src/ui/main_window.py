@@ -1,8 +1,42 @@
+import importlib
 from PyQt5.QtWidgets import QMainWindow, QTabWidget, QWidget, QVBoxLayout, QLabel
-from .solar_tab import SolarTab 
-from .renamer_tab import RenamerTab
-from .exif_reader_tab import ExifReaderTab
-from .fit_reader_tab import FitsViewerTab
+from PyQt5.QtCore import pyqtSignal
+
+# Onglets construits à la première activation : (titre, module, classe).
+# Le module (et ses dépendances lourdes : astropy, photutils, pyqtgraph…)
+# n'est importé qu'à ce moment-là.
+LAZY_TABS = [
+    ("Renamer", ".renamer_tab", "RenamerTab"),
+    ("météo solaire", ".solar_tab", "SolarTab"),
+    ("Exif Reader", ".exif_reader_tab", "ExifReaderTab"),
+    ("FITS Viewer", ".fit_reader_tab", "FitsViewerTab"),
+    ("Tri des brutes", ".batch_tab", "BatchGradingTab"),
+    ("Empilement", ".stacking_tab", "StackingTab"),
+    ("Empilement en direct", ".live_stack_tab", "LiveStackTab"),
+    ("Calculs astro", ".calculator_tab", "CalculatorTab"),
+    ("Vignettes", ".thumbnail_tab", "ThumbnailTab"),
+]
+VIEWER_MODULE = ".fit_reader_tab"
+
+class LazyTab(QWidget):
+    # Emplacement d'un onglet, rempli par le vrai widget au premier affichage
+    built = pyqtSignal(object)
+
+    def __init__(self, module_name, class_name):
+        super().__init__()
+        self.module_name = module_name
+        self.class_name = class_name
+        self.widget = None
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+    def build(self):
+        if self.widget is None:
+            module = importlib.import_module(self.module_name, __package__)
+            self.widget = getattr(module, self.class_name)()
+            self.layout().addWidget(self.widget)
+            self.built.emit(self.widget)
+        return self.widget
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -23,14 +57,28 @@ class MainWindow(QMainWindow):
         home_tab.setLayout(home_layout)
         self.tabs.addTab(home_tab, "Accueil")
 
-        # Onglet renamer
-        self.tabs.addTab(RenamerTab(), "Renamer")
+        for title, module_name, class_name in LAZY_TABS:
+            tab = LazyTab(module_name, class_name)
+            tab.built.connect(self.connect_tab)
+            self.tabs.addTab(tab, title)
+        self.tabs.currentChanged.connect(self.build_current_tab)
 
-        # Onglet météo solaire (nouveau widget)
-        self.tabs.addTab(SolarTab(), "météo solaire")
+    def build_current_tab(self, index):
+        tab = self.tabs.widget(index)
+        if isinstance(tab, LazyTab):
+            tab.build()
 
-        # Onglet Exif Reader
-        self.tabs.addTab(ExifReaderTab(), "Exif Reader")
+    def connect_tab(self, widget):
+        # Onglets produisant un FITS (empilement) : affichage dans le visualiseur
+        if hasattr(widget, "open_in_viewer"):
+            widget.open_in_viewer.connect(self.show_in_viewer)
 
-        # Onglet FITS Viewer
-        self.tabs.addTab(FitsViewerTab(), "FITS Viewer")
\ No newline at end of file
+    def show_in_viewer(self, file_path):
+        for index in range(self.tabs.count()):
+            tab = self.tabs.widget(index)
+            if isinstance(tab, LazyTab) and tab.module_name == VIEWER_MODULE:
+                self.tabs.setCurrentIndex(index)
+                viewer = tab.build()
+                viewer.add_to_history(file_path)
+                viewer.load_fits(file_path)
+                return
@@ -0,0 +1,129 @@
+import concurrent.futures
+import json
+import os
+import sqlite3
+import threading
+
+# Stocké à la racine du projet, à côté de favs.json
+INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "metadata_index.sqlite")
+INDEX_BATCH_SIZE = 200
+
+class MetadataIndex:
+    # Métadonnées déjà extraites (EXIF, en-têtes FITS), par chemin et par type
+    # d'extraction. Une entrée n'est valable que si la taille et le mtime du fichier
+    # n'ont pas changé : un dossier inchangé se relit sans ouvrir un seul fichier.
+    def __init__(self, db_path=INDEX_FILE):
+        self.db_path = db_path
+        # Connexion partagée entre le thread GUI et les workers d'indexation
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                " path TEXT NOT NULL, kind TEXT NOT NULL,"
+                " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, fields TEXT NOT NULL,"
+                " PRIMARY KEY (path, kind))"
+            )
+
+    def lookup(self, path, kind, stat):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, fields FROM metadata WHERE path = ? AND kind = ?",
+                (path, kind)
+            ).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        return json.loads(row[2])
+
+    def store_many(self, kind, entries):
+        # entries : [(chemin, stat, champs)]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO metadata (path, kind, size, mtime_ns, fields) VALUES (?, ?, ?, ?, ?)",
+                [(path, kind, st.st_size, st.st_mtime_ns, json.dumps(fields)) for path, st, fields in entries]
+            )
+
+    def move_paths(self, pairs):
+        # Suit les fichiers renommés : taille et mtime sont conservés par un renommage
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE OR REPLACE metadata SET path = ? WHERE path = ?",
+                [(os.path.abspath(new), os.path.abspath(old)) for old, new in pairs]
+            )
+
+    def get(self, path, kind, extractor):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        fields = self.lookup(path, kind, stat)
+        if fields is None:
+            fields = extractor(path)
+            if "Error" not in fields:
+                self.store_many(kind, [(path, stat, fields)])
+        return fields
+
+    def folder_entries(self, folder, kind):
+        folder = os.path.abspath(folder)
+        prefix = os.path.join(folder, "")
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT path, size, mtime_ns, fields FROM metadata"
+                " WHERE kind = ? AND substr(path, 1, ?) = ?",
+                (kind, len(prefix), prefix)
+            ).fetchall()
+        return {path: (size, mtime_ns, fields) for path, size, mtime_ns, fields in rows}
+
+    def update_folder(self, folder, filenames, kind, extractor, should_stop=None, workers=1):
+        # Mise à jour incrémentale : un stat par fichier, extraction des seuls fichiers
+        # nouveaux ou modifiés (sur `workers` threads), écriture par lots.
+        # Renvoie {nom de fichier: champs}.
+        folder = os.path.abspath(folder)
+        known = self.folder_entries(folder, kind)
+        result = {}
+        stale = []
+        for filename in filenames:
+            path = os.path.join(folder, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = known.get(path)
+            if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                result[filename] = json.loads(entry[2])
+            else:
+                stale.append((filename, path, stat))
+        pending = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for start in range(0, len(stale), INDEX_BATCH_SIZE):
+                if should_stop is not None and should_stop():
+                    break
+                batch = stale[start:start + INDEX_BATCH_SIZE]
+                extracted = executor.map(extractor, [path for _, path, _ in batch])
+                for (filename, path, stat), fields in zip(batch, extracted):
+                    result[filename] = fields
+                    if "Error" not in fields:
+                        pending.append((path, stat, fields))
+                self.store_many(kind, pending)
+                pending = []
+        # Oublie les fichiers disparus du dossier
+        missing = [
+            path for path in known
+            if os.path.dirname(path) == folder and os.path.basename(path) not in result
+            and not os.path.exists(path)
+        ]
+        if missing:
+            with self.lock, self.conn:
+                self.conn.executemany(
+                    "DELETE FROM metadata WHERE path = ? AND kind = ?", [(p, kind) for p in missing]
+                )
+        return result
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+def get_metadata_index():
+    # Index partagé, ouvert au premier usage
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            _shared_index = MetadataIndex()
+        return _shared_index
@@ -0,0 +1,73 @@
+import collections
+import os
+
+class NamingOptions:
+    def __init__(self, prefix="", suffix="", custom_name="", use_date=False,
+                 use_model=False, replace_name=False, use_filter=False):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.custom_name = custom_name
+        self.use_date = use_date
+        self.use_model = use_model
+        self.use_filter = use_filter
+        self.replace_name = replace_name
+
+    def uses_exif(self):
+        return self.use_date or self.use_model or self.use_filter
+
+    def is_empty(self):
+        return not (self.prefix or self.suffix or self.custom_name or self.use_date or self.use_model
+                    or self.use_filter)
+
+def base_name(name, idx, count, date_str, model_str, options, filter_str=""):
+    if options.replace_name:
+        # Ignore le nom personnalisé, ne prend que les infos EXIF
+        parts = []
+        if options.use_date and date_str:
+            parts.append(date_str)
+        if options.use_model and model_str:
+            parts.append(model_str)
+        if options.use_filter and filter_str:
+            parts.append(filter_str)
+        # Si rien n'est coché, on garde le nom d'origine
+        base = "_".join(parts) if parts else name
+    else:
+        # Utilise le nom personnalisé si présent, sinon le nom d'origine
+        if options.custom_name:
+            base = options.custom_name
+            if count > 1:
+                base = f"{base}_{idx+1:03d}"
+        else:
+            base = name
+        # Ajoute la date et/ou le matériel autour du nom personnalisé ou du nom d'origine
+        if options.use_date and date_str:
+            base = f"{date_str}_{base}"
+        if options.use_model and model_str:
+            base = f"{base}_{model_str}"
+        if options.use_filter and filter_str:
+            base = f"{base}_{filter_str}"
+    return f"{options.prefix}{base}{options.suffix}"
+
+def build_new_names(filenames, infos, options):
+    # Fonction pure : noms finaux pour chaque fichier, doublons numérotés.
+    # infos : liste de (date, modèle, filtre) alignée sur filenames (ignorée sans option EXIF).
+    count = len(filenames)
+    base_names = []
+    exts = []
+    for idx, filename in enumerate(filenames):
+        name, ext = os.path.splitext(filename)
+        date_str, model_str, filter_str = infos[idx] if options.uses_exif() else ("", "", "")
+        base_names.append(base_name(name, idx, count, date_str, model_str, options, filter_str))
+        exts.append(ext)
+
+    # Compte les occurrences pour les doublons
+    counts = collections.defaultdict(int)
+    new_names = []
+    for base, ext in zip(base_names, exts):
+        n = counts[base]
+        if n == 0:
+            new_names.append(f"{base}{ext}")
+        else:
+            new_names.append(f"{base}-{n:03d}{ext}")
+        counts[base] += 1
+    return new_names
@@ -0,0 +1,332 @@
+import concurrent.futures
+import contextlib
+import math
+import multiprocessing
+import os
+import numpy as np
+from .fits_loader import fits, open_frame
+from .stacking import calibrate
+
+# Sources gardées par image (les plus brillantes) dans l'index de métadonnées
+CACHED_SOURCES = 200
+# Étoiles servant aux triangles, et voisins de chaque étoile formant les triangles
+MATCH_STARS = 40
+MATCH_NEIGHBOURS = 5
+# Écart toléré entre invariants de triangles (rapports de côtés)
+INVARIANT_TOLERANCE = 0.01
+RANSAC_ITERATIONS = 256
+# Distance (px) sous laquelle une correspondance est conservée par l'ajustement
+INLIER_TOLERANCE = 2.0
+MIN_MATCHES = 6
+# Lignes de l'image alignée calculées à la fois
+RESAMPLE_ROWS = 256
+REGISTERED_SUFFIX = "_r"
+
+REGISTRATION_COLUMNS = [
+    "file", "stars", "matches", "rms", "dx", "dy", "rotation", "scale", "output", "error",
+]
+
+class RegistrationError(Exception):
+    pass
+
+class RegistrationOptions:
+    def __init__(self, fwhm=3.0, threshold_sigma=5.0, match_stars=MATCH_STARS,
+                 inlier_tolerance=INLIER_TOLERANCE, min_matches=MIN_MATCHES):
+        self.fwhm = fwhm
+        self.threshold_sigma = threshold_sigma
+        self.match_stars = match_stars
+        self.inlier_tolerance = inlier_tolerance
+        self.min_matches = min_matches
+
+    def sources_kind(self):
+        # Type d'entrée de l'index de métadonnées : les sources dépendent des paramètres
+        return f"sources:{self.fwhm:g}:{self.threshold_sigma:g}:{CACHED_SOURCES}"
+
+def detect_frame_sources(file_path, options):
+    # Sources d'une image, réduites aux colonnes utiles et sérialisables en JSON
+    from .star_detection import detect_sources
+    with open_frame(file_path) as frame:
+        table, _, _ = detect_sources(
+            np.asarray(frame.data), options.fwhm, options.threshold_sigma,
+            tiled=True, quick=True, brightest=CACHED_SOURCES
+        )
+    return {name: table[name].tolist() for name in ("x", "y", "flux")}
+
+def source_points(sources, count):
+    # (n, 2) des `count` sources les plus brillantes (triées par flux décroissant)
+    return np.column_stack([sources["x"][:count], sources["y"][:count]]).astype(np.float64)
+
+def triangles(points, neighbours=MATCH_NEIGHBOURS):
+    # Triangles formés par chaque étoile et deux de ses plus proches voisines.
+    # Sommets ordonnés par côté opposé croissant, invariants (a/c, b/c) avec a ≤ b ≤ c :
+    # indépendants de la translation, de la rotation, de l'échelle et du retournement.
+    n = len(points)
+    if n < 3:
+        return np.empty((0, 3), dtype=np.intp), np.empty((0, 2))
+    k = min(neighbours, n - 1)
+    distances = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=2)
+    nearest = np.argsort(distances, axis=1)[:, 1:k + 1]
+    first, second = np.triu_indices(k, 1)
+    tri = np.column_stack([
+        np.repeat(np.arange(n), len(first)), nearest[:, first].ravel(), nearest[:, second].ravel()
+    ])
+    tri = np.unique(np.sort(tri, axis=1), axis=0)
+    p = points[tri]
+    sides = np.column_stack([
+        np.linalg.norm(p[:, 1] - p[:, 2], axis=1),
+        np.linalg.norm(p[:, 0] - p[:, 2], axis=1),
+        np.linalg.norm(p[:, 0] - p[:, 1], axis=1),
+    ])
+    order = np.argsort(sides, axis=1)
+    tri = np.take_along_axis(tri, order, axis=1)
+    sides = np.take_along_axis(sides, order, axis=1)
+    valid = sides[:, 0] > 0
+    invariants = sides[valid, :2] / sides[valid, 2:3]
+    return tri[valid], invariants
+
+def match_stars(points, reference, tolerance=INVARIANT_TOLERANCE):
+    # Correspondances candidates (indices image, indices référence) : chaque paire
+    # de triangles semblables vote pour ses trois paires de sommets, on garde les
+    # paires qui sont le meilleur choix dans les deux sens
+    tri, inv = triangles(points)
+    ref_tri, ref_inv = triangles(reference)
+    if len(tri) == 0 or len(ref_tri) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    close = np.linalg.norm(inv[:, None, :] - ref_inv[None, :, :], axis=2) < tolerance
+    ti, ri = np.nonzero(close)
+    votes = np.zeros((len(points), len(reference)), dtype=np.int32)
+    np.add.at(votes, (tri[ti].ravel(), ref_tri[ri].ravel()), 1)
+    best = votes.argmax(axis=1)
+    src = np.arange(len(points))
+    keep = (votes[src, best] >= 2) & (votes.argmax(axis=0)[best] == src)
+    return src[keep], best[keep]
+
+def fit_affine(src, dst):
+    # Moindres carrés : matrice (3, 2) telle que [x, y, 1] @ m ≈ destination
+    design = np.column_stack([src, np.ones(len(src))])
+    return np.linalg.lstsq(design, dst, rcond=None)[0]
+
+def apply_affine(matrix, points):
+    return points @ matrix[:2] + matrix[2]
+
+def robust_affine(src, dst, tolerance=INLIER_TOLERANCE, iterations=RANSAC_ITERATIONS, seed=0):
+    # RANSAC vectorisé : toutes les transformations candidates (triplets tirés au
+    # hasard) sont résolues et évaluées d'un coup, puis la meilleure est affinée
+    # par moindres carrés sur ses correspondances conservées
+    rng = np.random.default_rng(seed)
+    m = len(src)
+    samples = rng.integers(0, m, size=(iterations, 3))
+    design = np.concatenate([src[samples], np.ones((iterations, 3, 1))], axis=2)
+    usable = np.abs(np.linalg.det(design)) > 1e-6
+    if not usable.any():
+        raise RegistrationError("Étoiles appariées alignées : transformation indéterminée")
+    matrices = np.linalg.solve(design[usable], dst[samples[usable]])
+    src_h = np.column_stack([src, np.ones(m)])
+    errors = np.linalg.norm(np.einsum("nk,ikj->inj", src_h, matrices) - dst[None], axis=2)
+    inliers = errors[np.argmax((errors < tolerance).sum(axis=1))] < tolerance
+    for _ in range(3):
+        if inliers.sum() < 3:
+            break
+        matrix = fit_affine(src[inliers], dst[inliers])
+        refined = np.linalg.norm(apply_affine(matrix, src) - dst, axis=1) < tolerance
+        if np.array_equal(refined, inliers):
+            break
+        inliers = refined
+    if inliers.sum() < 3:
+        raise RegistrationError("Aucune transformation cohérente entre les étoiles")
+    matrix = fit_affine(src[inliers], dst[inliers])
+    return matrix, inliers
+
+def register_points(points, reference, options):
+    # Transformation image -> référence et nombre de correspondances retenues
+    src_idx, ref_idx = match_stars(points[:options.match_stars], reference[:options.match_stars])
+    if len(src_idx) < options.min_matches:
+        raise RegistrationError(f"Trop peu d'étoiles appariées ({len(src_idx)})")
+    matrix, inliers = robust_affine(points[src_idx], reference[ref_idx], options.inlier_tolerance)
+    if inliers.sum() < options.min_matches:
+        raise RegistrationError(f"Trop peu d'étoiles cohérentes ({int(inliers.sum())})")
+    residuals = apply_affine(matrix, points[src_idx][inliers]) - reference[ref_idx][inliers]
+    rms = float(np.sqrt(np.mean(np.sum(residuals ** 2, axis=1))))
+    return matrix, int(inliers.sum()), rms
+
+def describe_affine(matrix):
+    # Décalage, rotation (degrés) et échelle moyenne d'une transformation
+    a, c = matrix[0]
+    b, d = matrix[1]
+    return {
+        "dx": float(matrix[2, 0]),
+        "dy": float(matrix[2, 1]),
+        "rotation": math.degrees(math.atan2(c - b, a + d)),
+        "scale": math.sqrt(abs(a * d - b * c)),
+    }
+
+def resample_rows(frame, inverse, r0, r1, width, masters=None):
+    # Lignes r0 à r1 de l'image alignée, par interpolation bilinéaire. Seule la
+    # bande de lignes source couverte par ces lignes est lue (et calibrée), en
+    # lignes entières : les maîtres de calibration se lisent par lignes.
+    ys, xs = np.mgrid[r0:r1, 0:width].astype(np.float64)
+    sx = inverse[0, 0] * xs + inverse[1, 0] * ys + inverse[2, 0]
+    sy = inverse[0, 1] * xs + inverse[1, 1] * ys + inverse[2, 1]
+    height = frame.shape[0]
+    out = np.full((r1 - r0, width), np.nan, dtype=np.float32)
+    y_lo = min(max(0, int(math.floor(sy.min()))), height - 2)
+    y_hi = min(height, int(math.floor(sy.max())) + 2)
+    if y_hi - y_lo < 2:
+        return out
+    band = np.asarray(frame.data[y_lo:y_hi], dtype=np.float32)
+    if masters is not None:
+        band = calibrate(band[None].copy(), masters, y_lo, y_hi)[0]
+    # Tolérance : l'ajustement de la référence sur elle-même n'est pas exactement l'identité
+    eps = 1e-6
+    inside = (sx >= -eps) & (sx <= frame.shape[1] - 1 + eps) & (sy >= -eps) & (sy <= height - 1 + eps)
+    sx, sy = sx[inside], sy[inside]
+    # Bords : interpolation avec un poids 1 sur le pixel de bord
+    x0 = np.clip(np.floor(sx).astype(np.intp), 0, frame.shape[1] - 2)
+    y0 = np.clip(np.floor(sy).astype(np.intp), y_lo, y_hi - 2)
+    fx = (sx - x0).astype(np.float32)
+    fy = (sy - y0).astype(np.float32)
+    y0 -= y_lo
+    top = band[y0, x0] * (1 - fx) + band[y0, x0 + 1] * fx
+    bottom = band[y0 + 1, x0] * (1 - fx) + band[y0 + 1, x0 + 1] * fx
+    out[inside] = top * (1 - fy) + bottom * fy
+    return out
+
+def registered_header(frame, matrix, reference_path):
+    header = fits.Header()
+    header["SIMPLE"] = True
+    header["BITPIX"] = -32
+    header["NAXIS"] = 2
+    header["NAXIS1"] = frame.shape[1]
+    header["NAXIS2"] = frame.shape[0]
+    skipped = {"SIMPLE", "BITPIX", "EXTEND", "BZERO", "BSCALE", "BLANK", "CHECKSUM", "DATASUM", ""}
+    for card in frame.header.cards:
+        if card.keyword not in skipped and not card.keyword.startswith("NAXIS"):
+            header.append(card)
+    reference_name = os.path.basename(reference_path).encode("ascii", "replace").decode("ascii")
+    header["REGREF"] = (reference_name[:68], "Image de reference")
+    for i, name in enumerate(("REGA", "REGB", "REGC")):
+        header[f"{name}1"] = float(matrix[i, 0])
+        header[f"{name}2"] = float(matrix[i, 1])
+    return header
+
+def write_registered(frame, matrix, output_path, reference_path, masters=None):
+    # Image alignée sur la grille de la référence (même taille), écrite bande par bande
+    inverse = np.linalg.inv(np.vstack([matrix.T, [0, 0, 1]]))[:2].T
+    height, width = frame.shape
+    tmp_path = output_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    stream = fits.StreamingHDU(tmp_path, registered_header(frame, matrix, reference_path))
+    try:
+        for r0 in range(0, height, RESAMPLE_ROWS):
+            stream.write(resample_rows(frame, inverse, r0, min(height, r0 + RESAMPLE_ROWS), width, masters))
+        stream.close()
+    except BaseException:
+        stream.close()
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+
+def registered_path(file_path, output_folder):
+    name = os.path.basename(file_path)
+    for ext in sorted((".fits.fz", ".fit.fz", ".fits.gz", ".fit.gz", ".fits", ".fit", ".fts", ".fz"), key=len, reverse=True):
+        if name.lower().endswith(ext):
+            name = name[:-len(ext)]
+            break
+    return os.path.join(output_folder, name + REGISTERED_SUFFIX + ".fits")
+
+def register_file(file_path, reference, sources, options, output_folder=None, reference_path="",
+                  masters=None):
+    # Exécuté dans un processus du pool : ne renvoie que des types simples.
+    # sources : liste de l'index, ou None pour détecter (renvoyée dans "sources").
+    row = {column: None for column in REGISTRATION_COLUMNS}
+    row["file"] = file_path
+    try:
+        if sources is None:
+            sources = detect_frame_sources(file_path, options)
+            row["sources"] = sources
+        points = source_points(sources, CACHED_SOURCES)
+        row["stars"] = len(points)
+        matrix, row["matches"], row["rms"] = register_points(points, reference, options)
+        row.update(describe_affine(matrix))
+        if output_folder:
+            # Rééchantillonnage par bandes de lignes : pas de copie complète de l'image
+            with contextlib.ExitStack() as stack:
+                frame = stack.enter_context(open_frame(file_path, lazy=True))
+                if masters is not None:
+                    from .stacking import Masters
+                    masters = stack.enter_context(Masters(*masters))
+                    for master in masters.frames():
+                        if master.shape != frame.shape:
+                            raise RegistrationError(
+                                f"Image maîtresse {os.path.basename(master.path)} de taille {master.shape}, image {frame.shape}"
+                            )
+                output_path = registered_path(file_path, output_folder)
+                write_registered(frame, matrix, output_path, reference_path, masters)
+            row["output"] = output_path
+    except Exception as e:
+        row["error"] = str(e)
+    return row
+
+def cached_sources(index, file_path, options):
+    # Sources déjà détectées (index de métadonnées), ou None
+    path = os.path.abspath(file_path)
+    try:
+        return index.lookup(path, options.sources_kind(), os.stat(path))
+    except OSError:
+        return None
+
+def register_files(paths, reference_path, output_folder=None, options=None, workers=None,
+                   masters=None, index=None, should_stop=None):
+    # Aligne chaque image sur reference_path ; génère les résultats au fil de l'eau.
+    # Les sources de chaque image sont gardées dans l'index de métadonnées :
+    # changer de référence ne relance aucune détection.
+    # masters : (offset, noir, flat) maîtres appliqués avant rééchantillonnage.
+    from .metadata_index import get_metadata_index
+    options = options or RegistrationOptions()
+    index = index or get_metadata_index()
+    workers = workers or os.cpu_count() or 1
+    kind = options.sources_kind()
+    reference_sources = cached_sources(index, reference_path, options)
+    if reference_sources is None:
+        reference_sources = detect_frame_sources(reference_path, options)
+        reference_abs = os.path.abspath(reference_path)
+        index.store_many(kind, [(reference_abs, os.stat(reference_abs), reference_sources)])
+    reference = source_points(reference_sources, CACHED_SOURCES)
+    if len(reference) < options.min_matches:
+        raise RegistrationError(f"Trop peu d'étoiles dans la référence ({len(reference)})")
+    if output_folder:
+        os.makedirs(output_folder, exist_ok=True)
+    paths = iter(paths)
+    # spawn, comme pour la notation par lots : pas de fork depuis l'interface
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        pending = {}
+        try:
+            while True:
+                while len(pending) < 2 * workers:
+                    path = next(paths, None)
+                    if path is None:
+                        break
+                    future = executor.submit(
+                        register_file, path, reference, cached_sources(index, path, options), options,
+                        output_folder, reference_path, masters
+                    )
+                    pending[future] = path
+                if not pending:
+                    break
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    row = future.result()
+                    sources = row.pop("sources", None)
+                    if sources is not None:
+                        stored = os.path.abspath(path)
+                        index.store_many(kind, [(stored, os.stat(stored), sources)])
+                    yield row
+                if should_stop is not None and should_stop():
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,256 @@
+import json
+import os
+import time
+import uuid
+
+# Stockés à la racine du projet, à côté de favs.json
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+JOURNAL_FILE = os.path.join(ROOT_DIR, "rename_journal.jsonl")
+UNDO_HISTORY_FILE = os.path.join(ROOT_DIR, "rename_history.json")
+MAX_UNDO = 20
+TEMP_SUFFIX = ".renommage"
+
+class RenameError(Exception):
+    pass
+
+class RenamePlan:
+    # Renommage d'un dossier entier, découpé en phases. Dans une phase, aucune
+    # destination n'est la source d'une autre étape : l'état de chaque étape se
+    # déduit de la seule présence des fichiers, ce qui permet la reprise.
+    #   1. sources dont la destination est occupée par une autre source → nom temporaire
+    #   2. renommages directs vers des noms libres
+    #   3. noms temporaires → destinations finales
+    def __init__(self, folder, renames, phases):
+        self.folder = folder
+        self.renames = renames
+        self.phases = phases
+
+    def is_empty(self):
+        return not self.renames
+
+def plan_renames(folder, pairs):
+    # pairs : [(ancien nom, nouveau nom)] relatifs à folder. Vérifie tout avant de
+    # toucher au disque : noms invalides, doublons, écrasement d'un fichier existant.
+    folder = os.path.abspath(folder)
+    renames = [(old, new) for old, new in pairs if old != new]
+    errors = []
+    sources = set()
+    targets = set()
+    for old, new in renames:
+        if not new or new in (".", "..") or os.sep in new or (os.altsep and os.altsep in new):
+            errors.append(f"Nom invalide : {new!r}")
+        if old in sources:
+            errors.append(f"Fichier renommé deux fois : {old}")
+        if new in targets:
+            errors.append(f"Deux fichiers recevraient le nom {new}")
+        sources.add(old)
+        targets.add(new)
+    token = uuid.uuid4().hex[:8]
+    to_temp = []
+    direct = []
+    from_temp = []
+    for i, (old, new) in enumerate(renames):
+        src = os.path.join(folder, old)
+        dst = os.path.join(folder, new)
+        if not os.path.lexists(src):
+            errors.append(f"Fichier introuvable : {old}")
+            continue
+        if new in sources:
+            # Chaîne ou cycle (a→b, b→a) : passage par un nom temporaire, de longueur
+            # fixe pour qu'un nom proche de la limite de 255 octets passe aussi
+            tmp = os.path.join(folder, f".{token}-{i}{TEMP_SUFFIX}")
+            to_temp.append((src, tmp))
+            from_temp.append((tmp, dst))
+        elif os.path.lexists(dst):
+            if os.path.samefile(src, dst):
+                # Changement de casse sur un système de fichiers insensible à la casse
+                tmp = os.path.join(folder, f".{token}-{i}{TEMP_SUFFIX}")
+                to_temp.append((src, tmp))
+                from_temp.append((tmp, dst))
+            else:
+                errors.append(f"{new} existe déjà et serait écrasé")
+        else:
+            direct.append((src, dst))
+    if errors:
+        raise RenameError("\n".join(errors))
+    phases = [phase for phase in (to_temp, direct, from_temp) if phase]
+    return RenamePlan(folder, renames, phases)
+
+def step_state(src, dst):
+    # "todo", "done" ou None si ni la source ni la destination n'existent
+    if os.path.lexists(dst) and not os.path.lexists(src):
+        return "done"
+    if os.path.lexists(src):
+        return "todo"
+    return None
+
+class RenameJournal:
+    # Journal sur disque d'un renommage en cours : le plan complet est écrit une
+    # fois avant le premier déplacement, puis une ligne par phase terminée.
+    # Trois écritures synchronisées par lot, quel que soit le nombre de fichiers.
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+
+    def append(self, record, create=False):
+        with open(self.path, "w" if create else "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def begin(self, plan):
+        self.append({"folder": plan.folder, "renames": plan.renames, "phases": plan.phases}, create=True)
+
+    def mark_phase(self, index):
+        self.append({"phase_done": index})
+
+    def finish(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def load(self):
+        # (plan, nombre de phases terminées) d'un lot interrompu, ou None
+        try:
+            with open(self.path) as f:
+                lines = [line for line in f.read().splitlines() if line.strip()]
+        except FileNotFoundError:
+            return None
+        if not lines:
+            return None
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            # Journal tronqué avant le premier déplacement : rien n'a été touché
+            self.finish()
+            return None
+        completed = 0
+        for line in lines[1:]:
+            try:
+                completed = max(completed, json.loads(line)["phase_done"] + 1)
+            except (ValueError, KeyError):
+                break
+        plan = RenamePlan(
+            header["folder"],
+            [tuple(pair) for pair in header["renames"]],
+            [[tuple(step) for step in phase] for phase in header["phases"]],
+        )
+        return plan, completed
+
+def run_phases(plan, journal, start=0):
+    for index in range(start, len(plan.phases)):
+        for src, dst in plan.phases[index]:
+            state = step_state(src, dst)
+            if state == "todo":
+                os.rename(src, dst)
+            elif state is None:
+                raise RenameError(f"Fichier disparu pendant le renommage : {os.path.basename(src)}")
+        journal.mark_phase(index)
+
+def undo_phases(plan, completed):
+    # Défait la phase en cours (étapes faites seulement) puis les phases terminées,
+    # dans l'ordre inverse
+    errors = []
+    for index in range(min(completed, len(plan.phases) - 1), -1, -1):
+        for src, dst in reversed(plan.phases[index]):
+            if step_state(src, dst) != "done":
+                continue
+            try:
+                os.rename(dst, src)
+            except OSError as e:
+                errors.append(f"{os.path.basename(dst)} : {e}")
+    return errors
+
+def execute_plan(plan, journal=None):
+    # Applique le plan ; en cas d'échec, le dossier est remis dans son état initial
+    # avant de lever RenameError. Le journal n'est conservé que si ce retour
+    # arrière échoue lui aussi (reprise ou annulation au prochain lancement).
+    if plan.is_empty():
+        return
+    journal = journal or RenameJournal()
+    journal.begin(plan)
+    try:
+        run_phases(plan, journal)
+    except (OSError, RenameError) as e:
+        _, completed = journal.load()
+        errors = undo_phases(plan, completed)
+        if errors:
+            raise RenameError(
+                f"Renommage interrompu : {e}\nRetour arrière incomplet :\n" + "\n".join(errors)
+            )
+        journal.finish()
+        raise RenameError(f"Renommage annulé : {e}")
+    journal.finish()
+
+def resume_journal(journal=None):
+    # Termine un lot interrompu ; renvoie son plan (ou None s'il n'y en a pas)
+    journal = journal or RenameJournal()
+    pending = journal.load()
+    if pending is None:
+        return None
+    plan, completed = pending
+    run_phases(plan, journal, start=completed)
+    journal.finish()
+    return plan
+
+def rollback_journal(journal=None):
+    # Remet le dossier d'un lot interrompu dans son état d'avant le renommage
+    journal = journal or RenameJournal()
+    pending = journal.load()
+    if pending is None:
+        return None
+    plan, completed = pending
+    errors = undo_phases(plan, completed)
+    if errors:
+        raise RenameError("Retour arrière incomplet :\n" + "\n".join(errors))
+    journal.finish()
+    return plan
+
+class UndoHistory:
+    # Lots de renommages successifs, conservés entre deux sessions
+    def __init__(self, path=UNDO_HISTORY_FILE, max_entries=MAX_UNDO):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = []
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except Exception:
+            self.entries = []
+
+    def save(self):
+        # Écriture atomique : l'historique n'est jamais à moitié écrit
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def push(self, plan):
+        self.entries.append({"folder": plan.folder, "time": time.time(), "renames": plan.renames})
+        del self.entries[:-self.max_entries]
+        self.save()
+
+    def last(self):
+        return self.entries[-1] if self.entries else None
+
+    def pop(self):
+        entry = self.entries.pop()
+        self.save()
+        return entry
+
+def rename_batch(folder, pairs, history=None, journal=None):
+    plan = plan_renames(folder, pairs)
+    execute_plan(plan, journal)
+    if history is not None and not plan.is_empty():
+        history.push(plan)
+    return plan
+
+def undo_last(history, journal=None):
+    # Annule le dernier lot de l'historique par un nouveau lot transactionnel
+    entry = history.last()
+    if entry is None:
+        return None
+    plan = plan_renames(entry["folder"], [(new, old) for old, new in entry["renames"]])
+    execute_plan(plan, journal)
+    history.pop()
+    return plan
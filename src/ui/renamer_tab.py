@@ -1,22 +1,50 @@
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QFileDialog,
-    QListWidget, QLineEdit, QMessageBox, QCheckBox, QComboBox, QListWidgetItem
+    QListView, QLineEdit, QMessageBox, QCheckBox, QComboBox, QApplication
 )
-from PyQt5.QtGui import QColor, QBrush
+from PyQt5.QtCore import Qt, QTimer
 import os
-import exifread
-import collections
 import json
+from .naming import NamingOptions, build_new_names
+from .list_models import NameListModel, PreviewListModel
+from .exif_extract import NAMING_INDEX_KIND, read_naming_info, default_workers
+from .metadata_index import get_metadata_index
+from .workers import JobRunner
+from .rename_engine import (
+    RenameError, RenameJournal, UndoHistory, rename_batch, undo_last,
+    resume_journal, rollback_journal
+)
+
+# Délai après la dernière frappe avant de recalculer l'aperçu
+PREVIEW_DEBOUNCE_MS = 150
+
+def index_folder_job(job, folder, filenames):
+    # Indexation incrémentale en arrière-plan : seuls les fichiers nouveaux ou modifiés sont lus
+    result = get_metadata_index().update_folder(
+        folder, filenames, NAMING_INDEX_KIND, read_naming_info,
+        should_stop=job.is_cancelled, workers=default_workers(folder)
+    )
+    job.emit("naming", result)
 
 class RenamerTab(QWidget):
     def __init__(self):
         super().__init__()
         self.folder = None
         self.filenames = []
-        self.last_renames = []
+        self.undo_history = UndoHistory()
+        self.journal = RenameJournal()
         self.fav_folders = []  # Liste des dossiers favoris
+        self.exif_info = {}
+        self.indexing = False
+        self.jobs = JobRunner(max_threads=1)
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DEBOUNCE_MS)
+        self.preview_timer.timeout.connect(self.update_preview)
         self.setup_ui()
         self.load_favs()
+        # Un lot interrompu (plantage, coupure) est proposé à la reprise une fois l'onglet affiché
+        QTimer.singleShot(0, self.check_interrupted_rename)
 
     def setup_ui(self):
         main_layout = QVBoxLayout()
@@ -46,28 +74,31 @@ class RenamerTab(QWidget):
         # Options EXIF
         exif_layout = QHBoxLayout()
         self.date_checkbox = QCheckBox("Inclure la date de prise de vue (EXIF)")
-        self.date_checkbox.stateChanged.connect(self.update_preview)
+        self.date_checkbox.stateChanged.connect(self.schedule_preview)
         exif_layout.addWidget(self.date_checkbox)
         self.model_checkbox = QCheckBox("Inclure le matériel utilisé (EXIF)")
-        self.model_checkbox.stateChanged.connect(self.update_preview)
+        self.model_checkbox.stateChanged.connect(self.schedule_preview)
         exif_layout.addWidget(self.model_checkbox)
+        self.filter_checkbox = QCheckBox("Inclure le filtre (FITS)")
+        self.filter_checkbox.stateChanged.connect(self.schedule_preview)
+        exif_layout.addWidget(self.filter_checkbox)
         main_layout.addLayout(exif_layout)
 
         # Liste de remplacement
         self.replace_checkbox = QCheckBox("Remplacer le nom par les infos EXIF")
-        self.replace_checkbox.stateChanged.connect(self.update_preview)
+        self.replace_checkbox.stateChanged.connect(self.schedule_preview)
         main_layout.addWidget(self.replace_checkbox)
 
         # Saisie du préfixe et suffixe
         prefix_suffix_layout = QHBoxLayout()
         prefix_suffix_layout.addWidget(QLabel("Préfixe à ajouter :"))
         self.prefix_input = QLineEdit()
-        self.prefix_input.textChanged.connect(self.update_preview)
+        self.prefix_input.textChanged.connect(self.schedule_preview)
         prefix_suffix_layout.addWidget(self.prefix_input)
 
         prefix_suffix_layout.addWidget(QLabel("Suffixe à ajouter :"))
         self.suffix_input = QLineEdit()
-        self.suffix_input.textChanged.connect(self.update_preview)
+        self.suffix_input.textChanged.connect(self.schedule_preview)
         prefix_suffix_layout.addWidget(self.suffix_input)
         main_layout.addLayout(prefix_suffix_layout)
 
@@ -76,15 +107,22 @@ class RenamerTab(QWidget):
         custom_layout.addWidget(QLabel("Nom personnalisé :"))
         self.custom_name_input = QLineEdit()
         self.custom_name_input.setPlaceholderText("Laisser vide pour ne pas remplacer")
-        self.custom_name_input.textChanged.connect(self.update_preview)
+        self.custom_name_input.textChanged.connect(self.schedule_preview)
         custom_layout.addWidget(self.custom_name_input)
         main_layout.addLayout(custom_layout)
 
         # Listes côte à côte
         lists_layout = QHBoxLayout()
-        self.files_list = QListWidget()
+        # Vues virtualisées : seules les lignes visibles sont construites
+        self.files_model = NameListModel(self)
+        self.files_list = QListView()
+        self.files_list.setUniformItemSizes(True)
+        self.files_list.setModel(self.files_model)
         lists_layout.addWidget(self.files_list)
-        self.preview_list = QListWidget()
+        self.preview_model = PreviewListModel(self)
+        self.preview_list = QListView()
+        self.preview_list.setUniformItemSizes(True)
+        self.preview_list.setModel(self.preview_model)
         lists_layout.addWidget(self.preview_list)
         main_layout.addLayout(lists_layout)
 
@@ -95,7 +133,7 @@ class RenamerTab(QWidget):
         buttons_layout.addWidget(self.rename_button)
         self.undo_button = QPushButton("Annuler le dernier renommage")
         self.undo_button.clicked.connect(self.undo_rename)
-        self.undo_button.setEnabled(False)
+        self.undo_button.setEnabled(self.undo_history.last() is not None)
         buttons_layout.addWidget(self.undo_button)
         main_layout.addLayout(buttons_layout)
         self.setLayout(main_layout)
@@ -105,205 +143,171 @@ class RenamerTab(QWidget):
         if folder:
             self.folder = folder
             self.info_label.setText(f"Dossier sélectionné : {folder}")
-            self.files_list.clear()
-            self.preview_list.clear()
             self.filenames = [f for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f))]
             self.filenames.sort()  # <-- Ajoute ce tri ici
-            for filename in self.filenames:
-                self.files_list.addItem(filename)
+            self.files_model.set_names(self.filenames)
+            self.start_indexing()
             self.update_preview()
 
+    def start_indexing(self):
+        self.exif_info = {}
+        self.indexing = True
+        self.info_label.setText(f"Dossier sélectionné : {self.folder} (lecture des métadonnées…)")
+        self.jobs.submit(
+            index_folder_job, self.folder, list(self.filenames),
+            on_result=self.on_index_result, on_error=self.on_index_error
+        )
+
+    def on_index_result(self, job_id, stage, result):
+        self.exif_info = result
+        self.indexing = False
+        self.info_label.setText(f"Dossier sélectionné : {self.folder}")
+        self.update_preview()
+
+    def on_index_error(self, job_id, message):
+        self.indexing = False
+        self.info_label.setText(f"Dossier sélectionné : {self.folder} ({message})")
+
     def get_exif_info(self, filepath):
-        date_str = ""
-        model_str = ""
-        try:
-            with open(filepath, 'rb') as f:
-                tags = exifread.process_file(f, stop_tag="UNDEF", details=False)
-                # Date
-                date_tag = tags.get("EXIF DateTimeOriginal") or tags.get("Image DateTime")
-                if date_tag:
-                    date_str = str(date_tag).replace(":", "-").replace(" ", "_")
-                # Modèle appareil
-                model_tag = tags.get("Image Model")
-                if model_tag:
-                    model_str = str(model_tag).replace(" ", "_")
-        except Exception:
-            pass
-        return date_str, model_str
+        filename = os.path.basename(filepath)
+        fields = self.exif_info.get(filename)
+        if fields is None:
+            if self.indexing:
+                # L'aperçu sera rafraîchi à la fin de l'indexation
+                return "", "", ""
+            try:
+                fields = get_metadata_index().get(filepath, NAMING_INDEX_KIND, read_naming_info)
+            except OSError:
+                return "", "", ""
+            self.exif_info[filename] = fields
+        return fields["date"], fields["model"], fields.get("filter", "")
 
-    def update_preview(self):
-        prefix = self.prefix_input.text()
-        suffix = self.suffix_input.text()
-        custom_name = self.custom_name_input.text()
-        use_date = self.date_checkbox.isChecked()
-        use_model = self.model_checkbox.isChecked()
-        replace_name = self.replace_checkbox.isChecked()
-        self.preview_list.clear()
-        base_names = []
-        exts = []
-        for idx, filename in enumerate(self.filenames):
-            name, ext = os.path.splitext(filename)
-            new_name = name
-            date_str, model_str = "", ""
-            if use_date or use_model:
-                date_str, model_str = self.get_exif_info(os.path.join(self.folder, filename))
-            custom_name = self.custom_name_input.text()
-            if replace_name:
-                # Ignore le nom personnalisé, ne prend que les infos EXIF
-                parts = []
-                if use_date and date_str:
-                    parts.append(date_str)
-                if use_model and model_str:
-                    parts.append(model_str)
-                # Si rien n'est coché, on garde le nom d'origine
-                base = "_".join(parts) if parts else name
-            else:
-                # Utilise le nom personnalisé si présent, sinon le nom d'origine
-                if custom_name:
-                    base = custom_name
-                    if len(self.filenames) > 1:
-                        base = f"{base}_{idx+1:03d}"
-                else:
-                    base = name
-                # Ajoute la date et/ou le matériel autour du nom personnalisé ou du nom d'origine
-                if use_date and date_str:
-                    base = f"{date_str}_{base}"
-                if use_model and model_str:
-                    base = f"{base}_{model_str}"
-            new_name = f"{prefix}{base}{suffix}"
-            base_names.append(new_name)
-            exts.append(ext)
-
-        # Compte les occurrences pour les doublons
-        counts = collections.defaultdict(int)
-        for i, base in enumerate(base_names):
-            count = counts[base]
-            if count == 0:
-                final_name = f"{base}{exts[i]}"
-            else:
-                final_name = f"{base}-{count:03d}{exts[i]}"
-            counts[base] += 1
+    def naming_options(self):
+        return NamingOptions(
+            prefix=self.prefix_input.text(),
+            suffix=self.suffix_input.text(),
+            custom_name=self.custom_name_input.text(),
+            use_date=self.date_checkbox.isChecked(),
+            use_model=self.model_checkbox.isChecked(),
+            use_filter=self.filter_checkbox.isChecked(),
+            replace_name=self.replace_checkbox.isChecked(),
+        )
 
-            original = f"{os.path.splitext(self.filenames[i])[0]}{exts[i]}"
-            item = QListWidgetItem(final_name)
-            if final_name != original:
-                item.setForeground(QBrush(QColor("red")))
-            else:
-                item.setForeground(QBrush(QColor("black")))
-            self.preview_list.addItem(item)
+    def compute_new_names(self, options):
+        infos = None
+        if options.uses_exif():
+            infos = [self.get_exif_info(os.path.join(self.folder, f)) for f in self.filenames]
+        return build_new_names(self.filenames, infos, options)
+
+    def schedule_preview(self):
+        # Regroupe les frappes rapprochées en un seul recalcul
+        self.preview_timer.start()
+
+    def update_preview(self):
+        self.preview_timer.stop()
+        new_names = self.compute_new_names(self.naming_options())
+        # Mise à jour en place : seules les lignes dont le nom change sont signalées à la vue
+        self.preview_model.set_preview(self.filenames, new_names)
 
     def rename_files(self):
         if not self.folder or not self.filenames:
             QMessageBox.warning(self, "Erreur", "Aucun dossier ou fichier sélectionné.")
             return
-        prefix = self.prefix_input.text()
-        suffix = self.suffix_input.text()
-        custom_name = self.custom_name_input.text()
-        use_date = self.date_checkbox.isChecked()
-        use_model = self.model_checkbox.isChecked()
-        replace_name = self.replace_checkbox.isChecked()
-        if not prefix and not suffix and not use_date and not use_model and not custom_name:
+        options = self.naming_options()
+        if self.indexing and options.uses_exif():
+            QMessageBox.warning(self, "Erreur", "Lecture des métadonnées en cours, veuillez patienter.")
+            return
+        if options.is_empty():
             QMessageBox.warning(self, "Erreur", "Veuillez saisir un préfixe, un suffixe, un nom personnalisé ou choisir une option EXIF.")
             return
 
-        base_names = []
-        exts = []
-        for idx, filename in enumerate(self.filenames):
-            name, ext = os.path.splitext(filename)
-            new_name = name
-            date_str, model_str = "", ""
-            if use_date or use_model:
-                date_str, model_str = self.get_exif_info(os.path.join(self.folder, filename))
-            custom_name = self.custom_name_input.text()
-            if replace_name:
-                # Ignore le nom personnalisé, ne prend que les infos EXIF
-                parts = []
-                if use_date and date_str:
-                    parts.append(date_str)
-                if use_model and model_str:
-                    parts.append(model_str)
-                # Si rien n'est coché, on garde le nom d'origine
-                base = "_".join(parts) if parts else name
-            else:
-                # Utilise le nom personnalisé si présent, sinon le nom d'origine
-                if custom_name:
-                    base = custom_name
-                    if len(self.filenames) > 1:
-                        base = f"{base}_{idx+1:03d}"
-                else:
-                    base = name
-                # Ajoute la date et/ou le matériel autour du nom personnalisé ou du nom d'origine
-                if use_date and date_str:
-                    base = f"{date_str}_{base}"
-                if use_model and model_str:
-                    base = f"{base}_{model_str}"
-            new_name = f"{prefix}{base}{suffix}"
-            base_names.append(new_name)
-            exts.append(ext)
-
-        counts = collections.defaultdict(int)
-        new_names = []
-        old_new_pairs = []
-        for i, filename in enumerate(self.filenames):
-            base = base_names[i]
-            ext = exts[i]
-            count = counts[base]
-            if count == 0:
-                final_name = f"{base}{ext}"
-            else:
-                final_name = f"{base}-{count:03d}{ext}"
-            counts[base] += 1
-            new_names.append(final_name)
-
-            src = os.path.join(self.folder, filename)
-            dst = os.path.join(self.folder, final_name)
-            if filename != final_name:
-                try:
-                    os.rename(src, dst)
-                    old_new_pairs.append((final_name, filename))
-                except Exception as e:
-                    QMessageBox.critical(self, "Erreur", f"Erreur lors du renommage de {filename} : {e}")
-                    return
-        self.last_renames = old_new_pairs
-        self.undo_button.setEnabled(bool(self.last_renames))
+        new_names = self.compute_new_names(options)
+        # Tout le lot est planifié et vérifié avant le premier déplacement
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            plan = rename_batch(
+                self.folder, zip(self.filenames, new_names), self.undo_history, self.journal
+            )
+        except (RenameError, OSError) as e:
+            QApplication.restoreOverrideCursor()
+            QMessageBox.critical(self, "Erreur", f"Aucun fichier renommé.\n{e}")
+            return
+        QApplication.restoreOverrideCursor()
+        self.follow_renames(plan.renames)
+        # Lot vide : rien n'a été ajouté à l'historique
+        self.undo_button.setEnabled(self.undo_history.last() is not None)
         self.filenames = new_names
-        self.files_list.clear()
-        self.preview_list.clear()
-        for filename in self.filenames:
-            self.files_list.addItem(filename)
+        self.files_model.set_names(self.filenames)
         self.update_preview()
-        QMessageBox.information(self, "Succès", "Renommage effectué.")
+        QMessageBox.information(self, "Succès", f"Renommage effectué ({len(plan.renames)} fichiers).")
         self.prefix_input.clear()
         self.suffix_input.clear()
         self.custom_name_input.clear()
         self.date_checkbox.setChecked(False)
         self.model_checkbox.setChecked(False)
+        self.filter_checkbox.setChecked(False)
         self.replace_checkbox.setChecked(False)
 
     def undo_rename(self):
-        if not self.folder or not self.last_renames:
+        if self.undo_history.last() is None:
             return
-        errors = []
-        for new_name, old_name in self.last_renames:
-            src = os.path.join(self.folder, new_name)
-            dst = os.path.join(self.folder, old_name)
-            try:
-                os.rename(src, dst)
-            except Exception as e:
-                errors.append(f"{new_name} : {e}")
-        # Rafraîchir la liste
-        self.filenames = [f for f in os.listdir(self.folder) if os.path.isfile(os.path.join(self.folder, f))]
-        self.files_list.clear()
-        self.preview_list.clear()
-        for filename in self.filenames:
-            self.files_list.addItem(filename)
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            plan = undo_last(self.undo_history, self.journal)
+        except (RenameError, OSError) as e:
+            QApplication.restoreOverrideCursor()
+            QMessageBox.warning(self, "Erreur", f"Annulation impossible, aucun fichier modifié.\n{e}")
+            return
+        QApplication.restoreOverrideCursor()
+        self.after_external_rename(plan)
+        self.undo_button.setEnabled(self.undo_history.last() is not None)
+        QMessageBox.information(self, "Annulé", f"Renommage annulé ({len(plan.renames)} fichiers).")
+
+    def check_interrupted_rename(self):
+        pending = self.journal.load()
+        if pending is None:
+            return
+        plan, _ = pending
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Warning)
+        box.setWindowTitle("Renommage interrompu")
+        box.setText(
+            f"Un renommage de {len(plan.renames)} fichiers a été interrompu dans :\n{plan.folder}"
+        )
+        resume_button = box.addButton("Terminer le renommage", QMessageBox.AcceptRole)
+        box.addButton("Revenir aux noms d'origine", QMessageBox.RejectRole)
+        box.exec_()
+        try:
+            if box.clickedButton() is resume_button:
+                plan = resume_journal(self.journal)
+                self.undo_history.push(plan)
+                self.undo_button.setEnabled(True)
+            else:
+                plan = rollback_journal(self.journal)
+                plan.renames = []
+        except (RenameError, OSError) as e:
+            QMessageBox.critical(self, "Erreur", str(e))
+            return
+        self.after_external_rename(plan)
+
+    def after_external_rename(self, plan):
+        # Rafraîchit le dossier affiché s'il est concerné par le lot
+        if not self.folder or os.path.abspath(self.folder) != plan.folder:
+            get_metadata_index().move_paths(
+                [(os.path.join(plan.folder, old), os.path.join(plan.folder, new)) for old, new in plan.renames]
+            )
+            return
+        self.follow_renames(plan.renames)
+        self.filenames = sorted(f for f in os.listdir(self.folder) if os.path.isfile(os.path.join(self.folder, f)))
+        self.files_model.set_names(self.filenames)
         self.update_preview()
-        self.last_renames = []
-        self.undo_button.setEnabled(False)
-        if errors:
-            QMessageBox.warning(self, "Erreur(s)", "\n".join(errors))
-        else:
-            QMessageBox.information(self, "Annulé", "Renommage annulé.")
+
+    def follow_renames(self, pairs):
+        # Les métadonnées suivent les fichiers renommés, sans relecture
+        self.exif_info.update({new: self.exif_info[old] for old, new in pairs if old in self.exif_info})
+        get_metadata_index().move_paths(
+            [(os.path.join(self.folder, old), os.path.join(self.folder, new)) for old, new in pairs]
+        )
 
     def fav_file_path(self):
         # Stocke les favoris à la racine du projet
@@ -348,10 +352,8 @@ class RenamerTab(QWidget):
         if folder and os.path.isdir(folder):
             self.folder = folder
             self.info_label.setText(f"Dossier sélectionné : {folder}")
-            self.files_list.clear()
-            self.preview_list.clear()
             self.filenames = [f for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f))]
             self.filenames.sort()  # <-- Et ici aussi
-            for filename in self.filenames:
-                self.files_list.addItem(filename)
+            self.files_model.set_names(self.filenames)
+            self.start_indexing()
             self.update_preview()
\ No newline at end of file
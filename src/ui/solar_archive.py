@@ -0,0 +1,59 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+# Stocké à la racine du projet, à côté de favs.json
+SOLAR_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "solar_archive")
+
+class SolarArchive:
+    # Images successives de chaque source, horodatées. Le contenu est rangé une
+    # seule fois par empreinte SHA-256 (objects/ab/abcdef….img) : une image
+    # republiée à l'identique par le serveur n'ajoute ni fichier ni image.
+    def __init__(self, folder=SOLAR_ARCHIVE_DIR):
+        self.folder = folder
+        self.objects_dir = os.path.join(folder, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        # Connexion partagée entre le thread GUI et les jobs de téléchargement
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(folder, "frames.sqlite"), check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS frames ("
+                " source TEXT NOT NULL, timestamp REAL NOT NULL, hash TEXT NOT NULL,"
+                " PRIMARY KEY (source, hash))"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS frames_by_time ON frames (source, timestamp)"
+            )
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest + ".img")
+
+    def add(self, source, data, timestamp):
+        # Renvoie True si l'image est nouvelle pour cette source
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO frames (source, timestamp, hash) VALUES (?, ?, ?)",
+                (source, timestamp, digest)
+            )
+        return cursor.rowcount > 0
+
+    def frames(self, source):
+        # [(horodatage, empreinte)] par ordre chronologique
+        with self.lock:
+            return self.conn.execute(
+                "SELECT timestamp, hash FROM frames WHERE source = ? ORDER BY timestamp", (source,)
+            ).fetchall()
+
+    def read(self, digest):
+        with open(self.object_path(digest), "rb") as f:
+            return f.read()
@@ -0,0 +1,177 @@
+import concurrent.futures
+import email.utils
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Stocké à la racine du projet, à côté de favs.json
+SOLAR_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "solar_cache")
+SOLAR_CACHE_MAX_BYTES = 50 * 1024 * 1024
+# (connexion, lecture) en secondes
+FETCH_TIMEOUT = (5, 20)
+FETCH_WORKERS = 4
+
+class ImageCache:
+    # Dernière version de chaque URL sur disque, avec ses validateurs HTTP
+    # (ETag, Last-Modified). Les entrées les moins récemment utilisées sont
+    # supprimées au-delà de max_bytes.
+    def __init__(self, folder=SOLAR_CACHE_DIR, max_bytes=SOLAR_CACHE_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(folder, "index.json")
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        try:
+            with open(self.index_path) as f:
+                self.entries = json.load(f)
+        except Exception:
+            self.entries = {}
+        # Limite éventuellement abaissée depuis la dernière session
+        self.evict()
+
+    def file_path(self, url):
+        return os.path.join(self.folder, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".img")
+
+    def save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.index_path)
+
+    def meta(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+            return dict(entry) if entry else None
+
+    def get(self, url):
+        # (contenu, métadonnées) ou (None, None)
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return None, None
+            try:
+                with open(self.file_path(url), "rb") as f:
+                    data = f.read()
+            except OSError:
+                del self.entries[url]
+                return None, None
+            entry["used"] = time.time()
+            return data, dict(entry)
+
+    def put(self, url, data, etag=None, last_modified=None):
+        path = self.file_path(url)
+        with self.lock:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            now = time.time()
+            self.entries[url] = {
+                "etag": etag, "last_modified": last_modified,
+                "size": len(data), "fetched": now, "used": now,
+            }
+            self.evict()
+            self.save_index()
+
+    def touch(self, url):
+        # Réponse 304 : le contenu en cache est toujours valable
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                entry["fetched"] = entry["used"] = time.time()
+                self.save_index()
+
+    def evict(self):
+        total = sum(entry["size"] for entry in self.entries.values())
+        for url in sorted(self.entries, key=lambda u: self.entries[u]["used"]):
+            if total <= self.max_bytes or len(self.entries) == 1:
+                break
+            total -= self.entries.pop(url)["size"]
+            try:
+                os.remove(self.file_path(url))
+            except OSError:
+                pass
+
+class FetchResult:
+    # status : "new" (contenu téléchargé), "unchanged" (304, contenu du cache)
+    # ou "error" (contenu du cache s'il existe)
+    def __init__(self, url, status, data=None, error=None, fetched=None, modified=None):
+        self.url = url
+        self.status = status
+        self.data = data
+        self.error = error
+        self.fetched = fetched
+        # Date de publication annoncée par le serveur (Last-Modified), sinon None
+        self.modified = modified
+
+def parse_http_date(value):
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def make_session(pool_size=FETCH_WORKERS):
+    # Import différé : requests n'est chargé qu'au premier téléchargement
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+class ImageFetcher:
+    # Téléchargements concurrents avec une session partagée (connexions
+    # réutilisées) et des requêtes conditionnelles : une image inchangée
+    # côté serveur ne coûte qu'une réponse 304 vide.
+    def __init__(self, cache=None, timeout=FETCH_TIMEOUT, workers=FETCH_WORKERS, session=None):
+        self.cache = cache if cache is not None else ImageCache()
+        self.timeout = timeout
+        self.workers = workers
+        self.session = session
+        self.session_lock = threading.Lock()
+
+    def get_session(self):
+        with self.session_lock:
+            if self.session is None:
+                self.session = make_session(self.workers)
+            return self.session
+
+    def fetch(self, url):
+        headers = {}
+        meta = self.cache.meta(url)
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            response = self.get_session().get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                self.cache.touch(url)
+                data, meta = self.cache.get(url)
+                if data is not None:
+                    return FetchResult(url, "unchanged", data, fetched=meta["fetched"])
+                # Entrée disparue entre-temps : nouvelle requête sans validateurs
+                response = self.get_session().get(url, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.content
+            last_modified = response.headers.get("Last-Modified")
+            self.cache.put(url, data, response.headers.get("ETag"), last_modified)
+            return FetchResult(url, "new", data, fetched=time.time(), modified=parse_http_date(last_modified))
+        except Exception as e:
+            data, meta = self.cache.get(url)
+            return FetchResult(url, "error", data, error=str(e), fetched=meta["fetched"] if meta else None)
+
+    def fetch_all(self, urls, should_stop=None):
+        # Génère les résultats dans l'ordre d'arrivée
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.fetch, url) for url in urls]
+            for future in concurrent.futures.as_completed(futures):
+                if should_stop is not None and should_stop():
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                yield future.result()
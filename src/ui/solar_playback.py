@@ -0,0 +1,195 @@
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSlider, QComboBox, QSpinBox
+)
+from PyQt5.QtGui import QPixmap, QImageReader
+from PyQt5.QtCore import Qt, QTimer, QBuffer, QByteArray
+import time
+from .workers import JobRunner
+
+IMAGE_SIZE = 600
+# Images décodées gardées autour de la position de lecture (~1,4 Mo chacune en 600 px)
+PLAYBACK_BUFFER_FRAMES = 48
+DEFAULT_PLAYBACK_FPS = 8
+
+def decode_image(data):
+    # Décodage hors du thread GUI (QImage, pas QPixmap), directement à la taille
+    # d'affichage : le décodeur JPEG réduit pendant la décompression
+    buffer = QBuffer()
+    buffer.setData(QByteArray(data))
+    buffer.open(QBuffer.ReadOnly)
+    reader = QImageReader(buffer)
+    size = reader.size()
+    if size.isValid():
+        size.scale(IMAGE_SIZE, IMAGE_SIZE, Qt.KeepAspectRatio)
+        reader.setScaledSize(size)
+    image = reader.read()
+    if image.isNull():
+        return None
+    return image
+
+def decode_frames_job(job, archive, digests):
+    # digests : [(index, empreinte)] dans l'ordre de priorité
+    for index, digest in digests:
+        job.check_cancelled()
+        job.emit("frame", (index, decode_image(archive.read(digest))))
+
+class FrameRingBuffer:
+    # Tampon circulaire d'images décodées : l'image n occupe la case n % capacité,
+    # donc une fenêtre de `capacity` images consécutives tient exactement dans le
+    # tampon et avancer d'une image n'en remplace qu'une.
+    def __init__(self, capacity=PLAYBACK_BUFFER_FRAMES):
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.slots = [None] * self.capacity
+
+    def get(self, index):
+        slot = self.slots[index % self.capacity]
+        if slot is not None and slot[0] == index:
+            return slot[1]
+        return None
+
+    def put(self, index, image):
+        self.slots[index % self.capacity] = (index, image)
+
+    def window(self, position, count):
+        # Surtout en avant de la position : c'est là que va la lecture
+        start = max(0, position - self.capacity // 4)
+        end = min(count, start + self.capacity)
+        return range(max(0, end - self.capacity), end)
+
+    def missing(self, position, count):
+        # Images de la fenêtre à décoder, les plus proches en avant d'abord
+        indices = [i for i in self.window(position, count) if self.get(i) is None]
+        return sorted(indices, key=lambda i: (i < position, abs(i - position)))
+
+class SolarPlayer(QWidget):
+    # Lecture des images archivées d'une source, avec décodage anticipé
+    def __init__(self, archive, sources):
+        super().__init__()
+        self.archive = archive
+        self.sources = sources
+        self.frames = []
+        self.playing = False
+        self.buffer = FrameRingBuffer()
+        self.jobs = JobRunner(max_threads=1)
+        self.play_timer = QTimer(self)
+        self.play_timer.timeout.connect(self.advance)
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+
+        controls = QHBoxLayout()
+        self.source_combo = QComboBox()
+        for title, url in self.sources:
+            self.source_combo.addItem(title, url)
+        self.source_combo.currentIndexChanged.connect(self.reload_frames)
+        controls.addWidget(self.source_combo)
+        self.play_button = QPushButton("Lecture")
+        self.play_button.clicked.connect(self.toggle_play)
+        controls.addWidget(self.play_button)
+        self.fps_spin = QSpinBox()
+        self.fps_spin.setRange(1, 30)
+        self.fps_spin.setValue(DEFAULT_PLAYBACK_FPS)
+        self.fps_spin.setSuffix(" img/s")
+        self.fps_spin.valueChanged.connect(self.update_play_timer)
+        controls.addWidget(self.fps_spin)
+        layout.addLayout(controls)
+
+        self.image_label = QLabel("Aucune image archivée.")
+        self.image_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.image_label)
+
+        self.slider = QSlider(Qt.Horizontal)
+        self.slider.setMinimum(0)
+        self.slider.setMaximum(0)
+        self.slider.valueChanged.connect(self.show_position)
+        layout.addWidget(self.slider)
+
+        self.time_label = QLabel("")
+        self.time_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.time_label)
+
+    def current_url(self):
+        return self.source_combo.currentData()
+
+    def reload_frames(self):
+        self.jobs.cancel_all()
+        self.buffer.clear()
+        self.frames = self.archive.frames(self.current_url()) if self.current_url() else []
+        self.slider.blockSignals(True)
+        self.slider.setMaximum(max(0, len(self.frames) - 1))
+        self.slider.setValue(max(0, len(self.frames) - 1))
+        self.slider.blockSignals(False)
+        self.show_position(self.slider.value())
+
+    def on_archive_changed(self, url):
+        # Nouvelle image archivée : la liste s'allonge, le tampon reste valable
+        if url != self.current_url():
+            return
+        at_end = self.slider.value() == self.slider.maximum()
+        self.frames = self.archive.frames(url)
+        self.slider.blockSignals(True)
+        self.slider.setMaximum(max(0, len(self.frames) - 1))
+        if at_end:
+            self.slider.setValue(self.slider.maximum())
+        self.slider.blockSignals(False)
+        self.show_position(self.slider.value())
+
+    def show_position(self, position):
+        if not self.frames:
+            self.image_label.setText("Aucune image archivée.")
+            self.time_label.setText("")
+            return
+        image = self.buffer.get(position)
+        if image is None:
+            # Image absente du tampon (saut du curseur) : décodée tout de suite
+            image = decode_image(self.archive.read(self.frames[position][1]))
+            self.buffer.put(position, image)
+        if image is not None:
+            self.image_label.setPixmap(QPixmap.fromImage(image))
+        timestamp = self.frames[position][0]
+        self.time_label.setText(
+            f"{time.strftime('%d/%m/%Y %H:%M', time.localtime(timestamp))}  ({position + 1}/{len(self.frames)})"
+        )
+        self.prefetch(position)
+
+    def prefetch(self, position):
+        missing = self.buffer.missing(position, len(self.frames))
+        # Remplissage par lots : pas de nouveau job à chaque image pendant la lecture
+        if not missing or (len(missing) < self.buffer.capacity // 4 and position + 1 not in missing):
+            return
+        self.jobs.submit(
+            decode_frames_job, self.archive, [(i, self.frames[i][1]) for i in missing],
+            on_result=self.on_frame_result
+        )
+
+    def on_frame_result(self, job_id, stage, payload):
+        index, image = payload
+        # Résultat arrivé après un saut du curseur : ne pas écraser la fenêtre courante
+        if index in self.buffer.window(self.slider.value(), len(self.frames)):
+            self.buffer.put(index, image)
+
+    def toggle_play(self):
+        if self.playing:
+            self.playing = False
+            self.play_timer.stop()
+            self.play_button.setText("Lecture")
+            return
+        if self.slider.value() >= self.slider.maximum():
+            self.slider.setValue(0)
+        self.playing = True
+        self.play_button.setText("Pause")
+        self.update_play_timer()
+
+    def update_play_timer(self):
+        if self.playing:
+            self.play_timer.start(int(1000 / self.fps_spin.value()))
+
+    def advance(self):
+        if self.slider.value() >= self.slider.maximum():
+            self.toggle_play()
+            return
+        self.slider.setValue(self.slider.value() + 1)
@@ -1,43 +1,110 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QScrollArea
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QScrollArea, QCheckBox, QSpinBox
+)
 from PyQt5.QtGui import QPixmap
-from PyQt5.QtCore import Qt
-import requests
+from PyQt5.QtCore import Qt, QTimer
+import time
+from .solar_fetch import ImageFetcher
+from .solar_archive import SolarArchive
+from .solar_playback import SolarPlayer, decode_image
+from .workers import JobRunner
+
+# (titre, URL, message d'erreur)
+SOLAR_SOURCES = [
+    # Taches solaires
+    ("Taches solaires", "https://www.spaceweatherlive.com/images/SDO/SDO_HMIIF_1024.jpg",
+     "Erreur lors du chargement des taches solaires."),
+    # Protubérances solaires
+    ("Protubérances solaires", "https://sdo.gsfc.nasa.gov/assets/img/latest/latest_1024_0131.jpg",
+     "Erreur lors du chargement des protubérances."),
+    # Ejection des masse coronale
+    ("Ejection de masse coronale", "https://sohowww.nascom.nasa.gov/data/realtime/c2/1024/latest.jpg",
+     "Erreur lors du chargement des éjections de masse coronale."),
+]
+DEFAULT_REFRESH_MINUTES = 15
+
+def solar_fetch_job(job, fetcher, archive, urls, shown):
+    # Images en cache d'abord (affichage immédiat), puis requêtes conditionnelles en parallèle
+    for url in urls:
+        if url in shown:
+            continue
+        data, meta = fetcher.cache.get(url)
+        if data is not None:
+            job.emit("image", (url, "cached", decode_image(data), meta["fetched"], None))
+            shown = shown | {url}
+    for result in fetcher.fetch_all(urls, should_stop=job.is_cancelled):
+        if result.status == "new":
+            # Archivage pour le time-lapse, daté par le serveur si possible
+            if archive.add(result.url, result.data, result.modified or result.fetched):
+                job.emit("archived", result.url)
+        image = None
+        if result.data is not None and (result.status == "new" or result.url not in shown):
+            image = decode_image(result.data)
+        job.emit("image", (result.url, result.status, image, result.fetched, result.error))
 
 class SolarTab(QWidget):
-    def __init__(self):
+    def __init__(self, fetcher=None, sources=SOLAR_SOURCES, archive=None):
         super().__init__()
+        self.sources = sources
+        self.fetcher = fetcher
+        self.archive = archive if archive is not None else SolarArchive()
+        self.loaded = False
+        self.image_labels = {}
+        self.error_texts = {}
+        self.shown = set()
+        self.fetch_job = None
+        self.jobs = JobRunner(max_threads=1)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh_solar_images)
         self.setup_ui()
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Premier chargement une fois l'onglet affiché, jamais à la construction
+        if not self.loaded:
+            self.loaded = True
+            self.player.reload_frames()
+            self.refresh_solar_images()
+
     def setup_ui(self):
         solar_layout = QVBoxLayout()
 
-        self.solar_spots_label = QLabel("Taches solaires")
-        self.solar_spots_label.setAlignment(Qt.AlignCenter)
-        solar_layout.addWidget(self.solar_spots_label)
-
-        self.solar_spots_image = QLabel()
-        self.solar_spots_image.setAlignment(Qt.AlignCenter)
-        solar_layout.addWidget(self.solar_spots_image)
-
-        self.solar_prom_label = QLabel("Protubérances solaires")
-        self.solar_prom_label.setAlignment(Qt.AlignCenter)
-        solar_layout.addWidget(self.solar_prom_label)
-
-        self.solar_prom_image = QLabel()
-        self.solar_prom_image.setAlignment(Qt.AlignCenter)
-        solar_layout.addWidget(self.solar_prom_image)
+        for title, url, error_text in self.sources:
+            title_label = QLabel(title)
+            title_label.setAlignment(Qt.AlignCenter)
+            solar_layout.addWidget(title_label)
 
-        self.solar_ejection_label = QLabel("Ejection de masse coronale")
-        self.solar_ejection_label.setAlignment(Qt.AlignCenter)
-        solar_layout.addWidget(self.solar_ejection_label)
+            image_label = QLabel()
+            image_label.setAlignment(Qt.AlignCenter)
+            solar_layout.addWidget(image_label)
+            self.image_labels[url] = image_label
+            self.error_texts[url] = error_text
 
-        self.solar_ejection_image = QLabel()
-        self.solar_ejection_image.setAlignment(Qt.AlignCenter)
-        solar_layout.addWidget(self.solar_ejection_image)
+        self.status_label = QLabel("")
+        self.status_label.setAlignment(Qt.AlignCenter)
+        solar_layout.addWidget(self.status_label)
 
+        refresh_layout = QHBoxLayout()
         refresh_button = QPushButton("Rafraîchir les images")
         refresh_button.clicked.connect(self.refresh_solar_images)
-        solar_layout.addWidget(refresh_button)
+        refresh_layout.addWidget(refresh_button)
+        self.auto_refresh_checkbox = QCheckBox("Rafraîchir automatiquement toutes les")
+        self.auto_refresh_checkbox.toggled.connect(self.update_refresh_timer)
+        refresh_layout.addWidget(self.auto_refresh_checkbox)
+        self.refresh_spin = QSpinBox()
+        self.refresh_spin.setRange(1, 24 * 60)
+        self.refresh_spin.setValue(DEFAULT_REFRESH_MINUTES)
+        self.refresh_spin.setSuffix(" min")
+        self.refresh_spin.valueChanged.connect(self.update_refresh_timer)
+        refresh_layout.addWidget(self.refresh_spin)
+        solar_layout.addLayout(refresh_layout)
+
+        # Time-lapse des images archivées
+        timelapse_label = QLabel("Time-lapse")
+        timelapse_label.setAlignment(Qt.AlignCenter)
+        solar_layout.addWidget(timelapse_label)
+        self.player = SolarPlayer(self.archive, [(title, url) for title, url, _ in self.sources])
+        solar_layout.addWidget(self.player)
 
         # Ajout du layout dans un widget pour le scroll
         solar_content = QWidget()
@@ -51,27 +118,42 @@ class SolarTab(QWidget):
         main_layout.addWidget(scroll_area)
         self.setLayout(main_layout)
 
-        self.refresh_solar_images()
+    def update_refresh_timer(self):
+        if self.auto_refresh_checkbox.isChecked():
+            self.refresh_timer.start(self.refresh_spin.value() * 60 * 1000)
+        else:
+            self.refresh_timer.stop()
 
     def refresh_solar_images(self):
-        # Taches solaires
-        url_spots = "https://www.spaceweatherlive.com/images/SDO/SDO_HMIIF_1024.jpg"
-        self.load_image(url_spots, self.solar_spots_image, "Erreur lors du chargement des taches solaires.")
-
-        # Protubérances solaires
-        url_prom = "https://sdo.gsfc.nasa.gov/assets/img/latest/latest_1024_0131.jpg"
-        self.load_image(url_prom, self.solar_prom_image, "Erreur lors du chargement des protubérances.")
-
-        # Ejection des masse coronale
-        url_ejection = "https://sohowww.nascom.nasa.gov/data/realtime/c2/1024/latest.jpg"
-        self.load_image(url_ejection, self.solar_ejection_image, "Erreur lors du chargement des éjections de masse coronale.")
-
-    def load_image(self, url, label_widget, error_text):
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            image = QPixmap()
-            image.loadFromData(response.content)
-            label_widget.setPixmap(image.scaled(600, 600, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-        except Exception:
-            label_widget.setText(error_text)
\ No newline at end of file
+        if self.fetcher is None:
+            # Créé au premier rafraîchissement : le cache disque n'est pas ouvert avant
+            self.fetcher = ImageFetcher()
+        self.status_label.setText("Mise à jour…")
+        self.fetch_job = self.jobs.submit(
+            solar_fetch_job, self.fetcher, self.archive, [url for _, url, _ in self.sources], set(self.shown),
+            on_result=self.on_image_result, on_error=self.on_fetch_error,
+            on_finished=self.on_fetch_finished
+        )
+
+    def on_image_result(self, job_id, stage, payload):
+        if stage == "archived":
+            self.player.on_archive_changed(payload)
+            return
+        url, status, image, fetched, error = payload
+        label_widget = self.image_labels[url]
+        if image is not None:
+            label_widget.setPixmap(QPixmap.fromImage(image))
+            self.shown.add(url)
+        elif status == "error" and url not in self.shown:
+            label_widget.setText(self.error_texts[url])
+        if status == "error":
+            label_widget.setToolTip(f"{self.error_texts[url]}\n{error}")
+        elif fetched is not None:
+            label_widget.setToolTip(f"Récupérée le {time.strftime('%d/%m/%Y %H:%M', time.localtime(fetched))}")
+
+    def on_fetch_error(self, job_id, message):
+        self.status_label.setText(f"Erreur : {message}")
+
+    def on_fetch_finished(self, job_id):
+        if job_id == self.fetch_job:
+            self.status_label.setText(f"Dernière vérification : {time.strftime('%H:%M:%S')}")
@@ -0,0 +1,341 @@
+import collections
+import concurrent.futures
+import contextlib
+import os
+import warnings
+import numpy as np
+from .fits_loader import fits, open_frame
+
+# Mémoire de travail de l'empilement, toutes tranches en vol comprises
+STACK_MEMORY_BUDGET = 1024 * 1024 * 1024
+# Octets par échantillon et par tranche : la pile float32 seule, le rejet et
+# l'intégration travaillant image par image ou sur place (tri de la médiane)
+BYTES_PER_SAMPLE = 4
+# Octets par pixel et par tranche, quel que soit le nombre d'images : compte,
+# moyenne, somme des carrés et seuils par pixel, temporaires d'une image
+# (écart, seuils, masques), indices de la médiane (int64) : 55 octets mesurés
+BYTES_PER_PIXEL = 64
+# Pas du sous-échantillonnage servant aux médianes de normalisation
+NORMALIZATION_STRIDE = 16
+# Mots-clés recopiés de la première image dans le résultat
+COPIED_KEYWORDS = (
+    "DATE-OBS", "INSTRUME", "TELESCOP", "FILTER", "OBJECT", "EXPTIME", "XPIXSZ", "YPIXSZ",
+    "XBINNING", "YBINNING", "FOCALLEN", "CCD-TEMP", "GAIN", "OFFSET", "RA", "DEC",
+)
+METHODS = ("mean", "median")
+# Écart absolu médian -> écart type, pour une distribution normale
+MAD_TO_SIGMA = 1.4826
+MASTER_FILES = {"bias": "master_bias.fits", "dark": "master_dark.fits", "flat": "master_flat.fits"}
+
+class StackError(Exception):
+    pass
+
+class StackOptions:
+    def __init__(self, method="mean", sigma_low=3.0, sigma_high=3.0, iterations=3,
+                 clip=True, memory_budget=STACK_MEMORY_BUDGET, workers=None):
+        if method not in METHODS:
+            raise StackError(f"Méthode inconnue : {method}")
+        self.method = method
+        self.sigma_low = sigma_low
+        self.sigma_high = sigma_high
+        self.iterations = iterations
+        self.clip = clip
+        self.memory_budget = memory_budget
+        self.workers = workers or os.cpu_count() or 1
+
+class Masters:
+    # Images maîtresses ouvertes en memmap ; chacune peut manquer
+    def __init__(self, bias=None, dark=None, flat=None):
+        self.bias = open_frame(bias, lazy=True) if bias else None
+        self.dark = open_frame(dark, lazy=True) if dark else None
+        self.flat = open_frame(flat, lazy=True) if flat else None
+
+    def frames(self):
+        return [f for f in (self.bias, self.dark, self.flat) if f is not None]
+
+    def close(self):
+        for frame in self.frames():
+            frame.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def rows_of(frame, r0, r1):
+    return np.asarray(frame.data[r0:r1], dtype=np.float32)
+
+def calibrate(stack, masters, r0, r1):
+    # Sur place : (brute - offset - noir) / flat, lignes r0 à r1
+    if masters is None:
+        return stack
+    if masters.bias is not None:
+        stack -= rows_of(masters.bias, r0, r1)
+    if masters.dark is not None:
+        stack -= rows_of(masters.dark, r0, r1)
+    if masters.flat is not None:
+        flat = rows_of(masters.flat, r0, r1)
+        # Pixels morts ou hors champ du flat : laissés non corrigés
+        flat[~(flat > 0)] = 1
+        stack /= flat
+    return stack
+
+def valid_mean(stack):
+    # Nombre de valeurs non NaN et leur moyenne, par pixel. Image par image :
+    # nanmean copierait toute la pile
+    count = np.zeros(stack.shape[1:], dtype=np.float32)
+    total = np.zeros(stack.shape[1:], dtype=np.float32)
+    for plane in stack:
+        count += ~np.isnan(plane)
+        total += np.nan_to_num(plane)
+    return count, total / count
+
+def sigma_clip(stack, sigma_low, sigma_high, iterations, noise):
+    # Rejet itératif, pixel par pixel le long de l'axe des images : les valeurs
+    # rejetées deviennent NaN. Chaque valeur est comparée à la moyenne et à l'écart
+    # type des autres (« leave-one-out ») : une valeur aberrante ne gonfle pas la
+    # dispersion qui sert à la juger, même avec 3 images. Cette dispersion ne
+    # descend jamais sous le bruit de l'image (noise, un par image) : avec peu
+    # d'images ou des données entières, elle serait souvent sous-estimée et les
+    # itérations suivantes rejetteraient de bonnes valeurs.
+    for _ in range(iterations):
+        count, mean = valid_mean(stack)
+        squares = np.zeros_like(mean)
+        for plane in stack:
+            deviation = plane - mean
+            deviation *= deviation
+            squares += np.nan_to_num(deviation)
+        # Pour d = x - moyenne de toutes les valeurs (n au total) :
+        #   x - moyenne des autres = d·n/(n-1)
+        #   variance des autres    = (S - d²·n/(n-1)) / (n-2), S = Σd²
+        # |x - moyenne des autres| > k·√(n/(n-1))·écart type des autres se ramène
+        # à |d| > k·√((n-1)/n)·√(S / (n-2+k²)), le plancher de bruit à
+        # |d| > k·√((n-1)/n)·bruit : des seuils par pixel, sans tableau par valeur
+        testable = count > 2
+        ratio = np.sqrt((count - 1) / count)
+        limits = []
+        for k in (sigma_low, sigma_high):
+            limits.append(np.where(testable, k * ratio * np.sqrt(squares / (count - 2 + k * k)), np.inf))
+        rejected = False
+        for plane, plane_noise in zip(stack, noise):
+            deviation = plane - mean
+            low = np.maximum(limits[0], sigma_low * plane_noise * ratio)
+            high = np.maximum(limits[1], sigma_high * plane_noise * ratio)
+            reject = (deviation < -low) | (deviation > high)
+            if reject.any():
+                plane[reject] = np.nan
+                rejected = True
+        if not rejected:
+            break
+    return stack
+
+def valid_median(stack):
+    # Médiane des valeurs non NaN, par pixel. Tri sur place (les NaN finissent en
+    # bout d'axe) : nanmedian passe par des tableaux masqués plusieurs fois plus
+    # gros que la pile
+    count = np.zeros(stack.shape[1:], dtype=np.int64)
+    for plane in stack:
+        count += ~np.isnan(plane)
+    stack.sort(axis=0)
+    # Aucune valeur : indices -1 et 0, tous deux NaN
+    low = np.take_along_axis(stack, ((count - 1) // 2)[None], axis=0)[0]
+    high = np.take_along_axis(stack, (count // 2)[None], axis=0)[0]
+    return (low + high) / 2
+
+def combine(stack, options, noise=None):
+    # noise : bruit de chaque image, plancher de la dispersion du rejet
+    with warnings.catch_warnings():
+        # Pixel NaN dans toutes les images (BLANK) : NaN dans le résultat
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if options.clip and len(stack) > 2:
+            if noise is None:
+                noise = np.zeros(len(stack), dtype=np.float32)
+            sigma_clip(stack, options.sigma_low, options.sigma_high, options.iterations, noise)
+        if options.method == "median":
+            return valid_median(stack).astype(np.float32)
+        return valid_mean(stack)[1].astype(np.float32)
+
+def stack_rows(frames, masters, offsets, factors, r0, r1, options, noise=None):
+    stack = np.empty((len(frames), r1 - r0, frames[0].shape[1]), dtype=np.float32)
+    for i, frame in enumerate(frames):
+        stack[i] = np.asarray(frame.data[r0:r1])
+    calibrate(stack, masters, r0, r1)
+    if factors is not None:
+        stack *= factors[:, None, None]
+    if offsets is not None:
+        stack += offsets[:, None, None]
+    return combine(stack, options, noise)
+
+def calibrated_sample(frame, masters, column=0):
+    # Image calibrée sur une grille sous-échantillonnée, à partir de la colonne column
+    s = NORMALIZATION_STRIDE
+    window = (slice(None, None, s), slice(column, None, s))
+    sample = np.asarray(frame.data[window], dtype=np.float32)
+    if masters is not None:
+        if masters.bias is not None:
+            sample -= np.asarray(masters.bias.data[window], dtype=np.float32)
+        if masters.dark is not None:
+            sample -= np.asarray(masters.dark.data[window], dtype=np.float32)
+        if masters.flat is not None:
+            flat = np.asarray(masters.flat.data[window], dtype=np.float32)
+            flat[~(flat > 0)] = 1
+            sample /= flat
+    return sample
+
+def sampled_stats(frame, masters):
+    # (médiane, bruit) d'une image calibrée. Le bruit vient des différences entre
+    # pixels voisins (colonnes 0 et 1 de chaque pas de la grille, lues sur les mêmes
+    # lignes) : ni le fond ni le vignetage n'y entrent, les étoiles sont écartées
+    # par la médiane
+    sample = calibrated_sample(frame, masters)
+    neighbours = calibrated_sample(frame, masters, 1)
+    width = min(sample.shape[1], neighbours.shape[1])
+    differences = np.abs(sample[:, :width] - neighbours[:, :width])
+    noise = MAD_TO_SIGMA * np.nanmedian(differences) / np.sqrt(2)
+    return float(np.nanmedian(sample)), float(noise)
+
+def chunk_rows(n_frames, height, width, options):
+    # Lignes par tranche pour que toutes les tranches en vol tiennent dans le budget
+    per_row = width * (n_frames * BYTES_PER_SAMPLE + BYTES_PER_PIXEL)
+    in_flight = options.workers + 1
+    return max(1, min(height, options.memory_budget // (in_flight * per_row)))
+
+def map_chunks(fn, chunks, workers, should_stop=None):
+    # Tranches calculées en parallèle (numpy libère le GIL), rendues dans l'ordre ;
+    # au plus workers + 1 tranches en mémoire à la fois
+    chunks = iter(chunks)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        try:
+            while True:
+                while len(pending) < workers + 1:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    pending.append((chunk, executor.submit(fn, *chunk)))
+                if not pending:
+                    break
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+                if should_stop is not None and should_stop():
+                    raise StackError("Empilement interrompu")
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+def result_header(frame, kind, n_frames, options):
+    header = fits.Header()
+    header["SIMPLE"] = True
+    header["BITPIX"] = -32
+    header["NAXIS"] = 2
+    header["NAXIS1"] = frame.shape[1]
+    header["NAXIS2"] = frame.shape[0]
+    for key in COPIED_KEYWORDS:
+        if key in frame.header:
+            header[key] = frame.header[key]
+    header["IMAGETYP"] = "LIGHT" if kind == "light" else f"MASTER {kind.upper()}"
+    header["NCOMBINE"] = (n_frames, "Nombre d'images empilees")
+    header["STACKMTH"] = (options.method, "Methode d'integration")
+    if options.clip:
+        header["CLIPLOW"] = (options.sigma_low, "Rejet bas (sigma)")
+        header["CLIPHIGH"] = (options.sigma_high, "Rejet haut (sigma)")
+    return header
+
+def stack_files(paths, output_path, kind="light", masters=None, options=None,
+                should_stop=None, progress=None):
+    # Empile paths dans output_path (FITS float32), tranche de lignes par tranche.
+    # kind : « bias », « dark », « flat » (maître normalisé à 1) ou « light ».
+    # Le résultat est écrit au fil des tranches : la mémoire ne dépend ni du
+    # nombre d'images ni de leur taille, seulement du budget.
+    if fits is None:
+        raise ImportError("astropy n'est pas installé")
+    options = options or StackOptions()
+    if not paths:
+        raise StackError("Aucune image à empiler")
+    # Fichiers compressés fermés dès la fin de l'empilement
+    with contextlib.ExitStack() as stack:
+        frames = [stack.enter_context(open_frame(path, lazy=True)) for path in paths]
+        shape = frames[0].shape
+        for path, frame in zip(paths, frames):
+            if frame.shape != shape:
+                raise StackError(f"{os.path.basename(path)} : taille {frame.shape} différente de {shape}")
+        for master in masters.frames() if masters is not None else ():
+            if master.shape != shape:
+                raise StackError(f"Image maîtresse {os.path.basename(master.path)} de taille {master.shape}, images {shape}")
+
+        offsets = factors = noise = None
+        if kind == "flat" or options.clip:
+            medians, noise = np.array([sampled_stats(f, masters) for f in frames], dtype=np.float32).T
+        if kind == "flat":
+            # Chaque flat ramené à une médiane de 1 : le maître est directement un diviseur
+            factors = 1 / medians
+            noise = noise * factors
+        elif kind == "light" and options.clip:
+            # Normalisation additive sur la première image : le fond du ciel varie
+            # d'une pose à l'autre, le rejet doit comparer des images de même niveau
+            offsets = medians[0] - medians
+
+        height, width = shape
+        step = chunk_rows(len(frames), height, width, options)
+        chunks = [(r0, min(height, r0 + step)) for r0 in range(0, height, step)]
+
+        def work(r0, r1):
+            return stack_rows(frames, masters, offsets, factors, r0, r1, options, noise)
+
+        tmp_path = output_path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        stream = fits.StreamingHDU(tmp_path, result_header(frames[0], kind, len(frames), options))
+        try:
+            for done, ((r0, r1), rows) in enumerate(map_chunks(work, chunks, options.workers, should_stop), 1):
+                stream.write(rows)
+                if progress is not None:
+                    progress(done, len(chunks))
+            stream.close()
+        except BaseException:
+            stream.close()
+            os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, output_path)
+        return output_path
+
+def calibrate_and_stack(lights, output_path, bias=(), darks=(), flats=(), options=None,
+                        should_stop=None, progress=None):
+    # Chaîne complète. Pour bias, darks et flats : une seule image est prise pour
+    # un maître existant, plusieurs sont d'abord empilées en maître (à côté du résultat).
+    # progress(étape, fait, total)
+    options = options or StackOptions()
+    folder = os.path.dirname(os.path.abspath(output_path))
+    masters = {}
+
+    def master(kind, paths, calibration):
+        if len(paths) == 1:
+            return paths[0]
+        if not paths:
+            return None
+        path = os.path.join(folder, MASTER_FILES[kind])
+        # Les maîtres sont toujours combinés par médiane, plus robuste sur peu d'images
+        master_options = StackOptions(
+            "median", options.sigma_low, options.sigma_high, options.iterations,
+            options.clip, options.memory_budget, options.workers
+        )
+        return stack_files(
+            list(paths), path, kind, calibration, master_options, should_stop,
+            None if progress is None else lambda done, total: progress(kind, done, total)
+        )
+
+    masters["bias"] = master("bias", list(bias), None)
+    # Noirs et flats débarrassés de l'offset ; le noir maître l'exclut donc aussi
+    with Masters(bias=masters["bias"]) as bias_only:
+        masters["dark"] = master("dark", list(darks), bias_only)
+        masters["flat"] = master("flat", list(flats), bias_only)
+    if not lights:
+        return masters
+    with Masters(masters["bias"], masters["dark"], masters["flat"]) as calibration:
+        stack_files(
+            list(lights), output_path, "light", calibration, options, should_stop,
+            None if progress is None else lambda done, total: progress("light", done, total)
+        )
+    masters["light"] = output_path
+    return masters
@@ -0,0 +1,212 @@
+import os
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QPushButton, QFileDialog, QLabel,
+    QLineEdit, QSpinBox, QDoubleSpinBox, QComboBox, QCheckBox, QMessageBox
+)
+from PyQt5.QtCore import pyqtSignal
+from .workers import JobRunner
+from .exif_extract import FITS_FILE_FILTER
+from .stacking import StackOptions, calibrate_and_stack
+
+DEFAULT_RESULT_FILE = "empilement.fits"
+DEFAULT_MEMORY_MB = 1024
+
+FRAME_GROUPS = [
+    ("bias", "Offsets (bias)"),
+    ("dark", "Noirs (darks)"),
+    ("flat", "Plages de lumière (flats)"),
+    ("light", "Images (lights)"),
+]
+
+STAGE_LABELS = {
+    "bias": "offset maître",
+    "dark": "noir maître",
+    "flat": "flat maître",
+    "light": "images",
+}
+
+def stacking_job(job, groups, output_path, options):
+    def progress(stage, done, total):
+        job.emit("progress", (stage, done, total))
+    result = calibrate_and_stack(
+        groups["light"], output_path, groups["bias"], groups["dark"], groups["flat"],
+        options, should_stop=job.is_cancelled, progress=progress
+    )
+    job.emit("done", result)
+
+class StackingTab(QWidget):
+    # Chemin du résultat, à afficher dans le visualiseur FITS
+    open_in_viewer = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.groups = {kind: [] for kind, _ in FRAME_GROUPS}
+        self.result_path = None
+        self.jobs = JobRunner(max_threads=1)
+        self.layout = QVBoxLayout(self)
+
+        # Une ligne par type d'image : un seul fichier est pris pour un maître déjà fait
+        files_layout = QGridLayout()
+        self.count_labels = {}
+        for row, (kind, title) in enumerate(FRAME_GROUPS):
+            files_layout.addWidget(QLabel(title), row, 0)
+            label = QLabel("Aucun fichier")
+            files_layout.addWidget(label, row, 1)
+            self.count_labels[kind] = label
+            button = QPushButton("Choisir…")
+            button.clicked.connect(lambda checked, k=kind: self.select_files(k))
+            files_layout.addWidget(button, row, 2)
+            clear = QPushButton("Vider")
+            clear.clicked.connect(lambda checked, k=kind: self.set_files(k, []))
+            files_layout.addWidget(clear, row, 3)
+        self.layout.addLayout(files_layout)
+
+        # Paramètres d'intégration
+        params_layout = QHBoxLayout()
+        params_layout.addWidget(QLabel("Méthode :"))
+        self.method_combo = QComboBox()
+        self.method_combo.addItem("Moyenne", "mean")
+        self.method_combo.addItem("Médiane", "median")
+        params_layout.addWidget(self.method_combo)
+        self.clip_checkbox = QCheckBox("Rejet sigma")
+        self.clip_checkbox.setChecked(True)
+        params_layout.addWidget(self.clip_checkbox)
+        params_layout.addWidget(QLabel("Bas :"))
+        self.sigma_low_spin = QDoubleSpinBox()
+        self.sigma_low_spin.setRange(0.5, 10.0)
+        self.sigma_low_spin.setValue(3.0)
+        params_layout.addWidget(self.sigma_low_spin)
+        params_layout.addWidget(QLabel("Haut :"))
+        self.sigma_high_spin = QDoubleSpinBox()
+        self.sigma_high_spin.setRange(0.5, 10.0)
+        self.sigma_high_spin.setValue(3.0)
+        params_layout.addWidget(self.sigma_high_spin)
+        self.layout.addLayout(params_layout)
+
+        resources_layout = QHBoxLayout()
+        resources_layout.addWidget(QLabel("Mémoire :"))
+        self.memory_spin = QSpinBox()
+        self.memory_spin.setRange(64, 64 * 1024)
+        self.memory_spin.setSingleStep(256)
+        self.memory_spin.setValue(DEFAULT_MEMORY_MB)
+        self.memory_spin.setSuffix(" Mo")
+        resources_layout.addWidget(self.memory_spin)
+        resources_layout.addWidget(QLabel("Threads :"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, max(1, os.cpu_count() or 1) * 2)
+        self.workers_spin.setValue(os.cpu_count() or 1)
+        resources_layout.addWidget(self.workers_spin)
+        self.layout.addLayout(resources_layout)
+
+        output_layout = QHBoxLayout()
+        output_layout.addWidget(QLabel("Résultat :"))
+        self.output_input = QLineEdit()
+        output_layout.addWidget(self.output_input)
+        self.output_btn = QPushButton("…")
+        self.output_btn.clicked.connect(self.select_output)
+        output_layout.addWidget(self.output_btn)
+        self.layout.addLayout(output_layout)
+
+        buttons_layout = QHBoxLayout()
+        self.run_btn = QPushButton("Empiler")
+        self.run_btn.clicked.connect(self.start_stacking)
+        buttons_layout.addWidget(self.run_btn)
+        self.cancel_btn = QPushButton("Arrêter")
+        self.cancel_btn.clicked.connect(self.cancel_stacking)
+        self.cancel_btn.setEnabled(False)
+        buttons_layout.addWidget(self.cancel_btn)
+        self.view_btn = QPushButton("Ouvrir dans le visualiseur")
+        self.view_btn.clicked.connect(self.view_result)
+        self.view_btn.setEnabled(False)
+        buttons_layout.addWidget(self.view_btn)
+        self.layout.addLayout(buttons_layout)
+
+        self.info_label = QLabel("")
+        self.layout.addWidget(self.info_label)
+        self.layout.addStretch(1)
+
+    def select_files(self, kind):
+        paths, _ = QFileDialog.getOpenFileNames(self, "Choisir des fichiers FITS", "", FITS_FILE_FILTER)
+        if paths:
+            self.set_files(kind, sorted(paths))
+
+    def set_files(self, kind, paths):
+        self.groups[kind] = paths
+        if not paths:
+            text = "Aucun fichier"
+        elif len(paths) == 1 and kind != "light":
+            text = f"Maître : {os.path.basename(paths[0])}"
+        else:
+            text = f"{len(paths)} fichiers"
+        self.count_labels[kind].setText(text)
+        if kind == "light" and paths and not self.output_input.text():
+            self.output_input.setText(os.path.join(os.path.dirname(paths[0]), DEFAULT_RESULT_FILE))
+
+    def select_output(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Fichier résultat", self.output_input.text(), "FITS (*.fits)"
+        )
+        if file_path:
+            self.output_input.setText(file_path)
+
+    def stack_options(self):
+        return StackOptions(
+            method=self.method_combo.currentData(),
+            sigma_low=self.sigma_low_spin.value(),
+            sigma_high=self.sigma_high_spin.value(),
+            clip=self.clip_checkbox.isChecked(),
+            memory_budget=self.memory_spin.value() * 1024 * 1024,
+            workers=self.workers_spin.value(),
+        )
+
+    def start_stacking(self):
+        if not any(self.groups.values()):
+            QMessageBox.warning(self, "Erreur", "Aucun fichier sélectionné.")
+            return
+        output_path = self.output_input.text()
+        if not output_path:
+            first = next(paths for paths in self.groups.values() if paths)
+            output_path = os.path.join(os.path.dirname(first[0]), DEFAULT_RESULT_FILE)
+            self.output_input.setText(output_path)
+        self.result_path = None
+        self.view_btn.setEnabled(False)
+        self.run_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.info_label.setText("Préparation…")
+        self.jobs.submit(
+            stacking_job, {k: list(v) for k, v in self.groups.items()}, output_path, self.stack_options(),
+            on_result=self.on_result, on_error=self.on_error, on_finished=self.on_finished
+        )
+
+    def cancel_stacking(self):
+        # Le calcul s'arrête après la tranche en cours ; le fichier partiel est supprimé
+        self.jobs.cancel_all()
+        self.cancel_btn.setEnabled(False)
+        self.info_label.setText("Empilement interrompu.")
+        if not self.jobs.is_running():
+            self.on_finished(None)
+
+    def on_result(self, job_id, stage, payload):
+        if stage == "progress":
+            step, done, total = payload
+            self.info_label.setText(f"Empilement ({STAGE_LABELS[step]}) : {done} / {total} tranches")
+        elif stage == "done":
+            self.result_path = payload.get("light") or payload.get("flat") or payload.get("dark") or payload.get("bias")
+            masters = [os.path.basename(payload[k]) for k in ("bias", "dark", "flat") if payload.get(k)]
+            text = f"Terminé : {self.result_path}"
+            if masters:
+                text += f"\nMaîtres : {', '.join(masters)}"
+            self.info_label.setText(text)
+            self.view_btn.setEnabled(True)
+
+    def on_error(self, job_id, message):
+        self.info_label.setText("")
+        QMessageBox.critical(self, "Erreur", message)
+
+    def on_finished(self, job_id):
+        self.run_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+
+    def view_result(self):
+        if self.result_path:
+            self.open_in_viewer.emit(self.result_path)
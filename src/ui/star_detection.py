@@ -1,15 +1,255 @@
 from photutils.detection import DAOStarFinder
 from astropy.stats import sigma_clipped_stats
+from astropy.table import vstack
+import concurrent.futures
 import numpy as np
+import collections
+import inspect
+import math
+import os
+import threading
 
-def detect_stars(data, fwhm=3.0, threshold_sigma=5.0):
-    data = np.nan_to_num(data)
-    mean, median, std = sigma_clipped_stats(data, sigma=3.0)
-    daofind = DAOStarFinder(fwhm=fwhm, threshold=threshold_sigma*std)
-    sources = daofind(data - median)
-    if sources is not None and len(sources) > 0:
-        roundness1 = np.mean(sources['roundness1'])
-        roundness2 = np.mean(sources['roundness2'])
-        return len(sources), roundness1, roundness2
+DETECTION_CACHE_SIZE = 16
+DETECTION_TILE_SIZE = 1024
+# Chevauchement des tuiles, en FWHM
+DETECTION_TILE_OVERLAP = 3
+# Mode rapide : statistiques de fond sur un sous-échantillon, N étoiles les plus brillantes
+QUICK_STATS_MAX_PIXELS = 1_000_000
+QUICK_BRIGHTEST = 200
+# Paramètre renommé dans photutils 3.0 (brightest -> n_brightest)
+BRIGHTEST_ARG = "n_brightest" if "n_brightest" in inspect.signature(DAOStarFinder).parameters else "brightest"
+
+def source_column(sources, *names):
+    # Les colonnes ont été renommées selon les versions de photutils (xcentroid -> x_centroid)
+    for name in names:
+        if name in sources.colnames:
+            return np.asarray(sources[name])
+    raise KeyError(names[0])
+
+def column_name(sources, *names):
+    for name in names:
+        if name in sources.colnames:
+            return name
+    raise KeyError(names[0])
+
+def background_stats(data, quick=False, tiled=False):
+    # Fond (médiane) et bruit (écart type) après sigma-clipping, sur les seuls
+    # pixels finis (NaN, BLANK exclus). En mode rapide ou par tuiles, estimés sur
+    # un sous-échantillon : l'image entière n'est jamais copiée.
+    if (quick or tiled) and data.size > QUICK_STATS_MAX_PIXELS:
+        step = int(math.ceil(math.sqrt(data.size / QUICK_STATS_MAX_PIXELS)))
+        data = data[::step, ::step]
+    sample = np.asarray(data, dtype=np.float32)
+    sample = sample[np.isfinite(sample)]
+    if sample.size == 0:
+        return 0.0, 0.0
+    mean, median, std = sigma_clipped_stats(sample, sigma=3.0)
+    return float(median), float(std)
+
+def detect_block(block, background, noise, fwhm, threshold_sigma, brightest=None):
+    # Une seule copie de travail en float32 (la source peut être un memmap en lecture seule)
+    block = np.array(block, dtype=np.float32)
+    np.nan_to_num(block, copy=False)
+    block -= background
+    options = {BRIGHTEST_ARG: brightest} if brightest is not None else {}
+    daofind = DAOStarFinder(fwhm=fwhm, threshold=threshold_sigma*noise, **options)
+    sources = daofind(block)
+    if sources is not None and len(sources) == 0:
+        sources = None
+    return sources
+
+def detect_tiled(data, background, noise, fwhm, threshold_sigma, brightest=None,
+                 tile_size=DETECTION_TILE_SIZE, workers=None):
+    # Tuiles chevauchantes détectées en parallèle. Chaque étoile n'est gardée que par la
+    # tuile dont la zone propre (sans le chevauchement) contient son centroïde.
+    h, w = data.shape
+    margin = int(math.ceil(DETECTION_TILE_OVERLAP * fwhm))
+
+    def detect_tile(origin):
+        y0, x0 = origin
+        ys, xs = max(0, y0 - margin), max(0, x0 - margin)
+        ye, xe = min(h, y0 + tile_size + margin), min(w, x0 + tile_size + margin)
+        sources = detect_block(data[ys:ye, xs:xe], background, noise, fwhm, threshold_sigma, brightest)
+        if sources is None:
+            return None
+        x_name = column_name(sources, 'x_centroid', 'xcentroid')
+        y_name = column_name(sources, 'y_centroid', 'ycentroid')
+        sources[x_name] += xs
+        sources[y_name] += ys
+        x = np.asarray(sources[x_name])
+        y = np.asarray(sources[y_name])
+        keep = (x >= x0) & (x < x0 + tile_size) & (y >= y0) & (y < y0 + tile_size)
+        return sources[keep] if keep.any() else None
+
+    origins = [(y0, x0) for y0 in range(0, h, tile_size) for x0 in range(0, w, tile_size)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        tables = [t for t in executor.map(detect_tile, origins) if t is not None]
+    if not tables:
+        return None
+    sources = vstack(tables, metadata_conflicts="silent")
+    if brightest is not None and len(sources) > brightest:
+        order = np.argsort(-np.asarray(sources['flux']))[:brightest]
+        sources = sources[np.sort(order)]
+    return sources
+
+def find_sources(data, fwhm=3.0, threshold_sigma=5.0, tiled=False, quick=False,
+                 brightest=None, workers=None):
+    # Renvoie la table DAOStarFinder (ou None), le fond et le bruit.
+    # tiled : détection par tuiles en parallèle ; quick : fond estimé sur un
+    # sous-échantillon et détection limitée aux étoiles les plus brillantes.
+    if quick and brightest is None:
+        brightest = QUICK_BRIGHTEST
+    background, noise = background_stats(data, quick, tiled)
+    if tiled:
+        sources = detect_tiled(data, background, noise, fwhm, threshold_sigma, brightest, workers=workers)
     else:
-        return 0, None, None
\ No newline at end of file
+        sources = detect_block(data, background, noise, fwhm, threshold_sigma, brightest)
+    return sources, background, noise
+
+# Colonnes de la table des sources, quelle que soit la version de photutils
+SOURCE_COLUMNS = {
+    "x": ("x_centroid", "xcentroid"),
+    "y": ("y_centroid", "ycentroid"),
+    "flux": ("flux",),
+    "peak": ("peak",),
+    "sharpness": ("sharpness",),
+    "roundness1": ("roundness1",),
+    "roundness2": ("roundness2",),
+}
+
+def source_table(sources):
+    # Table complète des sources en tableaux numpy ({colonne: tableau}), triée
+    # par flux décroissant ; tableaux vides si aucune source
+    if sources is None:
+        return {name: np.empty(0) for name in SOURCE_COLUMNS}
+    table = {name: source_column(sources, *names).astype(np.float64) for name, names in SOURCE_COLUMNS.items()}
+    order = np.argsort(-table["flux"], kind="stable")
+    return {name: values[order] for name, values in table.items()}
+
+def detect_sources(data, fwhm=3.0, threshold_sigma=5.0, tiled=False, quick=False, brightest=None):
+    # Comme find_sources, avec la table sous forme de tableaux numpy
+    sources, background, noise = find_sources(data, fwhm, threshold_sigma, tiled, quick, brightest)
+    return source_table(sources), background, noise
+
+def summarize_sources(table):
+    # Résumé affiché par le visualiseur : (nombre, roundness1 moyen, roundness2 moyen)
+    if len(table["x"]) == 0:
+        return 0, None, None
+    return len(table["x"]), np.mean(table["roundness1"]), np.mean(table["roundness2"])
+
+def detect_stars(data, fwhm=3.0, threshold_sigma=5.0, tiled=False, quick=False):
+    table, _, _ = detect_sources(data, fwhm, threshold_sigma, tiled, quick)
+    return summarize_sources(table)
+
+def star_moments(image, x, y, fwhm=3.0, background=0.0):
+    # Moments d'ordre 2 de chaque étoile, calculés en une fois sur des vignettes
+    # (n, k, k) extraites autour des centroïdes. Renvoie FWHM et excentricité par étoile.
+    half = max(3, int(round(2 * fwhm)))
+    offsets = np.arange(-half, half + 1)
+    h, w = image.shape
+    xc = np.round(x).astype(np.intp)
+    yc = np.round(y).astype(np.intp)
+    rows = np.clip(yc[:, None] + offsets[None, :], 0, h - 1)
+    cols = np.clip(xc[:, None] + offsets[None, :], 0, w - 1)
+    cutouts = image[rows[:, :, None], cols[:, None, :]].astype(np.float64)
+    cutouts -= background
+    np.nan_to_num(cutouts, copy=False)
+    np.clip(cutouts, 0, None, out=cutouts)
+    total = cutouts.sum(axis=(1, 2))
+    total[total <= 0] = np.nan
+    dy = offsets[None, :, None].astype(np.float64)
+    dx = offsets[None, None, :].astype(np.float64)
+    mx = (cutouts * dx).sum(axis=(1, 2)) / total
+    my = (cutouts * dy).sum(axis=(1, 2)) / total
+    ddx = dx - mx[:, None, None]
+    ddy = dy - my[:, None, None]
+    mxx = (cutouts * ddx ** 2).sum(axis=(1, 2)) / total
+    myy = (cutouts * ddy ** 2).sum(axis=(1, 2)) / total
+    mxy = (cutouts * ddx * ddy).sum(axis=(1, 2)) / total
+    # Valeurs propres de la matrice de covariance : axes majeur et mineur
+    mean = (mxx + myy) / 2
+    delta = np.sqrt(((mxx - myy) / 2) ** 2 + mxy ** 2)
+    major = mean + delta
+    minor = np.clip(mean - delta, 0, None)
+    star_fwhm = 2 * np.sqrt(2 * np.log(2)) * np.sqrt(mean)
+    eccentricity = np.sqrt(1 - minor / major)
+    return star_fwhm, eccentricity
+
+def measure_stars(data, fwhm=3.0, threshold_sigma=5.0, tiled=False, quick=False):
+    # Statistiques de qualité d'une image, utilisables hors de l'interface
+    return measure_sources(data, fwhm, threshold_sigma, tiled, quick)[0]
+
+def measure_sources(data, fwhm=3.0, threshold_sigma=5.0, tiled=False, quick=False):
+    # Statistiques de qualité et table des sources, pour une seule détection
+    sources, background, noise = find_sources(data, fwhm, threshold_sigma, tiled, quick)
+    stats = {
+        "n_stars": 0,
+        "fwhm": None,
+        "roundness1": None,
+        "roundness2": None,
+        "eccentricity": None,
+        "background": background,
+        "noise": noise,
+    }
+    if sources is None:
+        return stats, source_table(None)
+    star_fwhm, eccentricity = star_moments(
+        data, source_column(sources, 'x_centroid', 'xcentroid'),
+        source_column(sources, 'y_centroid', 'ycentroid'), fwhm, background
+    )
+    stats.update({
+        "n_stars": len(sources),
+        "fwhm": float(np.nanmedian(star_fwhm)),
+        "roundness1": float(np.mean(sources['roundness1'])),
+        "roundness2": float(np.mean(sources['roundness2'])),
+        "eccentricity": float(np.nanmedian(eccentricity)),
+    })
+    return stats, source_table(sources)
+
+class DetectionCache:
+    # Cache LRU des tables de sources, indexé par fichier (chemin + mtime),
+    # HDU, plan du cube et paramètres de détection : une image n'est analysée qu'une fois.
+    def __init__(self, max_entries=DETECTION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        # Le cache est partagé entre le thread GUI et les workers de chargement
+        self.lock = threading.Lock()
+
+    def make_key(self, file_path, hdu_index, fwhm, threshold_sigma, tiled=False, quick=False, plane=0):
+        mtime = os.stat(file_path).st_mtime_ns
+        return (os.path.abspath(file_path), mtime, hdu_index, plane, float(fwhm), float(threshold_sigma),
+                bool(tiled), bool(quick))
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, result):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def sources(self, data, file_path, hdu_index, fwhm=3.0, threshold_sigma=5.0, tiled=False, quick=False,
+                plane=0):
+        key = self.make_key(file_path, hdu_index, fwhm, threshold_sigma, tiled, quick, plane)
+        table = self.get(key)
+        if table is None:
+            table, _, _ = detect_sources(data, fwhm, threshold_sigma, tiled, quick)
+            self.put(key, table)
+        return table
+
+    def detect(self, data, file_path, hdu_index, fwhm=3.0, threshold_sigma=5.0, tiled=False, quick=False,
+               plane=0):
+        return summarize_sources(self.sources(data, file_path, hdu_index, fwhm, threshold_sigma, tiled, quick, plane))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+# Cache partagé par les onglets
+detection_cache = DetectionCache()
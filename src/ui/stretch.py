@@ -0,0 +1,200 @@
+import numpy as np
+
+STRETCH_MODES = {
+    "linear": "Linéaire",
+    "asinh": "Asinh",
+    "log": "Logarithmique",
+    "mtf": "MTF (tons moyens)",
+}
+ASINH_SOFTENING = 10.0
+LOG_SCALE = 1000.0
+MTF_MIDTONE = 0.25
+# Taille des blocs convertis par la LUT (indices convertis en intp par numpy)
+LUT_CHUNK = 1 << 20
+
+# Erreur maximale tolérée sur le rang (fraction des pixels) pour l'index échantillonné
+STRETCH_MAX_RANK_ERROR = 0.001
+STRETCH_SAMPLE_SEED = 0
+HISTOGRAM_CHUNK = 1 << 22
+
+def apply_curve(t, mode, midtone=MTF_MIDTONE):
+    # t : tableau float dans [0, 1], modifié en place
+    if mode == "asinh":
+        np.multiply(t, ASINH_SOFTENING, out=t)
+        np.arcsinh(t, out=t)
+        np.multiply(t, 1 / np.arcsinh(ASINH_SOFTENING), out=t)
+    elif mode == "log":
+        np.multiply(t, LOG_SCALE, out=t)
+        np.log1p(t, out=t)
+        np.multiply(t, 1 / np.log1p(LOG_SCALE), out=t)
+    elif mode == "mtf":
+        # Fonction de transfert des tons moyens : MTF(m, t) = (m - 1) t / ((2m - 1) t - m)
+        denominator = (2 * midtone - 1) * t - midtone
+        np.multiply(t, midtone - 1, out=t)
+        np.divide(t, denominator, out=t)
+    return t
+
+def inverse_curve(u, mode, midtone=MTF_MIDTONE):
+    u = np.array(u, dtype=np.float64)
+    if mode == "asinh":
+        return np.sinh(u * np.arcsinh(ASINH_SOFTENING)) / ASINH_SOFTENING
+    if mode == "log":
+        return np.expm1(u * np.log1p(LOG_SCALE)) / LOG_SCALE
+    if mode == "mtf":
+        # L'inverse de MTF(m, .) est MTF(1 - m, .)
+        return apply_curve(u, "mtf", 1 - midtone)
+    return u
+
+class StretchEngine:
+    # Conversion en uint8 pour un étirement (vmin, vmax, mode) donné.
+    # - entiers 8/16 bits : table de correspondance sur toutes les valeurs possibles ;
+    # - flottants : opérations en place dans un tampon float32 réutilisé.
+    def __init__(self, vmin, vmax, mode="linear", midtone=MTF_MIDTONE):
+        self.vmin = float(vmin)
+        self.vmax = float(vmax)
+        self.mode = mode
+        self.midtone = midtone
+        self.luts = {}
+        self.buffers = {}
+
+    def normalize(self, values, out):
+        # (values - vmin) / (vmax - vmin), NaN -> 0, borné à [0, 1], puis courbe
+        np.subtract(values, self.vmin, out=out, casting="unsafe")
+        if self.vmax - self.vmin > 0:
+            np.multiply(out, 1 / (self.vmax - self.vmin), out=out)
+        else:
+            out[...] = 0
+        # fmax/fmin ignorent les NaN : les pixels invalides deviennent 0
+        np.fmax(out, 0, out=out)
+        np.fmin(out, 1, out=out)
+        apply_curve(out, self.mode, self.midtone)
+        np.multiply(out, 255, out=out)
+        return out
+
+    def lut_for(self, dtype):
+        key = dtype.newbyteorder("=")
+        lut = self.luts.get(key)
+        if lut is None:
+            bits = 8 * dtype.itemsize
+            codes = np.arange(2 ** bits, dtype="u%d" % dtype.itemsize)
+            values = codes.view(key)
+            lut = self.normalize(values, np.empty(codes.size, dtype=np.float64)).astype(np.uint8)
+            self.luts[key] = lut
+        return lut
+
+    def buffer(self, kind, shape, dtype):
+        key = (kind, shape)
+        buf = self.buffers.get(key)
+        if buf is None:
+            buf = np.empty(shape, dtype=dtype)
+            self.buffers[key] = buf
+        return buf
+
+    def apply(self, data):
+        # Renvoie un tableau uint8 contigu ; il est réutilisé par l'appel suivant de même forme
+        out = self.buffer("out", data.shape, np.uint8)
+        if data.dtype.kind in "iu" and data.dtype.itemsize <= 2:
+            lut = self.lut_for(data.dtype)
+            # Les codes non signés de même largeur indexent la table
+            codes = data.view(data.dtype.str.replace("i", "u"))
+            rows = max(1, LUT_CHUNK // max(1, data.shape[-1]))
+            for start in range(0, data.shape[0], rows):
+                block = codes[start:start + rows]
+                np.take(lut, block, out=out[start:start + rows])
+            return out
+        work = self.buffer("work", data.shape, np.float32)
+        self.normalize(data, work)
+        np.copyto(out, work, casting="unsafe")
+        return out
+
+class StretchIndex:
+    # Index construit une fois par image pour que tout couple (min %, max %) et
+    # l'histogramme affiché se calculent sans reparcourir les pixels.
+    # - entiers 8/16 bits : histogramme cumulé exact, une classe par valeur ;
+    # - autres types : sous-échantillon trié, dont la taille découle de l'erreur de rang.
+    def __init__(self, data, max_rank_error=STRETCH_MAX_RANK_ERROR):
+        self.max_rank_error = max_rank_error
+        self.cdf = None
+        self.sample = None
+        flat = data.reshape(-1)
+        if data.dtype.kind in "iu" and data.dtype.itemsize <= 2:
+            self._build_exact(flat)
+        else:
+            self._build_sampled(flat)
+
+    def _build_exact(self, flat):
+        self.exact = True
+        info = np.iinfo(flat.dtype)
+        self.offset = int(info.min)
+        counts = np.zeros(int(info.max) - int(info.min) + 1, dtype=np.int64)
+        # Par blocs pour ne pas convertir toute l'image en entiers 64 bits
+        for start in range(0, flat.size, HISTOGRAM_CHUNK):
+            block = flat[start:start + HISTOGRAM_CHUNK].astype(np.intp)
+            if self.offset:
+                block -= self.offset
+            counts += np.bincount(block, minlength=counts.size)
+        self.cdf = np.cumsum(counts)
+        self.count = int(self.cdf[-1])
+
+    def _build_sampled(self, flat):
+        # Écart type du rang d'un quantile estimé sur n points : sqrt(p(1-p)/n) <= 0.5/sqrt(n).
+        # On vise 3 écarts types sous l'erreur demandée.
+        sample_size = int(np.ceil((1.5 / self.max_rank_error) ** 2))
+        if flat.size <= sample_size:
+            sample = np.array(flat, dtype=np.float64)
+        else:
+            rng = np.random.default_rng(STRETCH_SAMPLE_SEED)
+            # Indices triés : lecture séquentielle du memmap
+            idx = np.sort(rng.integers(0, flat.size, sample_size))
+            sample = flat[idx].astype(np.float64)
+        finite = np.isfinite(sample)
+        sample = sample[finite]
+        sample.sort()
+        self.exact = flat.size <= sample_size
+        self.sample = sample
+        # Nombre estimé de pixels finis dans toute l'image
+        self.count = flat.size if finite.all() else int(round(flat.size * finite.mean()))
+
+    def is_empty(self):
+        return self.count == 0
+
+    def _value_at_rank(self, rank):
+        if self.cdf is not None:
+            return np.searchsorted(self.cdf, rank, side="right") + self.offset
+        return self.sample[rank]
+
+    def percentiles(self, percents):
+        # Même interpolation linéaire que np.percentile
+        percents = np.asarray(percents, dtype=np.float64)
+        n = self.count if self.cdf is not None else self.sample.size
+        rank = percents / 100 * (n - 1)
+        lo = np.floor(rank).astype(np.int64)
+        hi = np.minimum(lo + 1, n - 1)
+        v_lo = self._value_at_rank(lo).astype(np.float64)
+        v_hi = self._value_at_rank(hi).astype(np.float64)
+        return v_lo + (v_hi - v_lo) * (rank - lo)
+
+    def count_below(self, values):
+        # Nombre (estimé pour l'index échantillonné) de pixels strictement inférieurs
+        values = np.asarray(values, dtype=np.float64)
+        if self.cdf is not None:
+            idx = np.ceil(values).astype(np.int64) - self.offset - 1
+            below = np.where(idx >= 0, self.cdf[np.clip(idx, 0, self.cdf.size - 1)], 0)
+            return below.astype(np.float64)
+        below = np.searchsorted(self.sample, values, side="left")
+        return below * (self.count / max(self.sample.size, 1))
+
+    def histogram(self, vmin, vmax, bins=128, mode="linear"):
+        # Histogramme des valeurs affichées (après vmin/vmax et courbe) : les pixels hors
+        # bornes sont comptés dans les classes extrêmes, comme après un clip
+        x = np.linspace(0, 255, bins + 1)
+        if vmax - vmin > 0:
+            # Bornes des classes ramenées dans l'espace des valeurs brutes
+            edges = vmin + inverse_curve(np.linspace(0, 1, bins + 1), mode) * (vmax - vmin)
+            below = self.count_below(edges[1:-1])
+            y = np.diff(np.concatenate(([0.0], below, [float(self.count)])))
+        else:
+            y = np.zeros(bins)
+            y[0] = self.count
+        # Pour stepMode=False, x[:-1] et y doivent avoir la même taille
+        return x[:-1], y
@@ -0,0 +1,118 @@
+import os
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog, QLabel, QListView, QAbstractItemView
+)
+from PyQt5.QtGui import QPixmap, QColor
+from PyQt5.QtCore import Qt, QSize, QTimer, pyqtSignal
+from .workers import JobRunner
+from .list_models import ThumbnailListModel
+from .exif_extract import is_fits_file
+from .thumbnails import THUMBNAIL_SIZE, ThumbnailCache, list_image_files
+
+# Côté des vignettes affichées et de leur case dans la grille
+THUMBNAIL_DISPLAY_SIZE = 192
+THUMBNAIL_GRID_SIZE = QSize(THUMBNAIL_DISPLAY_SIZE + 16, THUMBNAIL_DISPLAY_SIZE + 36)
+# Vignettes gardées en mémoire (environ 150 Ko chacune)
+THUMBNAIL_MEMORY_ITEMS = 600
+# Après un défilement, les demandes des vignettes sorties de l'écran sont annulées
+SCROLL_SETTLE_MS = 150
+THUMBNAIL_THREADS = max(2, min(8, os.cpu_count() or 1))
+
+def thumbnail_job(job, cache, row, file_path):
+    job.check_cancelled()
+    try:
+        image = cache.thumbnail(file_path)
+    except Exception:
+        image = None
+    job.emit("thumbnail", (row, image))
+
+def prune_job(job, cache):
+    cache.prune()
+
+class ThumbnailTab(QWidget):
+    open_in_viewer = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.folder = None
+        self.cache = ThumbnailCache(size=THUMBNAIL_SIZE)
+        self.jobs = JobRunner(max_threads=THUMBNAIL_THREADS)
+        self.layout = QVBoxLayout(self)
+
+        folder_layout = QHBoxLayout()
+        self.select_btn = QPushButton("Choisir un dossier…")
+        self.select_btn.clicked.connect(self.select_folder)
+        folder_layout.addWidget(self.select_btn)
+        self.info_label = QLabel("Aucun dossier sélectionné.")
+        folder_layout.addWidget(self.info_label, 1)
+        self.layout.addLayout(folder_layout)
+
+        placeholder = QPixmap(THUMBNAIL_DISPLAY_SIZE, THUMBNAIL_DISPLAY_SIZE * 2 // 3)
+        placeholder.fill(QColor(60, 60, 60))
+        self.broken = QPixmap(placeholder.size())
+        self.broken.fill(QColor(120, 40, 40))
+        self.model = ThumbnailListModel(self.request_thumbnail, placeholder, THUMBNAIL_MEMORY_ITEMS, self)
+
+        self.view = QListView()
+        self.view.setViewMode(QListView.IconMode)
+        self.view.setResizeMode(QListView.Adjust)
+        self.view.setMovement(QListView.Static)
+        self.view.setUniformItemSizes(True)
+        self.view.setIconSize(QSize(THUMBNAIL_DISPLAY_SIZE, THUMBNAIL_DISPLAY_SIZE))
+        self.view.setGridSize(THUMBNAIL_GRID_SIZE)
+        self.view.setTextElideMode(Qt.ElideMiddle)
+        self.view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.view.setModel(self.model)
+        self.view.doubleClicked.connect(self.open_item)
+        self.layout.addWidget(self.view)
+
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.setInterval(SCROLL_SETTLE_MS)
+        self.settle_timer.timeout.connect(self.drop_offscreen_requests)
+        self.view.verticalScrollBar().valueChanged.connect(self.settle_timer.start)
+
+        # Le cache disque est borné une fois par session, en arrière-plan
+        self.jobs.submit(prune_job, self.cache, cancel_previous=False)
+
+    def select_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Sélectionner un dossier", os.path.expanduser("~"))
+        if folder:
+            self.load_folder(folder)
+
+    def load_folder(self, folder):
+        self.jobs.cancel_all()
+        self.folder = folder
+        paths = list_image_files(folder)
+        self.model.set_paths(paths)
+        self.info_label.setText(f"{folder} : {len(paths)} images")
+
+    def request_thumbnail(self, row):
+        # Appelé par le modèle quand la vue affiche une vignette absente
+        self.jobs.submit(
+            thumbnail_job, self.cache, row, self.model.paths[row],
+            cancel_previous=False, on_result=self.on_thumbnail
+        )
+
+    def drop_offscreen_requests(self):
+        # Les jobs en attente sont retirés ; la vue redemande celles encore visibles
+        self.jobs.cancel_all()
+        self.model.forget_requests()
+        self.view.viewport().update()
+
+    def on_thumbnail(self, job_id, stage, payload):
+        row, image = payload
+        if row >= len(self.model.paths):
+            return
+        if image is None:
+            pixmap = self.broken
+        else:
+            pixmap = QPixmap.fromImage(image).scaled(
+                THUMBNAIL_DISPLAY_SIZE, THUMBNAIL_DISPLAY_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation
+            )
+        self.model.set_pixmap(row, pixmap)
+
+    def open_item(self, index):
+        file_path = self.model.paths[index.row()]
+        if is_fits_file(file_path):
+            self.open_in_viewer.emit(file_path)
@@ -0,0 +1,127 @@
+import hashlib
+import math
+import os
+import threading
+import numpy as np
+from PyQt5.QtGui import QImage, QImageReader
+from PyQt5.QtCore import Qt, QBuffer, QByteArray, QIODevice
+from .exif_extract import FITS_EXTENSIONS, embedded_jpeg, is_fits_file
+from .fits_loader import open_frame
+from .stretch import StretchEngine
+
+# Stocké à la racine du projet, à côté de favs.json
+THUMBNAIL_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "thumbnail_cache")
+THUMBNAIL_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Plus grand côté des vignettes, en pixels
+THUMBNAIL_SIZE = 256
+THUMBNAIL_QUALITY = 85
+RAW_EXTENSIONS = (".cr2",)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+THUMBNAIL_EXTENSIONS = FITS_EXTENSIONS + RAW_EXTENSIONS + IMAGE_EXTENSIONS
+
+def list_image_files(folder):
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if not name.startswith(".") and name.lower().endswith(THUMBNAIL_EXTENSIONS)
+        and os.path.isfile(os.path.join(folder, name))
+    )
+
+def read_scaled(reader, size):
+    # Le décodeur JPEG de Qt réduit pendant le décodage (DCT) quand la taille est fixée
+    reader.setAutoTransform(True)
+    full = reader.size()
+    if full.isValid() and max(full.width(), full.height()) > size:
+        reader.setScaledSize(full.scaled(size, size, Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        raise ValueError(reader.errorString())
+    return image
+
+def fits_thumbnail(file_path, size=THUMBNAIL_SIZE):
+    # Sous-échantillonnage par pas sur le memmap brut, mis à l'échelle après coup :
+    # seules les lignes retenues sont lues (et les tuiles correspondantes pour un
+    # FITS compressé), l'image entière n'est jamais chargée
+    with open_frame(file_path, lazy=True) as frame:
+        step = max(1, int(math.ceil(max(frame.shape) / size)))
+        sample = np.array(frame.decimated(step), dtype=np.float32)
+    finite = sample[np.isfinite(sample)]
+    if finite.size == 0:
+        raise ValueError("Image vide")
+    vmin, vmax = np.percentile(finite, [1, 99.5])
+    pixels = np.ascontiguousarray(StretchEngine(vmin, vmax, "asinh").apply(sample))
+    h, w = pixels.shape
+    return QImage(pixels.data, w, h, w, QImage.Format_Grayscale8).copy()
+
+def raw_thumbnail(file_path, size=THUMBNAIL_SIZE):
+    data = embedded_jpeg(file_path)
+    if data is None:
+        raise ValueError("Aucun aperçu JPEG intégré")
+    buffer = QBuffer()
+    buffer.setData(QByteArray(data))
+    buffer.open(QIODevice.ReadOnly)
+    return read_scaled(QImageReader(buffer, b"jpeg"), size)
+
+def make_thumbnail(file_path, size=THUMBNAIL_SIZE):
+    # QImage (utilisable hors du thread GUI, contrairement à QPixmap)
+    if is_fits_file(file_path):
+        return fits_thumbnail(file_path, size)
+    if file_path.lower().endswith(RAW_EXTENSIONS):
+        return raw_thumbnail(file_path, size)
+    return read_scaled(QImageReader(file_path), size)
+
+class ThumbnailCache:
+    # Vignettes sur disque (JPEG), nommées par l'empreinte du chemin, de la
+    # taille et du mtime du fichier : un fichier modifié obtient une nouvelle
+    # vignette. Au-delà de max_bytes, les moins récemment lues sont supprimées.
+    def __init__(self, folder=THUMBNAIL_CACHE_DIR, size=THUMBNAIL_SIZE, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+        self.folder = folder
+        self.size = size
+        self.max_bytes = max_bytes
+        os.makedirs(folder, exist_ok=True)
+
+    def entry_path(self, file_path, st):
+        key = f"{os.path.abspath(file_path)}\0{st.st_size}\0{st.st_mtime_ns}\0{self.size}"
+        digest = hashlib.sha1(key.encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(self.folder, digest[:2], digest + ".jpg")
+
+    def thumbnail(self, file_path):
+        st = os.stat(file_path)
+        path = self.entry_path(file_path, st)
+        image = QImage(path) if os.path.exists(path) else QImage()
+        if not image.isNull():
+            # Date d'accès tenue à jour pour l'éviction
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return image
+        image = make_thumbnail(file_path, self.size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Temporaire propre au thread : deux workers peuvent produire la même vignette
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        if image.save(tmp_path, "JPEG", THUMBNAIL_QUALITY):
+            os.replace(tmp_path, path)
+        return image
+
+    def prune(self):
+        entries = []
+        total = 0
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
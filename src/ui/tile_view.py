@@ -0,0 +1,103 @@
+import collections
+import math
+import numpy as np
+from PyQt5.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+from PyQt5.QtGui import QPainter, QPixmap
+from PyQt5.QtCore import QRectF
+
+TILE_SIZE = 512
+TILE_CACHE_SIZE = 256
+
+class TileCache:
+    # Cache LRU des tuiles déjà étirées (QPixmap), indexé par (niveau, colonne, ligne)
+    def __init__(self, max_entries=TILE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+
+    def get(self, key):
+        pixmap = self.entries.get(key)
+        if pixmap is not None:
+            self.entries.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        self.entries[key] = pixmap
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+class TiledImageItem(QGraphicsItem):
+    # Affiche une image 2D par tuiles, sur une pyramide de niveaux sous-échantillonnés
+    # construits à la demande (vues à pas de 2, sans copie). Seules les tuiles visibles
+    # au niveau adapté au zoom courant sont étirées puis mises en cache.
+    def __init__(self, data, render_tile, parent=None):
+        super().__init__(parent)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+        self.data = data
+        # render_tile(tableau 2D) -> QImage, avec l'étirement courant
+        self.render_tile = render_tile
+        self.levels = [data]
+        self.cache = TileCache()
+        h, w = data.shape
+        self.bounds = QRectF(0, 0, w, h)
+        # Dernier niveau : l'image entière tient dans une tuile
+        self.max_level = max(0, math.ceil(math.log2(max(h, w) / TILE_SIZE)))
+
+    def boundingRect(self):
+        return self.bounds
+
+    def set_renderer(self, render_tile):
+        # Nouvel étirement : on vide le cache, seules les tuiles visibles seront recalculées
+        self.render_tile = render_tile
+        self.cache.clear()
+        self.update()
+
+    def level_data(self, level):
+        while len(self.levels) <= level:
+            self.levels.append(self.levels[-1][::2, ::2])
+        return self.levels[level]
+
+    def level_for_scale(self, scale):
+        if scale <= 0:
+            return self.max_level
+        return min(self.max_level, max(0, int(math.floor(math.log2(1 / scale)))))
+
+    def tile(self, level, tx, ty):
+        key = (level, tx, ty)
+        pixmap = self.cache.get(key)
+        if pixmap is None:
+            data = self.level_data(level)
+            block = data[ty * TILE_SIZE:(ty + 1) * TILE_SIZE, tx * TILE_SIZE:(tx + 1) * TILE_SIZE]
+            # Vue paresseuse d'une image compressée : seuls les blocs de la tuile sont décompressés
+            qimg = self.render_tile(np.asarray(block))
+            pixmap = QPixmap.fromImage(qimg) if qimg is not None else QPixmap()
+            self.cache.put(key, pixmap)
+        return pixmap
+
+    def paint(self, painter, option, widget=None):
+        scale = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.level_for_scale(scale)
+        factor = 2 ** level
+        extent = TILE_SIZE * factor
+        exposed = option.exposedRect.intersected(self.bounds)
+        if exposed.isEmpty():
+            return
+        if scale < 1:
+            painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        tx0 = int(exposed.left() // extent)
+        tx1 = int(math.ceil(exposed.right() / extent))
+        ty0 = int(exposed.top() // extent)
+        ty1 = int(math.ceil(exposed.bottom() / extent))
+        for ty in range(ty0, ty1):
+            for tx in range(tx0, tx1):
+                pixmap = self.tile(level, tx, ty)
+                if pixmap.isNull():
+                    continue
+                # Les niveaux à pas de 2 peuvent déborder d'un pixel : on reste dans l'image
+                target = QRectF(tx * extent, ty * extent,
+                                pixmap.width() * factor, pixmap.height() * factor).intersected(self.bounds)
+                source = QRectF(0, 0, target.width() / factor, target.height() / factor)
+                painter.drawPixmap(target, pixmap, source)
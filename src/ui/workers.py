@@ -0,0 +1,107 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+import itertools
+import threading
+
+class JobCancelled(Exception):
+    pass
+
+class WorkerSignals(QObject):
+    # job_id, étape, données
+    result = pyqtSignal(int, str, object)
+    error = pyqtSignal(int, str)
+    finished = pyqtSignal(int)
+
+class Worker(QRunnable):
+    # Exécute fn(worker, *args, **kwargs) dans un thread du pool.
+    # fn publie ses résultats étape par étape avec worker.emit(étape, données)
+    # et peut vérifier l'annulation avec worker.check_cancelled().
+    def __init__(self, job_id, fn, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.job_id = job_id
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def emit(self, stage, payload=None):
+        self.check_cancelled()
+        self.signals.result.emit(self.job_id, stage, payload)
+
+    def run(self):
+        try:
+            self.fn(self, *self.args, **self.kwargs)
+        except JobCancelled:
+            pass
+        except Exception as e:
+            if not self.is_cancelled():
+                self.signals.error.emit(self.job_id, str(e))
+        finally:
+            self.signals.finished.emit(self.job_id)
+
+class JobRunner:
+    # Lance des jobs dans un QThreadPool. Un nouveau job peut annuler ceux qu'il
+    # remplace : les jobs en attente sont retirés du pool, ceux en cours s'arrêtent
+    # à la prochaine étape et leurs résultats ne sont plus transmis.
+    def __init__(self, pool=None, max_threads=None):
+        if pool is None:
+            pool = QThreadPool()
+            if max_threads:
+                pool.setMaxThreadCount(max_threads)
+        self.pool = pool
+        self.workers = {}
+        self.ids = itertools.count(1)
+
+    def submit(self, fn, *args, on_result=None, on_error=None, on_finished=None,
+               cancel_previous=True, **kwargs):
+        if cancel_previous:
+            self.cancel_all()
+        job_id = next(self.ids)
+        worker = Worker(job_id, fn, *args, **kwargs)
+        if on_result is not None:
+            worker.signals.result.connect(self._filter(on_result))
+        if on_error is not None:
+            worker.signals.error.connect(self._filter(on_error))
+        if on_finished is not None:
+            worker.signals.finished.connect(on_finished)
+        worker.signals.finished.connect(self._forget)
+        self.workers[job_id] = worker
+        self.pool.start(worker)
+        return job_id
+
+    def _filter(self, callback):
+        # Ignore les signaux déjà en file d'attente d'un job annulé
+        def wrapper(job_id, *args):
+            worker = self.workers.get(job_id)
+            if worker is not None and not worker.is_cancelled():
+                callback(job_id, *args)
+        return wrapper
+
+    def _forget(self, job_id):
+        self.workers.pop(job_id, None)
+
+    def cancel(self, job_id):
+        worker = self.workers.get(job_id)
+        if worker is None:
+            return
+        worker.cancel()
+        if self.pool.tryTake(worker):
+            self.workers.pop(job_id, None)
+
+    def cancel_all(self):
+        for job_id in list(self.workers):
+            self.cancel(job_id)
+
+    def is_running(self):
+        return bool(self.workers)